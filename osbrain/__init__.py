@@ -27,6 +27,15 @@ config['SAFE'] = os.environ.get('OSBRAIN_DEFAULT_SAFE', 'true') != 'false'
 config['SERIALIZER'] = os.environ.get('OSBRAIN_DEFAULT_SERIALIZER', 'pickle')
 config['LINGER'] = float(os.environ.get('OSBRAIN_DEFAULT_LINGER', '1'))
 config['TRANSPORT'] = os.environ.get('OSBRAIN_DEFAULT_TRANSPORT', 'ipc')
+config['CREDIT'] = int(os.environ.get('OSBRAIN_DEFAULT_CREDIT', '1'))
+config['REPLY_CACHE'] = \
+    int(os.environ.get('OSBRAIN_DEFAULT_REPLY_CACHE', '1000'))
+config['XPUB'] = os.environ.get('OSBRAIN_DEFAULT_XPUB', 'false') == 'true'
+config['FUTURE_WORKERS'] = \
+    int(os.environ.get('OSBRAIN_DEFAULT_FUTURE_WORKERS', '32'))
+config['PROXY_POOL'] = int(os.environ.get('OSBRAIN_DEFAULT_PROXY_POOL', '0'))
+config['PROXY_POOL_TIMEOUT'] = \
+    float(os.environ.get('OSBRAIN_DEFAULT_PROXY_POOL_TIMEOUT', '5'))
 
 # Set storage folder for IPC socket files
 config['IPC_DIR'] = \
@@ -41,3 +50,5 @@ from .nameserver import NameServer, run_nameserver
 from .proxy import Proxy, NSProxy
 from .address import SocketAddress, AgentAddress
 from .logging import Logger, run_logger
+from .broker import Broker, run_broker
+from .pipeline import Pipeline
@@ -133,6 +133,8 @@ class AgentAddressKind(str):
         'SUB': 'PUB',
         'PULL_SYNC_PUB': 'PUSH_SYNC_SUB',
         'PUSH_SYNC_SUB': 'PULL_SYNC_PUB',
+        'ROUTER': 'DEALER',
+        'DEALER': 'ROUTER',
     }
     ZMQ_KIND_CONVERSION = {
         'REQ': zmq.REQ,
@@ -143,6 +145,8 @@ class AgentAddressKind(str):
         'SUB': zmq.SUB,
         'PULL_SYNC_PUB': zmq.PULL,
         'PUSH_SYNC_SUB': zmq.PUSH,
+        'ROUTER': zmq.ROUTER,
+        'DEALER': zmq.DEALER,
     }
     REQUIRE_HANDLER = ('REP', 'PULL', 'SUB', 'PULL_SYNC_PUB')
 
@@ -345,6 +349,12 @@ class AgentChannelKind(str):
         'ASYNC_REQ': 'ASYNC_REP',
         'SYNC_PUB': 'SYNC_SUB',
         'SYNC_SUB': 'SYNC_PUB',
+        'FLOW_PUSH': 'FLOW_PULL',
+        'FLOW_PULL': 'FLOW_PUSH',
+        'WORKER_POOL': 'WORKER',
+        'WORKER': 'WORKER_POOL',
+        'STREAM_REP': 'STREAM_REQ',
+        'STREAM_REQ': 'STREAM_REP',
     }
 
     def __new__(cls, kind):
@@ -1,8 +1,11 @@
 """
 Core agent classes.
 """
+from collections import deque
+import copy
 from datetime import datetime
 import errno
+from functools import partial
 import inspect
 import multiprocessing
 import os
@@ -38,6 +41,26 @@ from .address import AgentAddressSerializer
 from .address import AgentChannel
 from .address import address_to_host_port
 from .address import guess_kind
+from .batch import SendBuffer
+from .deadline import DeadlineExceeded
+from .deadline import Request
+from .flow import CreditQueue
+from .flow import WorkerPool
+from .retry import ReplyCache
+from .retry import Retry
+from .scatter import Gather
+from .sequence import ReplayBuffer
+from .sequence import Sequenced
+from .sequence import SequenceTracker
+from .idle import IdlePolicy
+from .ratelimit import message_size
+from .ratelimit import RateLimit
+from .shard import HashRing
+from .stats import BacklogThreshold
+from .stats import SocketStats
+from .stream import EndOfStream
+from .stream import Stream
+from .stream import StreamRequest
 from .proxy import Proxy
 from .proxy import NSProxy
 
@@ -103,6 +126,26 @@ def deserialize_message(message, serializer):
     raise ValueError('Serializer not supported for deserialization')
 
 
+def topic_to_bytes(topic):
+    """
+    Parameters
+    ----------
+    topic : str, bytes, None
+        Topic of a publication.
+
+    Returns
+    -------
+    bytes
+        The topic, ready to be composed with a message (`b''` if no topic
+        is given).
+    """
+    if topic is None:
+        return b''
+    if isinstance(topic, str):
+        return topic.encode()
+    return topic
+
+
 def compose_message(message: bytes, topic: bytes,
                     serializer: AgentAddressSerializer) -> bytes:
     """
@@ -194,10 +237,21 @@ class Agent():
         When set to `True`, the agent will continue executing the main loop.
     running : bool
         Set to `True` if the agent is running (executing the main loop).
+    nsaddr : SocketAddress
+        Address of the name server the agent is registered in (if any).
+    xpub : bool
+        When set to `True`, PUB sockets created afterwards are backed by
+        XPUB sockets, so that publications with topics nobody subscribes to
+        are not even serialized.
+    deadline : float
+        While handling a request, the time (as returned by `time.time()`)
+        after which the client is no longer waiting for the reply, or
+        `None` if the client set no deadline.
     """
     def __init__(self, name=None, host=None, serializer=None, transport=None):
         self.uuid = unique_identifier()
         self.name = name
+        self.nsaddr = None
         self.host = host
         if not self.host:
             self.host = '127.0.0.1'
@@ -209,8 +263,39 @@ class Agent():
         self._async_req_uuid = {}
         self._async_req_handler = {}
         self._pending_requests = {}
+        self._gather = {}
+        self._streams = {}
+        self._cache = {}
+        self._conflated = {}
+        self._replay = {}
+        self._sequence = {}
+        self._sync_sub = {}
+        self._shards = {}
+        self._subscriptions = {}
+        self._priority = {}
+        self._expired = {}
+        self._retry_policy = {}
+        self._retrying = {}
+        self._retried = ReplyCache(config['REPLY_CACHE'])
+        self._forgotten = ReplyCache(config['REPLY_CACHE'])
+        self._reply_cache = {}
+        self._req_pool = {}
+        self._broadcast = {}
+        self._broadcast_latency = {}
+        self._stats = {}
+        self._thresholds = {}
+        self._inbox = {}
+        self._rate_limit = {}
+        self._idle_policy = None
+        self.deadline = None
+        self._stream_requests = {}
         self._timer = {}
+        self._send_buffer = {}
+        self._credit_queue = {}
+        self._worker_pool = {}
+        self._pool_monitor = {}
         self.poll_timeout = 1000
+        self.xpub = config['XPUB']
         self.keep_alive = True
         self._shutdown_now = False
         self.running = False
@@ -226,9 +311,11 @@ class Agent():
 
         # This in-process socket handles safe access to
         # memory from other threads (i.e. when using Pyro proxies).
+        # It has a higher priority, so that agents stay responsive to
+        # proxies even when flooded with data.
         self.bind('REP', alias='_loopback_safe', addr='_loopback_safe',
                   handler=self._handle_loopback_safe, transport='inproc',
-                  serializer='pickle')
+                  serializer='pickle', priority=1)
 
         self.on_init()
 
@@ -313,6 +400,28 @@ class Agent():
         data = dill.dumps((method, args, kwargs))
         return self._loopback_reqrep('inproc://_loopback_safe', data)
 
+    def execute_batch(self, calls):
+        """
+        Execute a batch of method calls, in order.
+
+        This method is normally called through a proxy batch (see
+        `Proxy.batch()`), so that all the calls are executed with a single
+        round-trip (and in the main thread, when the proxy is safe).
+
+        Parameters
+        ----------
+        calls : list
+            A list of `(method, args, kwargs)` tuples, where `method` is the
+            method name.
+
+        Returns
+        -------
+        list
+            The result of each call.
+        """
+        return [getattr(self, method)(*args, **kwargs)
+                for method, args, kwargs in calls]
+
     def each(self, period, method, *args, alias=None, **kwargs):
         """
         Execute a repeated action with a defined period.
@@ -442,15 +551,34 @@ class Agent():
             Alias of the logger.
         """
         level = LogLevel(level)
-        message = '[%s] (%s): %s' % (datetime.utcnow(), self.name, message)
-        if self.registered(logger):
+        registered = self.registered(logger)
+        if registered:
             logger_kind = AgentAddressKind(self.address[logger].kind)
             assert logger_kind == 'PUB', \
                 'Logger must use publisher-subscriber pattern!'
+            # Do not even format messages the logger is not interested in
+            if level in ('INFO', 'DEBUG') and \
+                    not self.subscribed(logger, level):
+                return
+        message = '[%s] (%s): %s' % (datetime.utcnow(), self.name, message)
+        if registered:
             self.send(logger, message, topic=level)
         elif level in ('INFO', 'DEBUG'):
             sys.stdout.write('%s %s\n' % (level, message))
             sys.stdout.flush()
+        self._log_console(level, message)
+
+    def _log_console(self, level, message):
+        """
+        Write errors and warnings to the console, even when a logger is set.
+
+        Parameters
+        ----------
+        level : LogLevel
+            Logging severity level: INFO, WARNING, ERROR, DEBUG.
+        message : str
+            Formatted message.
+        """
         # When logging an error, always write to stderr
         if level == 'ERROR':
             sys.stderr.write('ERROR %s\n' % message)
@@ -539,6 +667,7 @@ class Agent():
         self.address[alias] = address
         self.address[socket] = address
         self.address[address] = address
+        self._stats[socket] = SocketStats()
         if handler is not None:
             self.poller.register(socket, zmq.POLLIN)
             self._set_handler(socket, handler)
@@ -578,7 +707,7 @@ class Agent():
         return address in self.socket
 
     def bind(self, kind, alias=None, handler=None, addr=None, transport=None,
-             serializer=None):
+             serializer=None, priority=None):
         """
         Bind to an agent address.
 
@@ -595,6 +724,8 @@ class Agent():
             The address to bind to.
         transport : str, AgentAddressTransport, default is None
             Transport protocol.
+        priority : int, default is None
+            Priority of the socket (see `set_priority()`).
 
         Returns
         -------
@@ -609,11 +740,14 @@ class Agent():
             or self.serializer \
             or config['SERIALIZER']
         if isinstance(kind, AgentAddressKind):
-            return self._bind_address(kind, alias, handler, addr, transport,
-                                      serializer)
+            address = self._bind_address(kind, alias, handler, addr,
+                                         transport, serializer)
         else:
-            return self._bind_channel(kind, alias, handler, addr, transport,
-                                      serializer)
+            address = self._bind_channel(kind, alias, handler, addr,
+                                         transport, serializer)
+        if priority is not None:
+            self.set_priority(alias or address, priority)
+        return address
 
     def _bind_address(self, kind, alias=None, handler=None, addr=None,
                       transport=None, serializer=None):
@@ -640,7 +774,7 @@ class Agent():
             The address where the agent binded to.
         """
         validate_handler(handler, required=kind.requires_handler())
-        socket = self.context.socket(kind.zmq())
+        socket = self._create_socket(kind)
         addr = self._bind_socket(socket, addr=addr, transport=transport)
         server_address = AgentAddress(transport, addr, kind, 'server',
                                       serializer)
@@ -650,6 +784,29 @@ class Agent():
             self._subscribe(server_address, handler)
         return server_address
 
+    def _create_socket(self, kind):
+        """
+        Create a ZMQ socket for an address kind.
+
+        PUB sockets are backed by XPUB sockets if the `xpub` attribute is
+        set, in order to keep track of the subscriptions.
+
+        Parameters
+        ----------
+        kind : AgentAddressKind
+            The agent address kind: PUB, REQ...
+
+        Returns
+        -------
+        zmq.Socket
+            The new socket.
+        """
+        if kind != 'PUB' or not self.xpub:
+            return self.context.socket(kind.zmq())
+        socket = self.context.socket(zmq.XPUB)
+        self._subscriptions[socket] = set()
+        return socket
+
     def _bind_channel(self, kind, alias=None, handler=None, addr=None,
                       transport=None, serializer=None):
         """
@@ -674,36 +831,78 @@ class Agent():
         AgentChannel
             The channel where the agent binded to.
         """
-        if kind == 'ASYNC_REP':
-            validate_handler(handler, required=True)
-            socket = self.context.socket(zmq.PULL)
-            addr = self._bind_socket(socket, addr=addr, transport=transport)
-            server_address = AgentAddress(transport, addr, 'PULL', 'server',
-                                          serializer)
-            channel = AgentChannel(kind, receiver=server_address, sender=None)
-            self.register(socket, channel, alias, handler)
-            return channel
+        if kind in ('ASYNC_REP', 'STREAM_REP'):
+            return self._bind_channel_async_rep(kind, alias, handler, addr,
+                                                transport, serializer)
         if kind == 'SYNC_PUB':
-            if addr:
-                raise NotImplementedError()
-            if not addr:
-                addr = (None, None)
-            pull_address = self.bind('PULL_SYNC_PUB',
-                                     addr=addr[0],
-                                     handler=handler,
-                                     transport=transport,
-                                     serializer=serializer)
-            pub_socket = self.context.socket(zmq.PUB)
-            aux = self._bind_socket(pub_socket, addr=addr[1],
-                                    transport=transport)
-            pub_address = AgentAddress(transport, aux, 'PUB', 'server',
-                                       serializer)
-            channel = AgentChannel(kind, receiver=pull_address,
-                                   sender=pub_address)
-            self.register(pub_socket, channel, alias=alias)
+            return self._bind_channel_sync_pub(kind, alias, handler, addr,
+                                               transport, serializer)
+        if kind in ('FLOW_PUSH', 'WORKER_POOL'):
+            return self._bind_channel_router(kind, alias, addr, transport,
+                                             serializer)
+        raise NotImplementedError('Unsupported channel kind %s!' % kind)
+
+    def _bind_channel_async_rep(self, kind, alias, handler, addr, transport,
+                                serializer):
+        """
+        Bind process for ASYNC_REP and STREAM_REP channels.
+        """
+        validate_handler(handler, required=True)
+        socket = self.context.socket(zmq.PULL)
+        addr = self._bind_socket(socket, addr=addr, transport=transport)
+        server_address = AgentAddress(transport, addr, 'PULL', 'server',
+                                      serializer)
+        channel = AgentChannel(kind, receiver=server_address, sender=None)
+        self.register(socket, channel, alias, handler)
+        return channel
+
+    def _bind_channel_sync_pub(self, kind, alias, handler, addr, transport,
+                               serializer):
+        """
+        Bind process for SYNC_PUB channels.
+        """
+        if addr:
+            raise NotImplementedError()
+        addr = (None, None)
+        pull_address = self.bind('PULL_SYNC_PUB',
+                                 addr=addr[0],
+                                 handler=handler,
+                                 transport=transport,
+                                 serializer=serializer)
+        pub_socket = self.context.socket(zmq.PUB)
+        aux = self._bind_socket(pub_socket, addr=addr[1],
+                                transport=transport)
+        pub_address = AgentAddress(transport, aux, 'PUB', 'server',
+                                   serializer)
+        channel = AgentChannel(kind, receiver=pull_address,
+                               sender=pub_address)
+        self.register(pub_socket, channel, alias=alias)
+        return channel
+
+    def _bind_channel_router(self, kind, alias, addr, transport, serializer):
+        """
+        Bind process for channels which use a ROUTER socket to address each
+        peer (FLOW_PUSH and WORKER_POOL).
+        """
+        socket = self.context.socket(zmq.ROUTER)
+        # Fail when sending to peers that are no longer connected
+        socket.setsockopt(zmq.ROUTER_MANDATORY, 1)
+        addr = self._bind_socket(socket, addr=addr, transport=transport)
+        server_address = AgentAddress(transport, addr, 'ROUTER', 'server',
+                                      serializer)
+        channel = AgentChannel(kind, receiver=server_address,
+                               sender=server_address)
+        self.register(socket, channel, alias=alias)
+        self.poller.register(socket, zmq.POLLIN)
+        if kind == 'FLOW_PUSH':
+            self._credit_queue[socket] = CreditQueue()
             return channel
-        else:
-            raise NotImplementedError('Unsupported channel kind %s!' % kind)
+        self._worker_pool[socket] = WorkerPool()
+        # Monitor disconnections to detect dead workers
+        monitor = socket.get_monitor_socket(zmq.EVENT_DISCONNECTED)
+        self.poller.register(monitor, zmq.POLLIN)
+        self._pool_monitor[monitor] = socket
+        return channel
 
     def _bind_socket(self, socket, addr=None, transport=None):
         """
@@ -738,7 +937,7 @@ class Agent():
             socket.bind('%s://%s' % (transport, addr))
         return addr
 
-    def connect(self, server, alias=None, handler=None):
+    def connect(self, server, alias=None, handler=None, priority=None):
         """
         Connect to a server agent address.
 
@@ -751,11 +950,18 @@ class Agent():
         handler, default is None
             If the new socket receives input messages, the handler/s is/are to
             be set with this parameter.
+        priority : int, default is None
+            Priority of the socket (see `set_priority()`).
         """
         if isinstance(server, AgentAddress):
-            return self._connect_address(server, alias=alias, handler=handler)
+            address = self._connect_address(server, alias=alias,
+                                            handler=handler)
         else:
-            return self._connect_channel(server, alias=alias, handler=handler)
+            address = self._connect_channel(server, alias=alias,
+                                            handler=handler)
+        if priority is not None:
+            self.set_priority(alias or address, priority)
+        return address
 
     def _connect_address(self, server_address, alias=None, handler=None):
         """
@@ -801,7 +1007,7 @@ class Agent():
             be set with this parameter.
         """
         kind = channel.kind
-        if kind == 'ASYNC_REP':
+        if kind in ('ASYNC_REP', 'STREAM_REP'):
             return self._connect_channel_async_rep(channel,
                                                    handler=handler,
                                                    alias=alias)
@@ -809,11 +1015,19 @@ class Agent():
             return self._connect_channel_sync_pub(channel,
                                                   handler=handler,
                                                   alias=alias)
+        if kind == 'FLOW_PUSH':
+            return self._connect_channel_flow_push(channel,
+                                                   handler=handler,
+                                                   alias=alias)
+        if kind == 'WORKER_POOL':
+            return self._connect_channel_worker_pool(channel,
+                                                     handler=handler,
+                                                     alias=alias)
         raise NotImplementedError('Unsupported channel kind %s!' % kind)
 
     def _connect_channel_async_rep(self, channel, handler, alias=None):
         """
-        Connect to a server agent ASYNC_REP channel.
+        Connect to a server agent ASYNC_REP (or STREAM_REP) channel.
 
         Parameters
         ----------
@@ -834,8 +1048,11 @@ class Agent():
                                    register_as=channel)
         # Create socket for receiving responses
         uuid = unique_identifier()
-        addr = self.bind('PULL', alias=uuid,
-                         handler=self._handle_async_requests)
+        if channel.kind == 'STREAM_REP':
+            reply_handler = self._handle_stream_replies
+        else:
+            reply_handler = self._handle_async_requests
+        addr = self.bind('PULL', alias=uuid, handler=reply_handler)
         self._async_req_uuid[pull_address] = uuid
         self._async_req_uuid[pull_address.twin()] = uuid
         self._async_req_uuid[addr] = uuid
@@ -879,8 +1096,118 @@ class Agent():
         self._async_req_uuid[client_channel.sender] = uuid
         self._async_req_uuid[addr] = uuid
         self._async_req_handler[uuid] = handler
+        self._sync_sub[self.socket[addr]] = client_channel
+        return client_channel
+
+    def _connect_channel_flow_push(self, channel, handler, alias=None):
+        """
+        Connect to a server agent FLOW_PUSH channel.
+
+        After connecting, the default number of credits (defined by
+        `osbrain.config['CREDIT']`) is granted to the producer.
+
+        Parameters
+        ----------
+        channel : AgentChannel
+            Agent channel to connect to.
+        alias : str, default is None
+            Optional alias for the new channel.
+        handler, default is None
+            If the new socket receives input messages, the handler/s is/are to
+            be set with this parameter.
+        """
+        validate_handler(handler, required=True)
+        client_channel = channel.twin()
+        if self.registered(client_channel):
+            raise NotImplementedError('Tried to (re)connect a channel')
+        self._connect_and_register(client_channel.receiver, alias=alias,
+                                   handler=handler,
+                                   register_as=client_channel)
+        self.grant(alias or client_channel, config['CREDIT'])
+        return client_channel
+
+    def _connect_channel_worker_pool(self, channel, handler, alias=None):
+        """
+        Connect to a server agent WORKER_POOL channel.
+
+        After connecting, the agent announces it is ready to receive jobs.
+
+        Parameters
+        ----------
+        channel : AgentChannel
+            Agent channel to connect to.
+        alias : str, default is None
+            Optional alias for the new channel.
+        handler, default is None
+            If the new socket receives input messages, the handler/s is/are to
+            be set with this parameter.
+        """
+        validate_handler(handler, required=True)
+        client_channel = channel.twin()
+        if self.registered(client_channel):
+            raise NotImplementedError('Tried to (re)connect a channel')
+        self._connect_and_register(client_channel.receiver, alias=alias,
+                                   handler=handler,
+                                   register_as=client_channel)
+        name = self.name or self.uuid.decode()
+        self.socket[client_channel].send_multipart([b'READY', name.encode()])
         return client_channel
 
+    def pool_stats(self, alias):
+        """
+        Parameters
+        ----------
+        alias : str, AgentChannel
+            Alias of the WORKER_POOL channel.
+
+        Returns
+        -------
+        dict
+            A dictionary in which the key is the worker name and the value is
+            a dictionary with the number of jobs done, the number of jobs
+            lost (due to the worker dying), the time spent working and the
+            throughput (in jobs per second of work).
+        """
+        return self._worker_pool[self.socket[alias]].summary()
+
+    def grant(self, alias, credit=1):
+        """
+        Grant credits to the producer of a FLOW_PULL channel.
+
+        Each credit allows the producer to send one more message to this
+        agent. One credit is automatically granted after each message is
+        handled.
+
+        Parameters
+        ----------
+        alias : str, AgentChannel
+            Alias of the FLOW_PULL channel.
+        credit : int, default is 1
+            Number of credits to grant.
+        """
+        channel = self.address[alias]
+        if channel.kind != 'FLOW_PULL':
+            raise ValueError('Credits can only be granted in FLOW_PULL!')
+        self.socket[alias].send(str(credit).encode())
+
+    def queue_depth(self, alias):
+        """
+        Parameters
+        ----------
+        alias : str, AgentChannel
+            Alias of the FLOW_PUSH or WORKER_POOL channel.
+
+        Returns
+        -------
+        int
+            Number of messages waiting for credits (or, in a WORKER_POOL,
+            waiting for an idle worker) to be sent.
+        """
+        socket = self.socket[alias]
+        if socket in self._worker_pool:
+            return len(self._worker_pool[socket])
+        return len(self._credit_queue[socket])
+
     def _connect_old(self, client_address, alias=None, handler=None):
         if handler is not None:
             raise NotImplementedError('Undefined behavior!')
@@ -892,7 +1219,7 @@ class Agent():
                               register_as=None):
         if not register_as:
             register_as = client_address
-        socket = self.context.socket(client_address.kind.zmq())
+        socket = self._create_socket(client_address.kind)
         socket.connect('%s://%s' % (client_address.transport,
                                     client_address.address))
         self.register(socket, register_as, alias, handler)
@@ -901,16 +1228,94 @@ class Agent():
     def _handle_async_requests(self, data):
         address_uuid, uuid, response = data
         if uuid not in self._pending_requests:
+            # Late replies to retried or forgotten requests are expected
+            if uuid in self._retried or uuid in self._forgotten:
+                return
             error = 'Received response for an unknown request! %s' % uuid
             self.log_warning(error)
             return
         handler = self._pending_requests.pop(uuid)
+        if self._retrying.pop(uuid, None) is not None:
+            self._retried.add(uuid, True)
+        self._execute_handler(handler, response)
 
-        if isinstance(handler, str):
-            handler = getattr(self, handler)
-            handler(response)
-        else:
-            handler(self, response)
+    def _handle_stream_replies(self, data):
+        """
+        Handle the chunks received for a STREAM_REP request.
+
+        The client handler is executed for each chunk and, when the stream is
+        finished, with an `EndOfStream` instance. Chunks are acknowledged
+        every half window, so that the server can keep streaming.
+        """
+        address_uuid, uuid, chunk, end = data
+        if uuid not in self._pending_requests:
+            error = 'Received response for an unknown request! %s' % uuid
+            self.log_warning(error)
+            return
+        if end:
+            handler = self._pending_requests.pop(uuid)
+            del self._stream_requests[uuid]
+            self._execute_handler(handler, EndOfStream())
+            return
+        request = self._stream_requests[uuid]
+        request.last = time.time()
+        self._execute_handler(self._pending_requests[uuid], chunk)
+        request.unacked += 1
+        if request.unacked < Stream.WINDOW // 2:
+            return
+        self._send_stream_control(request, 'ACK', uuid, request.unacked)
+        request.unacked = 0
+
+    def _send_stream_control(self, request, header, uuid, count=None):
+        """
+        Send a control message (`ACK` or `CANCEL`) for a STREAM_REP request.
+
+        Parameters
+        ----------
+        request : StreamRequest
+            Client-side state of the request.
+        header : str
+            Control message type.
+        uuid : bytes
+            Identifier of the request.
+        count : int, default is None
+            Number of chunks acknowledged.
+        """
+        channel = request.channel
+        message = (header, request.address_uuid, uuid, count, None)
+        self.socket[channel].send(
+            serialize_message(message=message, serializer=channel.serializer))
+
+    def _check_stream(self, uuid, wait, on_error):
+        """
+        Check if a STREAM_REP request keeps receiving chunks. If no chunk
+        was received in the last `wait` seconds, the stream is cancelled.
+
+        Parameters
+        ----------
+        uuid : bytes
+            Request identifier.
+        wait : float
+            Maximum number of seconds between chunks.
+        on_error : function, method or string
+            Code to be executed in case the stream is cancelled. If not
+            provided, it will simply log a warning.
+        """
+        request = self._stream_requests.get(uuid)
+        if request is None:
+            return
+        idle = time.time() - request.last
+        if idle < wait:
+            self.after(wait - idle, '_check_stream', uuid, wait, on_error)
+            return
+        del self._stream_requests[uuid]
+        self._pending_requests.pop(uuid, None)
+        self._send_stream_control(request, 'CANCEL', uuid)
+        if not on_error:
+            self.log_warning('Did not receive chunks of stream {} for {} '
+                             'seconds'.format(uuid, wait))
+            return
+        self._execute_handler(on_error)
 
     def _subscribe(self, alias: str, handlers: Dict[Union[bytes, str], Any]):
         """
@@ -936,162 +1341,1360 @@ class Agent():
         # Reset handlers
         self._set_handler(self.socket[alias], curated_handlers)
 
-    def idle(self):
+    def set_batch(self, alias, count=None, size=None, latency=None):
         """
-        This function is to be executed when the agent is idle.
+        Enable (or disable) send-side batching for a PUSH or PUB address.
 
-        After a timeout occurs when the agent's poller receives no data in
-        any of its sockets, the agent may execute this function.
+        Batched messages are coalesced and sent as a single multipart
+        message, which is transparently unbatched by the receiver before
+        dispatching each message to the corresponding handler.
+
+        Parameters
+        ----------
+        alias : str, AgentAddress
+            Alias of the address to batch messages for.
+        count : int, default is None
+            Send the batch when it holds this number of messages.
+        size : int, default is None
+            Send the batch when it holds at least this number of bytes.
+        latency : float, default is None
+            Send the batch when its oldest message has been waiting for this
+            number of seconds.
 
         Note
         ----
-        The timeout is set by the agent's `poll_timeout` attribute.
+        If no limit is set, batching is disabled for the address (pending
+        messages are flushed first).
         """
-        pass
+        address = self.address[alias]
+        if not isinstance(address, AgentAddress) or \
+                address.kind not in ('PUSH', 'PUB'):
+            raise ValueError('Batching is only supported for PUSH and PUB!')
+        socket = self.socket[alias]
+        self._flush_socket(socket)
+        if count is None and size is None and latency is None:
+            self._send_buffer.pop(socket, None)
+            return
+        self._send_buffer[socket] = SendBuffer(count=count, size=size,
+                                               latency=latency)
 
-    def set_attr(self, **kwargs):
+    def flush(self, alias=None):
         """
-        Set object attributes.
+        Send all the messages buffered for batching.
 
         Parameters
         ----------
-        kwargs : [name, value]
-            Keyword arguments will be used to set the object attributes.
+        alias : str, AgentAddress, default is None
+            Alias of the address to flush. If not set, all addresses are
+            flushed.
         """
-        for name, value in kwargs.items():
-            setattr(self, name, value)
-            self.log_info('SET self.%s = %s' % (name, value))
-
-    def get_attr(self, name):
-        return getattr(self, name)
+        if alias is not None:
+            self._flush_socket(self.socket[alias])
+            return
+        for socket in self._send_buffer:
+            self._flush_socket(socket)
 
-    def set_method(self, *args, **kwargs):
+    def _flush_socket(self, socket):
         """
-        Set object methods.
+        Send all the messages buffered for a socket, if any.
 
         Parameters
         ----------
-        args : [function]
-            New methods will be created for each function, taking the same
-            name as the original function.
-        kwargs : [name, function]
-            New methods will be created for each function, taking the name
-            specified by the parameter.
-
-        Returns
-        -------
-        str
-            Name of the registered method in the agent.
-        """
-        for function in args:
-            method = types.MethodType(function, self)
-            name = method.__name__
-            setattr(self, name, method)
-            self.log_info('SET self.%s() = %s' % (name, function))
-        for name, function in kwargs.items():
-            method = types.MethodType(function, self)
-            setattr(self, name, method)
-            self.log_info('SET self.%s() = %s' % (name, function))
-        return name
-
-    def execute_function(self, function, *args, **kwargs):
-        """
-        Execute a function passed as parameter.
+        socket : zmq.Socket
+            Socket to flush.
         """
-        return function(args, kwargs)
+        buff = self._send_buffer.get(socket)
+        if not buff:
+            return
+        for frames in buff.pop():
+            self._send_tracked(socket, frames, multipart=True)
 
-    def loop(self):
+    def _send_tracked(self, socket, data, multipart=False):
         """
-        Agent's main loop.
+        Send a message through a socket, unless it is rate limited and has
+        to be dropped or queued (see `set_rate_limit()`).
 
-        This loop is executed until the `keep_alive` attribute is False
-        or until an error occurs.
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket to send the message through.
+        data : bytes, list
+            Frame or, if `multipart` is set, list of frames.
+        multipart : bool, default is False
+            Whether the message is made of several frames.
         """
-        while self.keep_alive:
-            if self.iterate():
-                break
+        limit = self._rate_limit.get(socket)
+        if limit is not None and self._throttle(limit, data, multipart):
+            return
+        self._send_now(socket, data, multipart)
 
-    def iterate(self):
+    def _send_now(self, socket, data, multipart=False):
         """
-        Agent's main iteration.
-
-        This iteration is normally executed inside the main loop.
-
-        The agent is polling all its sockets for input data. It will wait
-        for `poll_timeout`; after this period, the method `idle` will be
-        executed before polling again.
+        Send a message through a socket, keeping track of the number of
+        messages sent, the send errors and the times the high water mark
+        was reached.
 
-        Returns
-        -------
-        int
-            1 if an error occurred during the iteration (we would expect this
-            to happen if an interruption occurs during polling).
+        Messages are first sent without blocking; if the high water mark is
+        reached, the message is sent again, blocking as usual.
 
-            0 otherwise.
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket to send the message through.
+        data : bytes, list
+            Frame or, if `multipart` is set, list of frames.
+        multipart : bool, default is False
+            Whether the message is made of several frames.
         """
+        stats = self._stats[socket]
+        send = socket.send_multipart if multipart else socket.send
         try:
-            events = dict(self.poller.poll(self.poll_timeout))
-        except zmq.ZMQError as error:
-            # Raise the exception in case it is not due to SIGINT
-            if error.errno == errno.EINTR:
-                return 1
+            send(data, zmq.NOBLOCK)
+        except zmq.Again:
+            stats.hwm += 1
+            send(data)
+        except zmq.ZMQError:
+            stats.send_errors += 1
             raise
+        stats.sent += 1
 
-        if not events:
-            # Agent is idle
-            self.idle()
-            return 0
+    def set_rate_limit(self, alias, rate=None, bandwidth=None, burst=1.,
+                       policy='block'):
+        """
+        Limit the rate at which messages are sent through a socket, using
+        token buckets.
 
-        self._process_events(events)
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the address or channel.
+        rate : float, default is None
+            Maximum number of messages per second.
+        bandwidth : float, default is None
+            Maximum number of bytes per second.
+        burst : float, default is 1.
+            Number of seconds worth of traffic that can be sent at once,
+            after a period of inactivity.
+        policy : str, default is 'block'
+            What to do with messages exceeding the limit: `block` (wait
+            until they can be sent, blocking the agent), `drop` (discard
+            them) or `queue` (send them later, when the agent is not
+            handling any other event).
 
-        return 0
+        Note
+        ----
+        If no limit is set, rate limiting is disabled for the socket
+        (queued messages are sent first). Only the `block` policy is
+        supported for REQ addresses, as requests must be answered before
+        sending any other request.
+        """
+        socket = self.socket[alias]
+        self._disable_rate_limit(socket)
+        if rate is None and bandwidth is None:
+            return
+        if policy != 'block' and self.address[alias].kind == 'REQ':
+            raise ValueError('REQ addresses only support the block policy!')
+        self._rate_limit[socket] = RateLimit(rate, bandwidth, burst, policy)
 
-    def _process_sub_message(self, serializer, message):
+    def _disable_rate_limit(self, socket):
         """
-        Return the received message in a PUBSUB communication.
+        Remove the rate limit of a socket, sending the queued messages.
 
         Parameters
         ----------
-        message : bytes
-            Received message without any treatment. Note that we do not know
-            whether there is a topic or not.
-
+        socket : zmq.Socket
+            Socket to remove the rate limit of.
+        """
+        limit = self._rate_limit.pop(socket, None)
+        if limit is None:
+            return
+        for data, multipart in limit.pending:
+            self._send_now(socket, data, multipart)
+
+    def throttled(self, alias):
+        """
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the rate limited address or channel.
+
+        Returns
+        -------
+        dict
+            The number of messages which could not be sent immediately
+            (`delayed`), the number of messages discarded (`dropped`) and
+            the number of messages waiting to be sent (`queued`).
+        """
+        limit = self._rate_limit[self.socket[alias]]
+        return {'delayed': limit.delayed,
+                'dropped': limit.dropped,
+                'queued': len(limit)}
+
+    def _throttle(self, limit, data, multipart):
+        """
+        Apply the rate limit policy to a message which is to be sent.
+
+        Parameters
+        ----------
+        limit : RateLimit
+            Rate limit of the socket.
+        data : bytes, list
+            Frame or, if `multipart` is set, list of frames.
+        multipart : bool
+            Whether the message is made of several frames.
+
+        Returns
+        -------
+        bool
+            Whether the message must not be sent now (it was dropped or
+            queued).
+        """
+        count, size = message_size(data, multipart)
+        # Queued messages go first, to preserve ordering
+        delay = 1 if limit.pending else limit.delay(count, size)
+        if delay:
+            limit.delayed += 1
+            if limit.policy == 'drop':
+                limit.dropped += 1
+                return True
+            if limit.policy == 'queue':
+                limit.pending.append((data, multipart))
+                return True
+            time.sleep(limit.delay(count, size))
+            limit.delay(count, size)
+        limit.consume(count, size)
+        return False
+
+    def _release_queued(self, timeout):
+        """
+        Send the rate limited messages that can be sent already.
+
+        Parameters
+        ----------
+        timeout : int
+            Current polling timeout, in milliseconds.
+
+        Returns
+        -------
+        int
+            Polling timeout, in milliseconds, so that the next queued
+            message can be sent in time.
+        """
+        for socket, limit in self._rate_limit.items():
+            delay = self._release_socket(socket, limit)
+            if delay is None:
+                continue
+            delay = max(int(delay * 1000), 1)
+            if timeout is None or delay < timeout:
+                timeout = delay
+        return timeout
+
+    def _release_socket(self, socket, limit):
+        """
+        Send the queued messages of a socket that can be sent already.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Rate limited socket.
+        limit : RateLimit
+            Rate limit of the socket.
+
+        Returns
+        -------
+        float
+            Number of seconds until the next queued message can be sent, or
+            `None` if there are no queued messages left.
+        """
+        while limit.pending:
+            data, multipart = limit.pending[0]
+            count, size = message_size(data, multipart)
+            delay = limit.delay(count, size)
+            if delay:
+                return delay
+            limit.pending.popleft()
+            limit.consume(count, size)
+            self._send_now(socket, data, multipart)
+        return None
+
+    def _flush_expired(self):
+        """
+        Flush the send buffers which exhausted their latency budget.
+
+        Returns
+        -------
+        int
+            Polling timeout, in milliseconds, so that the next buffer to
+            expire can be flushed in time.
+        """
+        timeout = self._poll_timeout()
+        for socket, buff in self._send_buffer.items():
+            if buff.expired():
+                self._flush_socket(socket)
+            remaining = buff.remaining()
+            if remaining is None:
+                continue
+            remaining = max(int(remaining * 1000), 0)
+            if timeout is None or remaining < timeout:
+                timeout = remaining
+        return timeout
+
+    def set_shards(self, alias, servers, replicas=64):
+        """
+        Create (or update) a group of PULL servers messages are distributed
+        to by key (see `send()`), so that all the messages with the same key
+        are received by the same server.
+
+        Keys are mapped to servers with consistent hashing: when servers
+        join or leave the group, only the keys of those servers are moved.
+
+        Parameters
+        ----------
+        alias : str
+            Alias of the shard group.
+        servers : list, dict
+            PULL server addresses. If a dictionary is given, the keys are
+            used as labels of the servers (otherwise, the addresses are), so
+            that a server which is replaced keeps its keys.
+        replicas : int, default is 64
+            Number of points of each server in the hash ring, to even the
+            distribution of the keys.
+        """
+        if not isinstance(servers, dict):
+            servers = {str(server.address): server for server in servers}
+        ring = self._shards.get(alias)
+        if ring is None:
+            ring = self._shards[alias] = HashRing(replicas=replicas)
+        for label in set(ring.members) - set(servers):
+            ring.remove(label)
+        for label, server in servers.items():
+            self._add_shard(ring, label, server)
+
+    def _add_shard(self, ring, label, server):
+        """
+        Connect to a PULL server and add it to a shard group.
+
+        Parameters
+        ----------
+        ring : HashRing
+            The shard group.
+        label : str
+            Label of the server.
+        server : AgentAddress
+            PULL server address.
+        """
+        if ring.members.get(label) == server:
+            return
+        if label in ring.members:
+            ring.remove(label)
+        if server.kind != 'PULL':
+            raise ValueError('Shards must be PULL servers!')
+        if not self.registered(server.twin()):
+            self.connect(server)
+        ring.add(label, server)
+
+    def discover_shards(self, alias, prefix, address_alias, period=1.,
+                        replicas=64):
+        """
+        Keep a shard group updated with the agents registered in the name
+        server.
+
+        The name server is queried from the discovery timer's thread, so
+        that the agent is not blocked by the lookups, and the group is
+        updated asynchronously.
+
+        Parameters
+        ----------
+        alias : str
+            Alias of the shard group.
+        prefix : str
+            Agents whose name starts with this prefix are part of the group.
+            Their names are used as labels (see `set_shards()`).
+        address_alias : str
+            Alias of the PULL address of each agent.
+        period : float, default is 1.
+            Look for agents joining or leaving every `period` seconds.
+        replicas : int, default is 64
+            Number of points of each server in the hash ring.
+
+        Returns
+        -------
+        str
+            The alias of the discovery timer.
+        """
+        self._shards.setdefault(alias, HashRing(replicas=replicas))
+        timer = repeat(period, self._discover_shards, alias, prefix,
+                       address_alias)
+        timer_alias = unique_identifier()
+        self._timer[timer_alias] = timer
+        return timer_alias
+
+    def _discover_shards(self, alias, prefix, address_alias):
+        """
+        Look for the agents of a shard group in the name server.
+
+        This method is executed in the discovery timer's thread. All the
+        agents are resolved again, so that restarted agents are updated
+        with their new addresses.
+
+        Parameters
+        ----------
+        alias : str
+            Alias of the shard group.
+        prefix : str
+            Prefix of the names of the agents in the group.
+        address_alias : str
+            Alias of the PULL address of each agent.
+        """
+        try:
+            ns = NSProxy(self.nsaddr, timeout=1.)
+        except (PyroError, TimeoutError):
+            # Keep the current group until the name server is available
+            return
+        try:
+            names = [name for name in ns.agents() if name.startswith(prefix)]
+            servers = {name: self._resolve_shard(ns, name, address_alias)
+                       for name in names}
+        except (PyroError, TimeoutError):
+            return
+        finally:
+            ns.release()
+        self._loopback('EXECUTE_METHOD',
+                       ('_update_shards', (alias, servers), {}))
+
+    def _update_shards(self, alias, servers):
+        """
+        Update a shard group with the agents found in the name server.
+
+        Parameters
+        ----------
+        alias : str
+            Alias of the shard group.
+        servers : dict
+            PULL address of each agent, by name. Agents that could not be
+            resolved (i.e.: `None` addresses) keep their current address,
+            if any.
+        """
+        known = self._shards[alias].members
+        servers = {name: server or known.get(name)
+                   for name, server in servers.items()}
+        self.set_shards(alias, {name: server for name, server
+                                in servers.items() if server is not None})
+
+    def _resolve_shard(self, ns, name, address_alias):
+        """
+        Parameters
+        ----------
+        ns : NSProxy
+            Proxy to the name server.
+        name : str
+            Name of the agent.
+        address_alias : str
+            Alias of the PULL address of the agent.
+
+        Returns
+        -------
+        AgentAddress
+            The PULL address of the agent, or `None` if it is not available
+            (i.e.: the agent is leaving).
+        """
+        try:
+            agent = ns.proxy(name, timeout=0.1)
+            # Unsafe, so that agents without the address yet do not fail
+            addr = agent.unsafe.addr(address_alias)
+            agent.release()
+            return addr
+        except (PyroError, TimeoutError, KeyError):
+            return None
+
+    def _send_shard(self, alias, message, key):
+        ring = self._shards.get(alias)
+        if ring is None:
+            raise ValueError('%s is not a shard group!' % alias)
+        server = ring.get(key)
+        if server is None:
+            raise ValueError('No shards available in %s!' % alias)
+        return self._send_address(server.twin(), message)
+
+    def set_priority(self, alias, priority, burst=100):
+        """
+        Set the priority of a socket.
+
+        In each iteration of the main loop, sockets with input messages are
+        processed in descending order of priority. Sockets with a positive
+        priority are also drained (up to `burst` messages) before the rest
+        are processed, which bounds the starvation of lower-priority
+        sockets.
+
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the address or channel.
+        priority : int
+            Socket priority. Sockets have a priority of `0` by default (the
+            `_loopback_safe` socket, which serves proxies, has `1`).
+        burst : int, default is 100
+            Maximum number of messages processed from the socket in each
+            iteration, for positive priorities.
+        """
+        socket = self.socket[alias]
+        if priority <= 0:
+            burst = 1
+        self._priority[socket] = (priority, burst)
+
+    def subscribed(self, alias, topic):
+        """
+        Parameters
+        ----------
+        alias : str, AgentAddress
+            Alias of the PUB address.
+        topic : str, bytes
+            Publication topic.
+
+        Returns
+        -------
+        bool
+            Whether any subscriber is interested in publications with the
+            given topic. Always `True` for PUB sockets not backed by XPUB.
+        """
+        return self._subscribed(self.socket[alias], topic_to_bytes(topic))
+
+    def _subscribed(self, socket, topic):
+        """
+        Parameters
+        ----------
+        socket : zmq.Socket
+            PUB socket.
+        topic : bytes
+            Publication topic.
+
+        Returns
+        -------
+        bool
+            Whether any subscriber is interested in the topic. Subscriptions
+            are prefixes of the whole message, so a subscription longer
+            than the topic is assumed to match.
+        """
+        if socket not in self._subscriptions:
+            return True
+        return any(topic.startswith(prefix) or prefix.startswith(topic)
+                   for prefix in self._update_subscriptions(socket))
+
+    def _update_subscriptions(self, socket):
+        """
+        Receive all the pending (un)subscription messages of an XPUB socket.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            XPUB socket.
+
+        Returns
+        -------
+        set
+            The topics subscribers are currently subscribed to.
+        """
+        subscriptions = self._subscriptions[socket]
+        while True:
+            try:
+                frame = socket.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                return subscriptions
+            if frame[:1] == b'\x01':
+                subscriptions.add(frame[1:])
+            else:
+                subscriptions.discard(frame[1:])
+
+    def join_broadcast(self, alias, parent, handler, relay=False):
+        """
+        Join a broadcast tree as a node.
+
+        Broadcasts are received from the parent node and, for relay nodes,
+        forwarded to the children nodes as they were received (they are
+        never serialized again).
+
+        Parameters
+        ----------
+        alias : str
+            Alias of the broadcast tree.
+        parent : AgentAddress
+            Address of the parent node.
+        handler : function, method or string
+            Code to be executed on each broadcast.
+        relay : bool, default is False
+            Whether the node has children to forward the broadcasts to.
+
+        Returns
+        -------
+        AgentAddress
+            The address children nodes are to connect to, or `None` if the
+            node does not relay broadcasts.
+        """
+        self._broadcast[alias] = (self._curate_handler(handler), relay)
+        address = None
+        if relay:
+            address = self.bind('PUB', alias=alias, serializer='raw')
+        self.connect(parent, alias='%s_parent' % alias,
+                     handler={alias: self._relay_broadcast})
+        return address
+
+    def broadcast(self, alias, message):
+        """
+        Send a message to all the nodes of a broadcast tree, from its root.
+
+        Parameters
+        ----------
+        alias : str
+            Alias of the broadcast tree (a raw PUB address).
+        message : anything
+            The message to broadcast.
+
+        Returns
+        -------
+        str
+            Identifier of the broadcast.
+        """
+        uuid = unique_identifier()
+        frame = serialize_message((uuid, time.time(), message), 'pickle')
+        self.socket[alias].send(alias.encode() + frame)
+        return uuid
+
+    def _relay_broadcast(self, frame, topic):
+        """
+        Forward a broadcast to the children nodes (if any) and then handle
+        it.
+
+        Parameters
+        ----------
+        frame : bytes
+            Broadcast, as it was received.
+        topic : bytes
+            Alias of the broadcast tree.
+        """
+        alias = topic.decode()
+        handler, relay = self._broadcast[alias]
+        if relay:
+            self.socket[alias].send(frame)
+        uuid, sent, message = deserialize_message(
+            memoryview(frame)[len(topic):], 'pickle')
+        self._broadcast_latency[alias] = (uuid, time.time() - sent)
+        handler(self, message)
+
+    def broadcast_latency(self, alias):
+        """
+        Parameters
+        ----------
+        alias : str
+            Alias of the broadcast tree.
+
+        Returns
+        -------
+        tuple
+            The identifier of the last broadcast received and the number of
+            seconds it took to reach the node since the root sent it (or
+            `None` if no broadcast was received yet).
+        """
+        return self._broadcast_latency.get(alias)
+
+    def socket_stats(self, alias=None):
+        """
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel, default is None
+            Alias of the address or channel.
+
+        Returns
+        -------
+        dict
+            The counters of the socket (`received`, `processed`, `sent`,
+            `send_errors` and `hwm`) and its estimated `backlog`. If no
+            alias is given, a dictionary in which the key is the alias
+            and the value is the counters of its socket, for all the
+            string aliases.
+        """
+        if alias is None:
+            return {key: self.socket_stats(key) for key in self.socket
+                    if isinstance(key, str)}
+        socket = self.socket[alias]
+        stats = self._stats[socket].as_dict()
+        stats['backlog'] = self._backlog(socket)
+        return stats
+
+    def backlog(self, alias):
+        """
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the address or channel.
+
+        Returns
+        -------
+        int
+            Estimated number of messages waiting in the agent to be
+            processed or sent through the socket (see `_backlog()`).
+        """
+        return self._backlog(self.socket[alias])
+
+    def _backlog(self, socket):
+        """
+        Estimate the number of messages waiting in the agent: received but
+        not processed yet (i.e.: the rest of a batch or the messages queued
+        in the inbox of PULL and SUB sockets with a backlog threshold) or
+        waiting to be sent (batched, waiting for credits or for an idle
+        worker).
+
+        Note that messages queued in the ZMQ socket buffers are not known,
+        but those are bounded by the high water mark (see the `hwm`
+        counter).
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket to estimate the backlog of.
+
+        Returns
+        -------
+        int
+            Estimated backlog.
+        """
+        stats = self._stats[socket]
+        backlog = stats.received - stats.processed
+        if socket in self._send_buffer:
+            backlog += len(self._send_buffer[socket])
+        if socket in self._credit_queue:
+            backlog += len(self._credit_queue[socket])
+        if socket in self._worker_pool:
+            backlog += len(self._worker_pool[socket])
+        if socket in self._rate_limit:
+            backlog += len(self._rate_limit[socket])
+        return backlog
+
+    def set_backlog_threshold(self, alias, high, handler, low=None):
+        """
+        Execute a handler when the backlog of a socket crosses a threshold,
+        so that, for example, producers can be throttled.
+
+        The handler is executed when the backlog reaches `high` and then
+        again when it falls back to `low` (the check is done after each
+        iteration of the main loop). It receives the agent, the alias, the
+        backlog and whether the backlog is high.
+
+        PULL and SUB sockets are drained into an inbox (of up to `RCVHWM`
+        messages) when they receive messages, so that their backlog
+        includes the messages waiting to be processed.
+
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the address or channel.
+        high : int
+            High threshold. If `None`, the thresholds are removed.
+        handler : function, method or string
+            Code to be executed when the backlog crosses the thresholds.
+        low : int, default is None
+            Low threshold. Defaults to half the high threshold.
+        """
+        socket = self.socket[alias]
+        if high is None:
+            self._thresholds.pop(socket, None)
+            return
+        if low is None:
+            low = high // 2
+        self._thresholds[socket] = (alias, BacklogThreshold(high, low,
+                                                            handler))
+        if self.address[alias].kind in ('PULL', 'SUB'):
+            self._inbox.setdefault(socket, deque())
+
+    def _fill_inbox(self, socket, inbox, stats):
+        """
+        Receive all the messages queued in a socket, without blocking, so
+        that they are counted as received.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket to receive the messages from.
+        inbox : deque
+            Messages (lists of frames) waiting to be processed.
+        stats : SocketStats
+            Counters of the socket.
+        """
+        # An unlimited high water mark defaults to ZMQ's default
+        size = socket.getsockopt(zmq.RCVHWM) or 1000
+        while len(inbox) < size:
+            try:
+                frames = socket.recv_multipart(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            stats.received += len(frames)
+            inbox.append(frames)
+
+    def _inbox_timeout(self, timeout):
+        """
+        Parameters
+        ----------
+        timeout : int
+            Current polling timeout, in milliseconds.
+
+        Returns
+        -------
+        int
+            Polling timeout, in milliseconds, which is `0` if there are
+            messages waiting in an inbox.
+        """
+        if any(self._inbox.values()):
+            return 0
+        return timeout
+
+    def _check_thresholds(self):
+        """
+        Execute the handlers of the backlog thresholds which were crossed.
+        """
+        for socket, (alias, threshold) in list(self._thresholds.items()):
+            backlog = self._backlog(socket)
+            if threshold.update(backlog):
+                self._execute_handler(threshold.handler, alias, backlog,
+                                      threshold.above)
+
+    def set_conflate(self, alias, conflate=True):
+        """
+        Enable (or disable) conflation in a SUB socket.
+
+        When enabled, all the messages queued in the socket are received at
+        once and only the latest message of each topic is passed to the
+        handlers, so that slow subscribers never fall behind.
+
+        Parameters
+        ----------
+        alias : str, AgentAddress
+            Alias of the SUB address.
+        conflate : bool, default is True
+            Whether to enable or disable conflation.
+        """
+        if self.address[alias].kind != 'SUB':
+            raise ValueError('Conflation is only supported for SUB!')
+        socket = self.socket[alias]
+        if not conflate:
+            self._conflated.pop(socket, None)
+            return
+        self._conflated.setdefault(socket, 0)
+
+    def conflated(self, alias):
+        """
+        Parameters
+        ----------
+        alias : str, AgentAddress
+            Alias of the SUB address.
+
+        Returns
+        -------
+        int
+            Number of messages dropped due to conflation.
+        """
+        return self._conflated[self.socket[alias]]
+
+    def idle(self):
+        """
+        This function is to be executed when the agent is idle.
+
+        After a timeout occurs when the agent's poller receives no data in
+        any of its sockets, the agent may execute this function.
+
+        Note
+        ----
+        The timeout is set by the agent's `poll_timeout` attribute.
+        """
+        pass
+
+    def set_idle_policy(self, iterations=None, interval=None,
+                        max_timeout=None, backoff=2.):
+        """
+        Adapt the idle scheduling to the agent's load.
+
+        By default, `idle()` is only executed after polling for
+        `poll_timeout` milliseconds with no events, which means busy agents
+        never execute it. With an idle policy, it is also executed after a
+        number of busy iterations or a period of time. Idle agents, on the
+        other hand, can poll for longer, multiplying the polling timeout by
+        `backoff` after each timeout (the polling timeout is restored as
+        soon as there are events to process).
+
+        Parameters
+        ----------
+        iterations : int, default is None
+            Execute `idle()` after this number of busy iterations.
+        interval : float, default is None
+            Execute `idle()` when this number of seconds have elapsed since
+            it was last executed, even if the agent is busy.
+        max_timeout : int, default is None
+            Maximum polling timeout, in milliseconds. If not set, the
+            polling timeout is never extended.
+        backoff : float, default is 2.
+            Factor by which the polling timeout is multiplied when idle.
+
+        Note
+        ----
+        If no parameter is set, the default idle scheduling is restored.
+        """
+        if iterations is None and interval is None and max_timeout is None:
+            self._idle_policy = None
+            return
+        self._idle_policy = IdlePolicy(iterations=iterations,
+                                       interval=interval,
+                                       max_timeout=max_timeout,
+                                       backoff=backoff)
+
+    def idle_stats(self):
+        """
+        Returns
+        -------
+        dict
+            The current polling timeout (`timeout`, in milliseconds) and, if
+            an idle policy is set, the number of times `idle()` has been
+            executed (`runs`).
+        """
+        stats = {'timeout': self._poll_timeout()}
+        if self._idle_policy is not None:
+            stats['runs'] = self._idle_policy.runs
+        return stats
+
+    def _poll_timeout(self):
+        """
+        Returns
+        -------
+        int
+            Polling timeout, in milliseconds, according to the idle policy.
+        """
+        if self._idle_policy is None:
+            return self.poll_timeout
+        return self._idle_policy.timeout(self.poll_timeout)
+
+    def _idle_due(self, events, timed_out):
+        """
+        Parameters
+        ----------
+        events : dict
+            Events received in the last iteration.
+        timed_out : bool
+            Whether the agent polled for the full timeout.
+
+        Returns
+        -------
+        bool
+            Whether `idle()` should be executed.
+        """
+        if self._idle_policy is None:
+            return not events and timed_out
+        return self._idle_policy.update(bool(events), timed_out)
+
+    def set_attr(self, **kwargs):
+        """
+        Set object attributes.
+
+        Parameters
+        ----------
+        kwargs : [name, value]
+            Keyword arguments will be used to set the object attributes.
+        """
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+            self.log_info('SET self.%s = %s' % (name, value))
+
+    def get_attr(self, name):
+        return getattr(self, name)
+
+    def set_attrs(self, **kwargs):
+        """
+        Set object attributes, logging a single debug message with the
+        attribute names (instead of an info message with each value, as
+        `set_attr()` does).
+
+        Parameters
+        ----------
+        kwargs : [name, value]
+            Keyword arguments will be used to set the object attributes.
+        """
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+        self.log_debug('SET self.{%s}' % ', '.join(kwargs))
+
+    def get_attrs(self, *names):
+        """
+        Parameters
+        ----------
+        names : [str]
+            Names of the object attributes.
+
+        Returns
+        -------
+        dict
+            A dictionary in which the key is the attribute name and the
+            value is the attribute value.
+        """
+        return {name: getattr(self, name) for name in names}
+
+    def read_attrs(self, *names, attempts=10):
+        """
+        Read a snapshot of object attributes without going through the
+        main loop (proxies never execute this method in the main thread),
+        so that it does not interfere with the agent's throughput.
+
+        Values are copied before being returned, so that they are not
+        modified while being serialized. Note that the main thread may
+        still be modifying the attributes while they are being read, in
+        which case the read is attempted again. Attributes which can not
+        be copied (i.e.: sockets) can not be read.
+
+        Parameters
+        ----------
+        names : [str]
+            Names of the object attributes.
+        attempts : int, default is 10
+            Number of times the read is attempted.
+
+        Returns
+        -------
+        dict
+            A dictionary in which the key is the attribute name and the
+            value is a copy of the attribute value.
+        """
+        for attempt in range(attempts - 1):
+            try:
+                return copy.deepcopy(self.get_attrs(*names))
+            except RuntimeError:
+                # Changed size during iteration
+                continue
+        return copy.deepcopy(self.get_attrs(*names))
+
+    def set_method(self, *args, **kwargs):
+        """
+        Set object methods.
+
+        Parameters
+        ----------
+        args : [function]
+            New methods will be created for each function, taking the same
+            name as the original function.
+        kwargs : [name, function]
+            New methods will be created for each function, taking the name
+            specified by the parameter.
+
+        Returns
+        -------
+        str
+            Name of the registered method in the agent.
+        """
+        for function in args:
+            method = types.MethodType(function, self)
+            name = method.__name__
+            setattr(self, name, method)
+            self.log_info('SET self.%s() = %s' % (name, function))
+        for name, function in kwargs.items():
+            method = types.MethodType(function, self)
+            setattr(self, name, method)
+            self.log_info('SET self.%s() = %s' % (name, function))
+        return name
+
+    def execute_function(self, function, *args, **kwargs):
+        """
+        Execute a function passed as parameter.
+        """
+        return function(args, kwargs)
+
+    def loop(self):
+        """
+        Agent's main loop.
+
+        This loop is executed until the `keep_alive` attribute is False
+        or until an error occurs.
+        """
+        while self.keep_alive:
+            if self.iterate():
+                break
+
+    def iterate(self):
+        """
+        Agent's main iteration.
+
+        This iteration is normally executed inside the main loop.
+
+        The agent is polling all its sockets for input data. It will wait
+        for `poll_timeout`; after this period, the method `idle` will be
+        executed before polling again (see `set_idle_policy()` to adapt
+        this behavior).
+
+        Returns
+        -------
+        int
+            1 if an error occurred during the iteration (we would expect this
+            to happen if an interruption occurs during polling).
+
+            0 otherwise.
+        """
+        poll_timeout = self._poll_timeout()
+        timeout = self._release_queued(self._flush_expired())
+        timeout = self._inbox_timeout(timeout)
+        try:
+            events = dict(self.poller.poll(timeout))
+        except zmq.ZMQError as error:
+            # Raise the exception in case it is not due to SIGINT
+            if error.errno == errno.EINTR:
+                return 1
+            raise
+
+        # Agent is idle (only if the timeout was not shortened to flush
+        # pending batches)
+        if self._idle_due(events, timeout == poll_timeout):
+            self.idle()
+
+        self._process_events(events)
+        self._check_thresholds()
+
+        return 0
+
+    def _process_sub_message(self, serializer, message):
+        """
+        Return the received message in a PUBSUB communication.
+
+        Parameters
+        ----------
+        message : bytes
+            Received message without any treatment. Note that we do not know
+            whether there is a topic or not.
+
         Returns
         -------
         anything
             The content of the message passed.
         """
-        if serializer.requires_separator:
-            sep = message.index(TOPIC_SEPARATOR) + 1
-            message = memoryview(message)[sep:]
+        if serializer.requires_separator:
+            sep = message.index(TOPIC_SEPARATOR) + 1
+            message = memoryview(message)[sep:]
+
+        return deserialize_message(message=message, serializer=serializer)
+
+    def _process_events(self, events):
+        """
+        Process a socket's event.
+
+        Sockets are processed in descending order of priority.
+
+        Parameters
+        ----------
+        events : dict
+            Events to be processed.
+        """
+        sockets = [socket for socket, event in events.items()
+                   if event == zmq.POLLIN]
+        # Messages left in the inboxes do not generate new events
+        sockets += [socket for socket, inbox in self._inbox.items()
+                    if inbox and socket not in events and not socket.closed]
+        sockets.sort(key=lambda socket: self._priority.get(socket, (0, 1))[0],
+                     reverse=True)
+        for socket in sockets:
+            self._process_prioritized_event(socket)
+
+    def _process_prioritized_event(self, socket):
+        """
+        Process a socket's event and, for sockets with a burst, keep
+        processing its input messages until there are no more or the burst
+        is exhausted.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        """
+        _, burst = self._priority.get(socket, (0, 1))
+        self._process_single_event(socket)
+        for _ in range(burst - 1):
+            if not self._pending_input(socket):
+                return
+            self._process_single_event(socket)
+
+    def _pending_input(self, socket):
+        """
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket to check.
+
+        Returns
+        -------
+        bool
+            Whether the socket has input messages ready to be received or
+            waiting in its inbox (and the agent is still alive to process
+            them).
+        """
+        return self.keep_alive and not socket.closed and \
+            (bool(self._inbox.get(socket)) or
+             bool(socket.getsockopt(zmq.EVENTS) & zmq.POLLIN))
+
+    def _process_single_event(self, socket):
+        """
+        Process a socket's event.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        """
+        if socket in self._pool_monitor:
+            self._process_pool_monitor_event(socket)
+            return
+        address = self.address[socket]
+        stats = self._stats[socket]
+        if socket in self._conflated:
+            self._process_conflated_event(socket, address)
+            return
+        if address.kind in ('FLOW_PUSH', 'WORKER_POOL', 'WORKER'):
+            stats.received += 1
+            self._process_multipart_event(socket, address,
+                                          socket.recv_multipart())
+            stats.processed += 1
+            return
+        for data in self._receive_frames(socket, stats):
+            self._process_single_frame(socket, address, data)
+            stats.processed += 1
+
+    def _receive_frames(self, socket, stats):
+        """
+        Receive the next message of a socket (batched messages are received
+        as a single multipart message).
+
+        Sockets with an inbox are drained into it first and the message is
+        taken from the inbox.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket to receive the message from.
+        stats : SocketStats
+            Counters of the socket.
+
+        Returns
+        -------
+        list
+            Frames of the message.
+        """
+        inbox = self._inbox.get(socket)
+        if inbox is None:
+            frames = socket.recv_multipart()
+            stats.received += len(frames)
+            return frames
+        self._fill_inbox(socket, inbox, stats)
+        return inbox.popleft()
+
+    def _process_multipart_event(self, socket, address, frames):
+        """
+        Process an event of a socket in which each message is made of
+        several frames with different meanings (i.e.: peer identities).
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        address : AgentAddress or AgentChannel
+            Agent address or channel associated to the socket.
+        frames : list
+            Frames received on the socket.
+        """
+        if address.kind == 'FLOW_PUSH':
+            self._process_flow_push_event(socket, address, frames)
+        elif address.kind == 'WORKER_POOL':
+            self._process_worker_pool_event(socket, address, frames)
+        else:
+            self._process_worker_event(socket, address, frames)
+
+    def _process_conflated_event(self, socket, address):
+        """
+        Process a conflated SUB socket's event.
+
+        The messages queued in the socket are received (up to the socket's
+        high water mark) and only the latest message of each topic is
+        processed.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        address : AgentAddress
+            Agent address associated to the socket.
+        """
+        latest = {}
+        frames = self._drain_socket(socket)
+        stats = self._stats[socket]
+        stats.received += len(frames)
+        for data in frames:
+            topic = self._conflation_topic(socket, address, data)
+            if latest.pop(topic, None) is not None:
+                self._conflated[socket] += 1
+                stats.processed += 1
+            latest[topic] = data
+        for data in latest.values():
+            self._process_sub_event(socket, address, data)
+            stats.processed += 1
 
-        return deserialize_message(message=message, serializer=serializer)
+    def _drain_socket(self, socket):
+        """
+        Receive the messages queued in a socket, without blocking, up to the
+        socket's high water mark.
 
-    def _process_events(self, events):
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket to receive the messages from.
+
+        Returns
+        -------
+        list
+            Frames received, in order.
         """
-        Process a socket's event.
+        frames = []
+        for _ in range(socket.getsockopt(zmq.RCVHWM) or 1000):
+            try:
+                frames.extend(socket.recv_multipart(zmq.NOBLOCK))
+            except zmq.Again:
+                break
+        return frames
 
+    def _conflation_topic(self, socket, address, data):
+        """
         Parameters
         ----------
-        events : dict
-            Events to be processed.
+        socket : zmq.Socket
+            SUB socket where the message was received.
+        address : AgentAddress
+            Agent address associated to the socket.
+        data : bytes
+            Message received.
+
+        Returns
+        -------
+        bytes
+            The topic of the message. For serializers which do not use a
+            separator, the longest subscribed topic matching the message is
+            used instead.
         """
-        for socket in events:
-            if events[socket] != zmq.POLLIN:
-                continue
-            self._process_single_event(socket)
+        if address.serializer.requires_separator:
+            return data[:data.index(TOPIC_SEPARATOR)]
+        matches = [topic for topic in self.handler[socket]
+                   if data.startswith(topic)]
+        return max(matches, key=len, default=b'')
 
-    def _process_single_event(self, socket):
+    def _process_single_frame(self, socket, address, data):
         """
-        Process a socket's event.
+        Process a single message received in a socket.
 
         Parameters
         ----------
         socket : zmq.Socket
             Socket that generated the event.
+        address : AgentAddress or AgentChannel
+            Agent address or channel associated to the socket.
+        data : bytes
+            Data received on the socket.
         """
-        data = socket.recv()
-        address = self.address[socket]
         if address.kind == 'SUB':
             self._process_sub_event(socket, address, data)
         elif address.kind == 'PULL':
@@ -1116,8 +2719,12 @@ class Agent():
         """
         if address.kind == 'ASYNC_REP':
             self._process_async_rep_event(socket, address, data)
+        elif address.kind == 'STREAM_REP':
+            self._process_stream_rep_event(socket, address, data)
         elif address.kind == 'PULL_SYNC_PUB':
             self._process_sync_pub_event(socket, address.channel, data)
+        elif address.kind == 'FLOW_PULL':
+            self._process_flow_pull_event(socket, address, data)
         else:
             raise NotImplementedError('Unsupported kind %s!' % address.kind)
 
@@ -1135,6 +2742,11 @@ class Agent():
             Data received on the socket.
         """
         message = deserialize_message(message=data, serializer=addr.serializer)
+        accepted, message = self._accept_request(socket, message)
+        if not accepted:
+            reply = DeadlineExceeded()
+            socket.send(serialize_message(reply, addr.serializer))
+            return
         handler = self.handler[socket]
         if inspect.isgeneratorfunction(handler):
             generator = handler(self, message)
@@ -1143,6 +2755,7 @@ class Agent():
         else:
             reply = handler(self, message)
             socket.send(serialize_message(reply, addr.serializer))
+        self.deadline = None
 
     def _process_async_rep_event(self, socket, channel, data):
         """
@@ -1163,6 +2776,42 @@ class Agent():
         client_address = address.twin()
         if not self.registered(client_address):
             self.connect(address)
+        if self._reply_duplicate(socket, client_address, request_uuid):
+            return
+        retry = isinstance(data, Request) and data.retry
+        accepted, data = self._accept_request(socket, data)
+        if not accepted:
+            return
+        reply = self._reply_async_request(socket, client_address,
+                                          address_uuid, request_uuid, data)
+        if retry:
+            cache = self._reply_cache.setdefault(
+                socket, ReplyCache(config['REPLY_CACHE']))
+            cache.add(request_uuid, reply)
+
+    def _reply_async_request(self, socket, client_address, address_uuid,
+                             request_uuid, data):
+        """
+        Execute the handler of an ASYNC_REP request and send the reply.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket the request was received from.
+        client_address : AgentAddress
+            Address to send the reply to.
+        address_uuid : bytes
+            Identifier of the client's channel.
+        request_uuid : bytes
+            Identifier of the request.
+        data : anything
+            The request.
+
+        Returns
+        -------
+        tuple
+            The reply, as sent to the client.
+        """
         handler = self.handler[socket]
         is_generator = inspect.isgeneratorfunction(handler)
         if is_generator:
@@ -1170,9 +2819,165 @@ class Agent():
             reply = next(generator)
         else:
             reply = handler(self, data)
-        self.send(client_address, (address_uuid, request_uuid, reply))
+        self.deadline = None
+        reply = (address_uuid, request_uuid, reply)
+        self.send(client_address, reply)
         if is_generator:
             execute_code_after_yield(generator)
+        return reply
+
+    def _reply_duplicate(self, socket, client_address, request_uuid):
+        """
+        Reply to a duplicate (retried) ASYNC_REP request with the cached
+        reply, without executing the handler again.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket the request was received from.
+        client_address : AgentAddress
+            Address to send the reply to.
+        request_uuid : bytes
+            Identifier of the request.
+
+        Returns
+        -------
+        bool
+            Whether the request was a duplicate.
+        """
+        cache = self._reply_cache.get(socket)
+        if cache is None or request_uuid not in cache:
+            return False
+        self.send(client_address, cache.get(request_uuid))
+        return True
+
+    def _process_stream_rep_event(self, socket, channel, data):
+        """
+        Process a STREAM_REP socket's event.
+
+        The event can either be a new request, which starts a new stream, or
+        an acknowledgement from the client, which allows the server to keep
+        sending chunks of an existing stream.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        channel : AgentChannel
+            AgentChannel associated with the socket that generated the event.
+        data : bytes
+            Data received on the socket.
+        """
+        message = deserialize_message(message=data,
+                                      serializer=channel.serializer)
+        header, address_uuid, request_uuid, data, address = message
+        if header == 'REQUEST':
+            self._start_stream(socket, address_uuid, request_uuid, data,
+                               address)
+            return
+        stream = self._streams.get(request_uuid)
+        if stream is None:
+            return
+        if header == 'CANCEL':
+            self._close_stream(request_uuid)
+            return
+        stream.ack(data)
+        self._pump_stream(request_uuid)
+
+    def _start_stream(self, socket, address_uuid, request_uuid, data,
+                      address):
+        """
+        Start streaming the reply to a STREAM_REP request.
+
+        Generator handlers produce the chunks of the stream. Other handlers
+        reply with a single chunk. Requests whose deadline has passed are
+        dropped.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            STREAM_REP socket the request was received from.
+        address_uuid : bytes
+            Identifier of the client's channel.
+        request_uuid : bytes
+            Identifier of the request.
+        data : anything
+            The request.
+        address : AgentAddress
+            Address to send the chunks to.
+        """
+        accepted, data = self._accept_request(socket, data)
+        if not accepted:
+            return
+        client_address = address.twin()
+        if not self.registered(client_address):
+            self.connect(address)
+        handler = self.handler[socket]
+        if inspect.isgeneratorfunction(handler):
+            generator = handler(self, data)
+        else:
+            generator = iter([handler(self, data)])
+        self._streams[request_uuid] = Stream(generator, client_address,
+                                             address_uuid)
+        if '_drop_abandoned_streams' not in self._timer:
+            self.each(Stream.TIMEOUT / 2, '_drop_abandoned_streams',
+                      alias='_drop_abandoned_streams')
+        self._pump_stream(request_uuid)
+        self.deadline = None
+
+    def _close_stream(self, request_uuid):
+        """
+        Stop streaming the reply to a STREAM_REP request.
+
+        Parameters
+        ----------
+        request_uuid : bytes
+            Identifier of the request.
+        """
+        stream = self._streams.pop(request_uuid)
+        if inspect.isgenerator(stream.generator):
+            stream.generator.close()
+
+    def _drop_abandoned_streams(self):
+        """
+        Close the streams whose clients stopped acknowledging chunks (i.e.:
+        they were disconnected), so that their generators are released.
+
+        It is executed periodically while there are open streams.
+        """
+        now = time.time()
+        for request_uuid, stream in list(self._streams.items()):
+            if stream.abandoned(now):
+                self.log_warning('Stream %s abandoned by the client' %
+                                 request_uuid)
+                self._close_stream(request_uuid)
+        if not self._streams and '_drop_abandoned_streams' in self._timer:
+            self.stop_timer('_drop_abandoned_streams')
+
+    def _pump_stream(self, request_uuid):
+        """
+        Send chunks of a stream while the client allows it.
+
+        Parameters
+        ----------
+        request_uuid : bytes
+            Identifier of the request being streamed.
+        """
+        stream = self._streams[request_uuid]
+        while stream.credit > 0:
+            try:
+                chunk = next(stream.generator)
+            except StopIteration:
+                del self._streams[request_uuid]
+                message = (stream.address_uuid, request_uuid, None, True)
+                self.send(stream.client, message)
+                return
+            except Exception:
+                del self._streams[request_uuid]
+                raise
+            message = (stream.address_uuid, request_uuid, chunk, False)
+            self.send(stream.client, message)
+            stream.credit -= 1
 
     def _process_sync_pub_event(self, socket, channel, data):
         """
@@ -1189,7 +2994,13 @@ class Agent():
         """
         message = deserialize_message(message=data,
                                       serializer=channel.serializer)
-        address_uuid, request_uuid, data = message
+        address_uuid, request_uuid, data = message[:3]
+        if message[3:] == ('SNAPSHOT', ):
+            self._reply_snapshot(channel, address_uuid, request_uuid)
+            return
+        if message[3:] == ('REPLAY', ):
+            self._reply_replay(channel, address_uuid, request_uuid, data)
+            return
         handler = self.handler[socket]
         is_generator = inspect.isgeneratorfunction(handler)
         if is_generator:
@@ -1205,6 +3016,222 @@ class Agent():
         if is_generator:
             execute_code_after_yield(generator)
 
+    def _process_flow_push_event(self, socket, channel, frames):
+        """
+        Process a FLOW_PUSH socket's event (credits granted by a consumer).
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        channel : AgentChannel
+            AgentChannel associated with the socket that generated the event.
+        frames : list
+            Consumer identity and number of credits granted.
+        """
+        identity, credit = frames
+        self._credit_queue[socket].grant(identity, int(credit))
+        self._drain_credit_queue(socket)
+
+    def _drain_credit_queue(self, socket):
+        """
+        Send pending messages while consumers have credits available.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            FLOW_PUSH socket.
+        """
+        queue = self._credit_queue[socket]
+        while queue.pending:
+            identity = queue.consumer()
+            if identity is None:
+                break
+            if not self._send_mandatory(socket,
+                                        [identity, queue.pending[0]]):
+                # The consumer is gone, forget its credits
+                queue.remove(identity)
+                continue
+            queue.pending.popleft()
+            queue.consume(identity)
+
+    def _send_mandatory(self, socket, frames):
+        """
+        Send a message through a ROUTER socket with `ROUTER_MANDATORY` set.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            ROUTER socket.
+        frames : list
+            Peer identity followed by the message frames.
+
+        Returns
+        -------
+        bool
+            Whether the peer was reachable.
+        """
+        stats = self._stats[socket]
+        try:
+            socket.send_multipart(frames)
+        except zmq.ZMQError as error:
+            stats.send_errors += 1
+            if error.errno != zmq.EHOSTUNREACH:
+                raise
+            return False
+        stats.sent += 1
+        return True
+
+    def _process_worker_pool_event(self, socket, channel, frames):
+        """
+        Process a WORKER_POOL socket's event (a worker is ready or done).
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        channel : AgentChannel
+            AgentChannel associated with the socket that generated the event.
+        frames : list
+            Worker identity, command and command argument.
+        """
+        identity, command, argument = frames
+        pool = self._worker_pool[socket]
+        if command == b'READY':
+            pool.ready(identity, name=argument.decode())
+        elif command == b'DONE':
+            pool.done(identity, argument, now=time.time())
+        self._dispatch_jobs(socket)
+
+    def _process_pool_monitor_event(self, monitor):
+        """
+        Process a disconnection in a WORKER_POOL socket.
+
+        ZeroMQ does not tell which peer was disconnected, so all known
+        workers are probed and those which are no longer reachable are
+        removed from the pool (their jobs are queued again).
+
+        Parameters
+        ----------
+        monitor : zmq.Socket
+            Monitor socket that generated the event.
+        """
+        monitor.recv_multipart()
+        socket = self._pool_monitor[monitor]
+        pool = self._worker_pool[socket]
+        for identity in pool.workers():
+            if self._send_mandatory(socket, [identity, b'', b'']):
+                continue
+            dropped = pool.remove(identity)
+            if dropped is not None:
+                self.log_warning('Job %s dropped after %s retries!' %
+                                 (dropped, pool.retries))
+        self._dispatch_jobs(socket)
+
+    def _dispatch_jobs(self, socket):
+        """
+        Send pending jobs to idle workers.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            WORKER_POOL socket.
+        """
+        pool = self._worker_pool[socket]
+        while pool.pending and pool.idle:
+            identity = pool.idle.popleft()
+            job_id, message = pool.pending[0]
+            if not self._send_mandatory(socket, [identity, job_id, message]):
+                pool.remove(identity)
+                continue
+            pool.assign(identity, now=time.time())
+
+    def _process_worker_event(self, socket, channel, frames):
+        """
+        Process a WORKER socket's event.
+
+        The pool is notified when the job is done, so that a new job can be
+        assigned to this worker.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        channel : AgentChannel
+            AgentChannel associated with the socket that generated the event.
+        frames : list
+            Job identifier and job data.
+        """
+        job_id, data = frames
+        # Empty jobs are sent by the pool to probe worker availability
+        if not job_id:
+            return
+        self._process_pull_event(socket, channel, data)
+        socket.send_multipart([b'DONE', job_id])
+
+    def _process_flow_pull_event(self, socket, channel, data):
+        """
+        Process a FLOW_PULL socket's event.
+
+        A new credit is granted to the producer after handling the message.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        channel : AgentChannel
+            AgentChannel associated with the socket that generated the event.
+        data : bytes
+            Data received on the socket.
+        """
+        self._process_pull_event(socket, channel, data)
+        socket.send(b'1')
+
+    def _reply_snapshot(self, channel, address_uuid, request_uuid):
+        """
+        Reply to a snapshot request in a SYNC_PUB channel with the last
+        publication of each topic.
+
+        Parameters
+        ----------
+        channel : AgentChannel
+            The SYNC_PUB channel.
+        address_uuid : bytes
+            Identifier of the client's channel.
+        request_uuid : bytes
+            Identifier of the request.
+        """
+        frames = list(self._cache.get(self.socket[channel], {}).values())
+        message = (address_uuid, request_uuid, frames)
+        self._send_channel_sync_pub(channel=channel,
+                                    message=message,
+                                    topic=address_uuid,
+                                    general=False)
+
+    def _reply_replay(self, channel, address_uuid, request_uuid, data):
+        """
+        Reply to a replay request in a SYNC_PUB channel with the requested
+        publications that are still kept in the replay buffer.
+
+        Parameters
+        ----------
+        channel : AgentChannel
+            The SYNC_PUB channel.
+        address_uuid : bytes
+            Identifier of the client's channel.
+        request_uuid : bytes
+            Identifier of the request.
+        data : tuple
+            Topic and range `(topic, first, last)` of sequence numbers.
+        """
+        replay = self._replay.get(self.socket[channel])
+        frames = replay.replay(*data) if replay else []
+        message = (address_uuid, request_uuid, frames)
+        self._send_channel_sync_pub(channel=channel,
+                                    message=message,
+                                    topic=address_uuid,
+                                    general=False)
+
     def _process_pull_event(self, socket, addr, data):
         """
         Process a PULL socket's event.
@@ -1227,34 +3254,135 @@ class Agent():
 
     def _process_sub_event(self, socket, addr, data):
         """
-        Process a SUB socket's event.
+        Process a SUB socket's event.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket that generated the event.
+        addr : AgentAddress
+            AgentAddress associated with the socket that generated the event.
+        data : bytes
+            Data received on the socket.
+        """
+        message = self._process_sub_message(addr.serializer, data)
+        if isinstance(message, Sequenced):
+            if not self._receive_sequenced(socket, data, message):
+                return
+            message = message.message
+        self._execute_sub_handlers(self.handler[socket], data, message)
+
+    def _execute_sub_handlers(self, handlers, data, message):
+        """
+        Execute the handlers of the topics matching a publication.
+
+        Parameters
+        ----------
+        handlers : dict
+            A dictionary in which the key is the topic and the value is the
+            handler.
+        data : bytes
+            Publication, as it was received.
+        message : anything
+            Publication, deserialized.
+        """
+        for topic in handlers:
+            if not data.startswith(topic):
+                continue
+            # Call the handler (with or without the topic)
+            handler = handlers[topic]
+            nparams = len(inspect.signature(handler).parameters)
+            if nparams == 2:
+                handler(self, message)
+            elif nparams == 3:
+                handler(self, message, topic)
+
+    def _receive_sequenced(self, socket, data, message):
+        """
+        Register a sequenced publication received in a SUB socket and
+        request a replay of the missing publications, if any.
+
+        Conflated sockets drop publications on purpose, so they do not
+        track sequence numbers.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket where the publication was received.
+        data : bytes
+            Publication received.
+        message : Sequenced
+            Publication, deserialized.
+
+        Returns
+        -------
+        bool
+            Whether the publication should be passed to the handlers (i.e.:
+            it is not a duplicate).
+        """
+        if socket in self._conflated:
+            return True
+        tracker = self._sequence.get(socket)
+        if tracker is None:
+            tracker = self._sequence[socket] = SequenceTracker()
+        topic = data[:data.index(TOPIC_SEPARATOR)]
+        process, gap = tracker.receive(topic, message.seq, message.epoch)
+        if gap is not None:
+            self._request_replay(socket, topic, *gap)
+        return process
+
+    def _request_replay(self, socket, topic, first, last):
+        """
+        Request missing publications to a SYNC_PUB channel. Publications
+        received from a PUB address can not be replayed, so they are
+        considered lost.
 
         Parameters
         ----------
         socket : zmq.Socket
-            Socket that generated the event.
-        addr : AgentAddress
-            AgentAddress associated with the socket that generated the event.
-        data : bytes
-            Data received on the socket.
+            SUB socket where the gap was detected.
+        topic : bytes
+            Publication topic.
+        first : int
+            First missing sequence number.
+        last : int
+            Last missing sequence number.
         """
-        handlers = self.handler[socket]
+        channel = self._sync_sub.get(socket)
+        if channel is None:
+            self._sequence[socket].give_up(topic, first, last)
+            return
+        address_uuid = self._async_req_uuid[channel.receiver]
+        request_uuid = unique_identifier()
+        self._pending_requests[request_uuid] = partial(
+            unbound_method(self._handle_replay), alias=address_uuid,
+            topic=topic, first=first, last=last)
+        message = (address_uuid, request_uuid, (topic, first, last), 'REPLAY')
+        self._send_address(channel.sender, message)
 
-        message = self._process_sub_message(addr.serializer, data)
+    def _handle_replay(self, frames, alias, topic, first, last):
+        """
+        Handle the publications replayed by a SYNC_PUB channel. Missing
+        publications which were not replayed are considered lost.
 
-        for topic in handlers:
-            if not data.startswith(topic):
-                continue
-            # Call the handler (with or without the topic)
-            handler = handlers[topic]
-            nparams = len(inspect.signature(handler).parameters)
-            if nparams == 2:
-                handler(self, message)
-            elif nparams == 3:
-                handler(self, message, topic)
+        Parameters
+        ----------
+        frames : list
+            Publications, as they would have been received by the SUB socket.
+        alias : bytes
+            Alias of the SUB socket.
+        topic : bytes
+            Publication topic.
+        first : int
+            First sequence number requested.
+        last : int
+            Last sequence number requested.
+        """
+        self._handle_snapshot(frames, alias)
+        self._sequence[self.socket[alias]].give_up(topic, first, last)
 
     def send(self, address, message, topic=None, handler=None, wait=None,
-             on_error=None):
+             on_error=None, key=None):
         """
         Send a message through the specified address.
 
@@ -1274,11 +3402,18 @@ class Agent():
             for PULL sockets).
         wait : float
             For channel requests, wait at most this number of seconds for a
-            response from the server.
+            response from the server. For REQ addresses and channel
+            requests, the deadline is also sent to the server, which drops
+            the request if it has already expired.
         on_error : function, method or string
             Code to be executed if `wait` is passed and the response is not
             received.
+        key : anything
+            For shard groups, the message is sent to the shard the key is
+            mapped to (see `set_shards()`).
         """
+        if key is not None:
+            return self._send_shard(address, message, key)
         address = self.address[address]
         if isinstance(address, AgentChannel):
             return self._send_channel(channel=address,
@@ -1290,30 +3425,183 @@ class Agent():
         if isinstance(address, AgentAddress):
             return self._send_address(address=address,
                                       message=message,
-                                      topic=topic)
+                                      topic=topic,
+                                      wait=wait)
         raise NotImplementedError('Unsupported address type %s!' % address)
 
-    def _send_address(self, address, message, topic=None):
-        message = serialize_message(message=message,
-                                    serializer=address.serializer)
+    def _send_address(self, address, message, topic=None, wait=None):
+        socket = self.socket[address]
         if address.kind == 'PUB':
-            if topic is None:
-                topic = ''
-            if isinstance(topic, str):
-                topic = topic.encode()
-            message = compose_message(message=message,
-                                      topic=topic,
-                                      serializer=address.serializer)
-        self.socket[address].send(message)
+            topic = topic_to_bytes(topic)
+            if not self._publication_wanted(socket, topic):
+                return
+            message = self._compose_publication(socket, address.serializer,
+                                                message, topic)
+        else:
+            topic = b''
+            if address.kind == 'REQ':
+                message = self._with_deadline(message, wait,
+                                              address.serializer)
+            message = serialize_message(message=message,
+                                        serializer=address.serializer)
+        self._send_frame(socket, message, topic)
+
+    def _with_deadline(self, message, wait, serializer, retry=False):
+        """
+        Wrap a request with its deadline, if any.
+
+        Deadlines can only be propagated with serializers which can wrap
+        the request (i.e.: `pickle` or `dill`). With other serializers, the
+        request is sent as is and the server does not check its deadline.
+
+        Parameters
+        ----------
+        message : anything
+            The request.
+        wait : float
+            Number of seconds the client is going to wait for the reply.
+        serializer : AgentAddressSerializer
+            Serializer of the address or channel.
+        retry : bool, default is False
+            Whether the client may retry the request.
+
+        Returns
+        -------
+        anything
+            The request, wrapped in a `Request` envelope if `wait` is set
+            and the serializer supports it.
+        """
+        if not wait or serializer not in ('pickle', 'dill'):
+            return message
+        return Request(message, time.time() + wait, retry)
+
+    def _accept_request(self, socket, data):
+        """
+        Unwrap a received request and check its deadline, which is exposed
+        to the handlers through the `deadline` attribute.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket the request was received from.
+        data : anything
+            The received request, possibly wrapped in a `Request` envelope.
+
+        Returns
+        -------
+        bool
+            Whether the request is to be handled (`False` if it expired).
+        anything
+            The actual request.
+        """
+        if not isinstance(data, Request):
+            self.deadline = None
+            return True, data
+        self.deadline = data.deadline
+        if not data.expired():
+            return True, data.message
+        self.deadline = None
+        self._expired[socket] = self._expired.get(socket, 0) + 1
+        return False, data.message
+
+    def expired(self, alias):
+        """
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the REP address or the ASYNC_REP/STREAM_REP channel.
+
+        Returns
+        -------
+        int
+            Number of requests dropped because their deadline had passed.
+        """
+        return self._expired.get(self.socket[alias], 0)
+
+    def _publication_wanted(self, socket, topic):
+        """
+        Parameters
+        ----------
+        socket : zmq.Socket
+            PUB socket the publication is to be sent through.
+        topic : bytes
+            Publication topic.
+
+        Returns
+        -------
+        bool
+            Whether the publication must be composed. Publications are
+            always composed when they are kept in a last-value cache or a
+            replay buffer, as late subscribers may still need them.
+        """
+        if socket in self._cache or socket in self._replay:
+            return True
+        return self._subscribed(socket, topic)
+
+    def _compose_publication(self, socket, serializer, message, topic):
+        """
+        Serialize and compose a publication, numbering it and keeping it in
+        the replay buffer and the last-value cache if they are enabled.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            PUB socket the publication is to be sent through.
+        serializer : AgentAddressSerializer
+            Serializer of the address.
+        message : anything
+            The message to publish.
+        topic : bytes
+            Publication topic.
+
+        Returns
+        -------
+        bytes
+            The publication, ready to be sent through the socket.
+        """
+        replay = self._replay.get(socket)
+        if replay is not None:
+            message = replay.wrap(topic, message)
+        message = serialize_message(message=message, serializer=serializer)
+        message = compose_message(message=message,
+                                  topic=topic,
+                                  serializer=serializer)
+        if replay is not None:
+            replay.append(topic, replay.seq[topic], message)
+        if socket in self._cache:
+            self._cache[socket][topic] = message
+        return message
+
+    def _send_frame(self, socket, frame, topic):
+        """
+        Send a frame through a socket or, if batching is enabled, append it
+        to the socket's send buffer.
+
+        Parameters
+        ----------
+        socket : zmq.Socket
+            Socket to send the frame through.
+        frame : bytes
+            Frame to be sent.
+        topic : bytes
+            Topic of the frame (`b''` for non-PUB sockets).
+        """
+        buff = self._send_buffer.get(socket)
+        if buff is None:
+            self._send_tracked(socket, frame)
+            return
+        buff.append(frame, topic=topic)
+        if buff.full() or buff.expired():
+            self._flush_socket(socket)
 
     def _send_channel(self, channel, message, topic, handler, wait, on_error):
         kind = channel.kind
-        if kind == 'ASYNC_REP':
-            return self._send_channel_async_rep(channel=channel,
-                                                message=message,
-                                                wait=wait,
-                                                on_error=on_error,
-                                                handler=handler)
+        if kind in ('ASYNC_REP', 'STREAM_REP'):
+            return self._send_channel_request(channel=channel,
+                                              message=message,
+                                              wait=wait,
+                                              on_error=on_error,
+                                              handler=handler)
         if kind == 'SYNC_PUB':
             return self._send_channel_sync_pub(channel=channel,
                                                message=message,
@@ -1321,9 +3609,25 @@ class Agent():
         if kind == 'SYNC_SUB':
             return self._send_channel_sync_sub(channel, message, topic,
                                                handler, wait, on_error)
+        if kind in ('FLOW_PUSH', 'WORKER_POOL'):
+            return self._send_channel_router(channel, message)
 
         raise NotImplementedError('Unsupported channel kind %s!' % kind)
 
+    def _send_channel_request(self, channel, message, wait, on_error,
+                              handler=None):
+        if channel.kind == 'STREAM_REP':
+            return self._send_channel_stream_rep(channel=channel,
+                                                 message=message,
+                                                 wait=wait,
+                                                 on_error=on_error,
+                                                 handler=handler)
+        return self._send_channel_async_rep(channel=channel,
+                                            message=message,
+                                            wait=wait,
+                                            on_error=on_error,
+                                            handler=handler)
+
     def _send_channel_async_rep(self, channel, message, wait, on_error,
                                 handler=None):
         address = channel.receiver
@@ -1334,27 +3638,150 @@ class Agent():
         else:
             self._pending_requests[request_uuid] = \
                 self._async_req_handler[address_uuid]
+        policy = self._retry_policy.get(self.socket[channel])
+        retry = bool(policy and wait)
+        if retry:
+            self._retrying[request_uuid] = Retry(channel, address_uuid,
+                                                 message, *policy)
+        self._send_async_request(channel, address_uuid, request_uuid,
+                                 message, wait, retry)
+        self._wait_received(wait, uuid=request_uuid, on_error=on_error)
+        return request_uuid
+
+    def _send_async_request(self, channel, address_uuid, request_uuid,
+                            message, wait, retry=False):
+        """
+        Send an ASYNC_REP request (or retry it).
+
+        Parameters
+        ----------
+        channel : AgentChannel
+            Channel to send the request through.
+        address_uuid : bytes
+            Identifier of the client's channel.
+        request_uuid : bytes
+            Identifier of the request, which is kept on retries.
+        message : anything
+            The request.
+        wait : float
+            Number of seconds to wait for the reply.
+        retry : bool, default is False
+            Whether the request may be retried.
+        """
         receiver_address = self.address[address_uuid]
+        message = self._with_deadline(message, wait, channel.serializer,
+                                      retry)
         message = (address_uuid, request_uuid, message, receiver_address)
         message = serialize_message(message=message,
                                     serializer=channel.serializer)
-        self.socket[channel].send(message)
-        self._wait_received(wait, uuid=request_uuid, on_error=on_error)
+        self._send_tracked(self.socket[channel], message)
+
+    def set_retry(self, alias, retries=3, backoff=2.):
+        """
+        Set the retry policy of an ASYNC_REP channel.
+
+        Requests sent with a `wait` time are sent again (with the same
+        request identifier, which the server uses to deduplicate them) when
+        the reply is not received in time. `on_error` is only executed after
+        the last retry. Deduplication requires the `pickle` or `dill`
+        serializers.
+
+        Parameters
+        ----------
+        alias : str, AgentChannel
+            Alias of the ASYNC_REP channel (client side).
+        retries : int, default is 3
+            Maximum number of retries. Retries are disabled with `0`.
+        backoff : float, default is 2.
+            Factor by which the waiting time is multiplied on each retry.
+        """
+        channel = self.address[alias]
+        if channel.kind != 'ASYNC_REP':
+            raise ValueError('Retries are only supported for ASYNC_REP!')
+        if channel.serializer not in ('pickle', 'dill'):
+            raise ValueError('Retries require pickle or dill serializers!')
+        socket = self.socket[alias]
+        if not retries:
+            self._retry_policy.pop(socket, None)
+            return
+        self._retry_policy[socket] = (retries, backoff)
+
+    def _retry_request(self, uuid, wait):
+        """
+        Send a request again if it has retries left.
+
+        Parameters
+        ----------
+        uuid : bytes
+            Request identifier.
+        wait : float
+            The number of seconds waited for the last attempt.
+
+        Returns
+        -------
+        float
+            The number of seconds to wait for the new attempt, or `None`
+            if the request has no retries left.
+        """
+        retry = self._retrying.get(uuid)
+        if retry is None:
+            return None
+        if not retry.retries:
+            del self._retrying[uuid]
+            return None
+        retry.retries -= 1
+        wait *= retry.backoff
+        self._send_async_request(retry.channel, retry.address_uuid, uuid,
+                                 retry.message, wait, retry=True)
+        return wait
+
+    def _send_channel_stream_rep(self, channel, message, wait, on_error,
+                                 handler=None):
+        address = channel.receiver
+        address_uuid = self._async_req_uuid[address]
+        request_uuid = unique_identifier()
+        if handler is None:
+            handler = self._async_req_handler[address_uuid]
+        self._pending_requests[request_uuid] = handler
+        self._stream_requests[request_uuid] = StreamRequest(channel,
+                                                            address_uuid)
+        receiver_address = self.address[address_uuid]
+        message = self._with_deadline(message, wait, channel.serializer)
+        message = ('REQUEST', address_uuid, request_uuid, message,
+                   receiver_address)
+        message = serialize_message(message=message,
+                                    serializer=channel.serializer)
+        self._send_tracked(self.socket[channel], message)
+        if wait:
+            self.after(wait, '_check_stream', request_uuid, wait, on_error)
+        return request_uuid
 
     def _send_channel_sync_pub(self, channel, message, topic=None,
                                general=True):
+        topic = topic_to_bytes(topic)
+        socket = self.socket[channel]
+        if general:
+            message = self._compose_publication(socket, channel.serializer,
+                                                message, channel.uuid + topic)
+        else:
+            message = serialize_message(message=message,
+                                        serializer=channel.serializer)
+            message = compose_message(message=message,
+                                      topic=topic,
+                                      serializer=channel.serializer)
+        self._send_tracked(socket, message)
+
+    def _send_channel_router(self, channel, message):
         message = serialize_message(message=message,
                                     serializer=channel.serializer)
-        if topic is None:
-            topic = ''
-        if isinstance(topic, str):
-            topic = topic.encode()
-        if general:
-            topic = channel.uuid + topic
-        message = compose_message(message=message,
-                                  topic=topic,
-                                  serializer=channel.serializer)
-        self.socket[channel].send(message)
+        socket = self.socket[channel]
+        if channel.kind == 'FLOW_PUSH':
+            self._credit_queue[socket].pending.append(message)
+            self._drain_credit_queue(socket)
+            return
+        self._worker_pool[socket].pending.append((unique_identifier(),
+                                                  message))
+        self._dispatch_jobs(socket)
 
     def _send_channel_sync_sub(self, channel, message, topic, handler, wait,
                                on_error):
@@ -1369,6 +3796,282 @@ class Agent():
         self._wait_received(wait, uuid=request_uuid, on_error=on_error)
         return
 
+    def scatter(self, aliases, message, reducer, wait=None, quorum=None,
+                on_error=None):
+        """
+        Send the same request to many servers and gather their replies.
+
+        Requests are sent through ASYNC_REP channels, so they are processed
+        concurrently by the servers.
+
+        Parameters
+        ----------
+        aliases : list
+            Aliases of the ASYNC_REP channels to send the request through.
+            Channels which are not connected yet are connected automatically.
+        message
+            The request to be sent.
+        reducer : function, method or string
+            Code to be executed, once, when the quorum is reached. It will
+            receive a dictionary in which the key is the alias and the value
+            is the reply received through that alias.
+        wait : float, default is None
+            Wait at most this number of seconds for the quorum to be reached.
+        quorum : int, default is None
+            Number of replies required to execute the reducer. If not set,
+            all the servers must reply.
+        on_error : function, method or string
+            Code to be executed, with the partial replies, if `wait` is
+            passed and the quorum is not reached in time. If not provided, it
+            will simply log a warning.
+
+        Returns
+        -------
+        bytes
+            Identifier of the scatter-gather operation.
+        """
+        gather = Gather(list(aliases), reducer, quorum=quorum,
+                        on_error=on_error)
+        uuid = unique_identifier()
+        self._gather[uuid] = gather
+        handler = unbound_method(self._handle_gather_reply)
+        for alias in gather.aliases:
+            if isinstance(alias, AgentChannel) and not self.registered(alias):
+                self.connect(alias)
+            channel = self.address[alias]
+            if channel.kind != 'ASYNC_REP':
+                raise ValueError('Scatter requires ASYNC_REP channels!')
+            request_uuid = self._send_channel_async_rep(
+                channel=channel, message=message, wait=None, on_error=None,
+                handler=partial(handler, uuid=uuid, alias=alias))
+            gather.requests.append(request_uuid)
+        if wait:
+            gather.timer = self.after(wait, '_gather_timeout', uuid, wait)
+        return uuid
+
+    def _handle_gather_reply(self, response, uuid, alias):
+        """
+        Handle a reply of a scatter-gather operation.
+
+        Parameters
+        ----------
+        response : anything
+            Reply received.
+        uuid : bytes
+            Identifier of the scatter-gather operation.
+        alias : str, AgentChannel
+            Alias of the channel the reply was received from.
+        """
+        gather = self._gather.get(uuid)
+        if gather is None or not gather.reply(alias, response):
+            return
+        del self._gather[uuid]
+        if gather.timer is not None:
+            self.stop_timer(gather.timer)
+        # Replies received after the quorum are ignored
+        self._forget_requests(gather.requests)
+        self._execute_handler(gather.reducer, gather.replies)
+
+    def _gather_timeout(self, uuid, wait):
+        """
+        Check if a scatter-gather operation reached its quorum in time.
+
+        Parameters
+        ----------
+        uuid : bytes
+            Identifier of the scatter-gather operation.
+        wait : float
+            The total number of seconds since the request was made.
+        """
+        gather = self._gather.pop(uuid, None)
+        if gather is None or not gather.expire():
+            return
+        self._forget_requests(gather.requests)
+        if not gather.on_error:
+            warning = ('Quorum not reached for {} after {} seconds '
+                       '({} of {} replies)').format(uuid, wait,
+                                                    len(gather.replies),
+                                                    gather.quorum)
+            self.log_warning(warning)
+            return
+        self._execute_handler(gather.on_error, gather.replies)
+
+    def _forget_requests(self, uuids):
+        """
+        Stop waiting for the replies of some requests. Their identifiers
+        are remembered (up to `config['REPLY_CACHE']` requests), so that
+        late replies are silently dropped.
+
+        Parameters
+        ----------
+        uuids : list
+            Request identifiers.
+        """
+        for uuid in uuids:
+            if self._pending_requests.pop(uuid, None) is not None:
+                self._forgotten.add(uuid, True)
+
+    def _execute_handler(self, handler, *args):
+        """
+        Execute a handler, which can be either a method name or a function
+        that receives the agent as its first parameter.
+        """
+        if isinstance(handler, str):
+            return getattr(self, handler)(*args)
+        return handler(self, *args)
+
+    def set_cache(self, alias, cache=True):
+        """
+        Enable (or disable) the last-value cache of a PUB or SYNC_PUB
+        address.
+
+        When enabled, the last publication of each topic is kept, so that
+        late subscribers can retrieve a snapshot instead of waiting for the
+        next publication.
+
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the PUB or SYNC_PUB address.
+        cache : bool, default is True
+            Whether to enable or disable the cache.
+        """
+        if self.address[alias].kind not in ('PUB', 'SYNC_PUB'):
+            raise ValueError('Caching is only supported for PUB and SYNC_PUB!')
+        socket = self.socket[alias]
+        if not cache:
+            self._cache.pop(socket, None)
+            return
+        self._cache.setdefault(socket, {})
+
+    def snapshot(self, alias):
+        """
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the PUB or SYNC_PUB address.
+
+        Returns
+        -------
+        dict
+            A dictionary in which the key is the topic and the value is the
+            last message published with that topic.
+        """
+        address = self.address[alias]
+        channel_uuid = b''
+        if address.kind == 'SYNC_PUB':
+            channel_uuid = address.uuid
+        snapshot = {}
+        for topic, frame in self._cache[self.socket[alias]].items():
+            message = self._process_sub_message(address.serializer, frame)
+            if isinstance(message, Sequenced):
+                message = message.message
+            snapshot[topic[len(channel_uuid):]] = message
+        return snapshot
+
+    def fetch_snapshot(self, alias, wait=None, on_error=None):
+        """
+        Request the last-value cache snapshot of a SYNC_PUB channel.
+
+        The publications in the snapshot are passed to the subscription
+        handlers, as if they had just been received (i.e.: the same topic
+        filtering applies).
+
+        Parameters
+        ----------
+        alias : str, AgentChannel
+            Alias of the SYNC_SUB channel.
+        wait : float
+            Wait at most this number of seconds for the snapshot to be
+            received.
+        on_error : function, method or string
+            Code to be executed if `wait` is passed and the snapshot is not
+            received.
+        """
+        channel = self.address[alias]
+        if channel.kind != 'SYNC_SUB':
+            raise ValueError('Snapshots can only be fetched from SYNC_SUB!')
+        address_uuid = self._async_req_uuid[channel.receiver]
+        request_uuid = unique_identifier()
+        self._pending_requests[request_uuid] = partial(
+            unbound_method(self._handle_snapshot), alias=address_uuid)
+        message = (address_uuid, request_uuid, None, 'SNAPSHOT')
+        self._send_address(channel.sender, message)
+        self._wait_received(wait, uuid=request_uuid, on_error=on_error)
+
+    def _handle_snapshot(self, frames, alias):
+        """
+        Handle a snapshot received from a SYNC_PUB channel.
+
+        Parameters
+        ----------
+        frames : list
+            Publications, as they would have been received by the SUB socket.
+        alias : bytes
+            Alias of the SUB socket.
+        """
+        socket = self.socket[alias]
+        address = self.address[socket]
+        for frame in frames:
+            self._process_sub_event(socket, address, frame)
+
+    def set_sequence(self, alias, sequence=True, replay=1000):
+        """
+        Enable (or disable) sequence numbers in the publications of a PUB or
+        SYNC_PUB address.
+
+        Publications are numbered per topic, so that subscribers can detect
+        gaps. Subscribers connected to a SYNC_PUB channel request the missing
+        publications, which are replayed from a bounded buffer.
+
+        Calling this method on an address which is already sequenced only
+        changes the size of the buffer, keeping the current numbering.
+
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the PUB or SYNC_PUB address.
+        sequence : bool, default is True
+            Whether to enable or disable sequence numbers.
+        replay : int, default is 1000
+            Maximum number of publications kept, per topic, for replaying.
+        """
+        address = self.address[alias]
+        if address.kind not in ('PUB', 'SYNC_PUB'):
+            raise ValueError(
+                'Sequencing is only supported for PUB and SYNC_PUB!')
+        if address.serializer not in ('pickle', 'dill'):
+            raise ValueError(
+                'Sequencing is only supported for pickle and dill!')
+        socket = self.socket[alias]
+        if not sequence:
+            self._replay.pop(socket, None)
+            return
+        if socket in self._replay:
+            self._replay[socket].resize(replay)
+            return
+        self._replay[socket] = ReplayBuffer(size=replay)
+
+    def sequence_stats(self, alias):
+        """
+        Parameters
+        ----------
+        alias : str, AgentAddress, AgentChannel
+            Alias of the SUB address or SYNC_SUB channel.
+
+        Returns
+        -------
+        dict
+            Number of publications detected as missing (`gaps`), received
+            after a replay (`replayed`), given up (`lost`) and received more
+            than once (`duplicated`).
+        """
+        address = self.address[alias]
+        if address.kind == 'SYNC_SUB':
+            alias = self._async_req_uuid[address.receiver]
+        tracker = self._sequence.get(self.socket[alias], SequenceTracker())
+        return dict(tracker.stats)
+
     def _check_received(self, uuid, wait, on_error):
         """
         Check if the requested information has been received.
@@ -1385,6 +4088,10 @@ class Agent():
         """
         if uuid not in self._pending_requests:
             return
+        retry_wait = self._retry_request(uuid, wait)
+        if retry_wait:
+            self._wait_received(retry_wait, uuid=uuid, on_error=on_error)
+            return
         if not on_error:
             warning = 'Did not receive request {} after {} seconds'.format(
                 uuid, wait)
@@ -1411,7 +4118,7 @@ class Agent():
             return
         return self.after(wait, '_check_received', uuid, wait, on_error)
 
-    def recv(self, address):
+    def recv(self, address, timeout=None):
         """
         Receive a message from the specified address.
 
@@ -1419,7 +4126,12 @@ class Agent():
 
         Parameters
         ----------
-        address :
+        address : str, AgentAddress
+            The REQ address to receive the reply from.
+        timeout : float, default is None
+            Wait at most this number of seconds for the reply. On expiry,
+            the REQ socket is replaced by a new one (as it would otherwise
+            be stuck waiting for the reply) and a `TimeoutError` is raised.
 
         Returns
         -------
@@ -1427,16 +4139,101 @@ class Agent():
             The content received in the address.
 
         """
-        message = self.socket[address].recv()
+        socket = self.socket[address]
+        if timeout is not None and not socket.poll(timeout * 1000):
+            self._reset_req_socket(address)
+            raise TimeoutError('No reply received after %s seconds!' %
+                               timeout)
+        message = socket.recv()
         serializer = self.address[address].serializer
-        return deserialize_message(message=message, serializer=serializer)
+        message = deserialize_message(message=message, serializer=serializer)
+        if isinstance(message, DeadlineExceeded):
+            raise TimeoutError('The server dropped the request, as its '
+                               'deadline had passed!')
+        return message
 
-    def send_recv(self, address, message):
+    def send_recv(self, address, message, wait=None):
         """
         This method is only used in REQREP communication patterns.
+
+        Parameters
+        ----------
+        address : AgentAddress
+            The address to send the request through.
+        message : anything
+            The request.
+        wait : float, default is None
+            If given, wait at most this number of seconds for the reply
+            (see `recv()`). The server also drops the request when it has
+            not started handling it in time.
+        """
+        self.send(address, message, wait=wait)
+        return self.recv(address, timeout=wait)
+
+    def set_req_pool(self, alias, size):
+        """
+        Keep a pool of spare REQ sockets connected to the server, so that
+        a REQ socket which timed out is immediately replaced by an already
+        connected one.
+
+        Parameters
+        ----------
+        alias : str, AgentAddress
+            Alias of the REQ address.
+        size : int
+            Number of spare sockets.
+        """
+        address = self.address[alias]
+        if address.kind != 'REQ':
+            raise ValueError('Socket pools are only supported for REQ!')
+        pool = self._req_pool.setdefault(address, [])
+        while len(pool) < size:
+            pool.append(self._new_req_socket(address))
+        while len(pool) > size:
+            pool.pop().close(linger=0)
+
+    def _new_req_socket(self, address):
+        """
+        Parameters
+        ----------
+        address : AgentAddress
+            REQ address.
+
+        Returns
+        -------
+        zmq.Socket
+            A new REQ socket, connected to the server.
+        """
+        socket = self._create_socket(address.kind)
+        socket.connect('%s://%s' % (address.transport, address.address))
+        return socket
+
+    def _reset_req_socket(self, alias):
+        """
+        Replace a REQ socket by a spare one from the pool (or a new one),
+        closing the former without waiting for its reply (lazy-pirate
+        pattern).
+
+        Parameters
+        ----------
+        alias : str, AgentAddress
+            Alias of the REQ address.
         """
-        self.send(address, message)
-        return self.recv(address)
+        address = self.address[alias]
+        old = self.socket[alias]
+        pool = self._req_pool.get(address)
+        if pool:
+            new = pool.pop(0)
+            pool.append(self._new_req_socket(address))
+        else:
+            new = self._new_req_socket(address)
+        for key in [key for key, value in self.socket.items() if value is old]:
+            self.socket[key] = new
+        self.address[new] = self.address.pop(old)
+        for table in (self._stats, self._priority, self._rate_limit):
+            if old in table:
+                table[new] = table.pop(old)
+        old.close(linger=0)
 
     @Pyro4.oneway
     def run(self):
@@ -1505,8 +4302,15 @@ class Agent():
         """
         Close all non-internal zmq sockets.
         """
+        self.flush()
+        for monitor, sock in self._pool_monitor.items():
+            sock.disable_monitor()
+            monitor.close(linger=0)
         for sock in self.get_unique_external_zmq_sockets():
             sock.close(linger=get_linger())
+        for pool in self._req_pool.values():
+            for sock in pool:
+                sock.close(linger=0)
 
     def ping(self):
         """
@@ -1552,6 +4356,7 @@ class AgentProcess(multiprocessing.Process):
         self.agent = self.base(name=self.name, host=self.host,
                                serializer=self.serializer,
                                transport=self.transport)
+        self.agent.nsaddr = ns.addr()
         uri = self._daemon.register(self.agent)
         ns.register(self.name, uri)
         ns.release()
@@ -0,0 +1,115 @@
+"""
+Implementation of send-side batching features.
+"""
+import time
+
+
+class SendBuffer():
+    """
+    Buffer that coalesces outgoing messages for a single socket.
+
+    Messages are grouped by topic, so that each group can be sent as a single
+    multipart message (PUB-SUB filtering is only applied to the first frame,
+    which means all frames in a multipart message must share the topic).
+
+    Parameters
+    ----------
+    count : int, default is None
+        Flush the buffer when it holds this number of messages.
+    size : int, default is None
+        Flush the buffer when it holds at least this number of bytes.
+    latency : float, default is None
+        Flush the buffer when its oldest message has been waiting for this
+        number of seconds.
+
+    Attributes
+    ----------
+    frames : dict
+        A dictionary in which the key is the topic and the value is the list
+        of buffered frames for that topic.
+    nframes : int
+        Number of frames currently buffered.
+    nbytes : int
+        Number of bytes currently buffered.
+    """
+    def __init__(self, count=None, size=None, latency=None):
+        if count is None and size is None and latency is None:
+            raise ValueError('At least one batching limit must be set!')
+        self.count = count
+        self.size = size
+        self.latency = latency
+        self.frames = {}
+        self.nframes = 0
+        self.nbytes = 0
+        self.time0 = None
+
+    def __len__(self):
+        return self.nframes
+
+    def append(self, frame, topic=b''):
+        """
+        Append a new frame to the buffer.
+
+        Parameters
+        ----------
+        frame : bytes
+            Frame, ready to be sent through the socket.
+        topic : bytes, default is b''
+            Topic the frame was composed with (if any).
+        """
+        if not self.nframes:
+            self.time0 = time.time()
+        self.frames.setdefault(topic, []).append(frame)
+        self.nframes += 1
+        self.nbytes += len(frame)
+
+    def full(self):
+        """
+        Returns
+        -------
+        bool
+            Whether the count or size limits have been reached.
+        """
+        if self.count is not None and self.nframes >= self.count:
+            return True
+        if self.size is not None and self.nbytes >= self.size:
+            return True
+        return False
+
+    def remaining(self):
+        """
+        Returns
+        -------
+        float
+            Seconds remaining until the latency budget is exhausted. `None`
+            if there is no latency limit or the buffer is empty.
+        """
+        if self.latency is None or not self.nframes:
+            return None
+        return self.latency - (time.time() - self.time0)
+
+    def expired(self):
+        """
+        Returns
+        -------
+        bool
+            Whether the oldest buffered message exceeded the latency budget.
+        """
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def pop(self):
+        """
+        Empty the buffer.
+
+        Returns
+        -------
+        list
+            A list of multipart messages (lists of frames), one per topic.
+        """
+        batches = list(self.frames.values())
+        self.frames = {}
+        self.nframes = 0
+        self.nbytes = 0
+        self.time0 = None
+        return batches
@@ -0,0 +1,117 @@
+"""
+Implementation of broadcast trees, which distribute messages to many agents
+through relay nodes.
+"""
+
+
+class BroadcastTree():
+    """
+    Relay tree to broadcast messages from a root agent to many nodes.
+
+    Instead of sending each broadcast to all the nodes, the root sends it to
+    `fanout` children, which forward it to their own children, and so on.
+    Broadcasts are serialized once, by the root, and forwarded as they were
+    received.
+
+    Parameters
+    ----------
+    nsproxy : NSProxy
+        Proxy to the name server the agents are registered in.
+    root : str
+        Name of the agent broadcasting the messages.
+    handler : function
+        Code to be executed by the nodes on each broadcast.
+    nodes : list, default is None
+        Names of the nodes. If not given, all the agents registered in the
+        name server (except the root) are used.
+    fanout : int, default is 2
+        Number of children of each node.
+    alias : str, default is 'broadcast'
+        Alias of the tree in the agents.
+
+    Attributes
+    ----------
+    depth : int
+        Number of levels of the tree (not counting the root).
+    """
+    def __init__(self, nsproxy, root, handler, nodes=None, fanout=2,
+                 alias='broadcast'):
+        if fanout < 1:
+            raise ValueError('The fanout must be a positive integer!')
+        if nodes is None:
+            nodes = [name for name in nsproxy.agents() if name != root]
+        self.alias = alias
+        self.fanout = fanout
+        self.root = nsproxy.proxy(root)
+        self.nodes = [nsproxy.proxy(name) for name in nodes]
+        self.depth = 0
+        self._build(handler)
+
+    def _build(self, handler):
+        """
+        Make each node join the tree. Parents are always joined before
+        their children.
+        """
+        addresses = [self.root.bind('PUB', alias=self.alias,
+                                    serializer='raw')]
+        for index, node in enumerate(self.nodes):
+            relay = self.fanout * (index + 1) < len(self.nodes)
+            address = node.join_broadcast(self.alias,
+                                          addresses[self.parent(index) + 1],
+                                          handler, relay=relay)
+            addresses.append(address)
+        # The last node is always in the deepest level
+        index = len(self.nodes) - 1
+        while index >= 0:
+            self.depth += 1
+            index = self.parent(index)
+
+    def parent(self, index):
+        """
+        Parameters
+        ----------
+        index : int
+            Index of a node.
+
+        Returns
+        -------
+        int
+            Index of the parent node (`-1` for the root).
+        """
+        return index // self.fanout - 1
+
+    def send(self, message):
+        """
+        Broadcast a message to all the nodes.
+
+        Parameters
+        ----------
+        message : anything
+            The message to broadcast.
+
+        Returns
+        -------
+        str
+            Identifier of the broadcast.
+        """
+        return self.root.broadcast(self.alias, message)
+
+    def dissemination_time(self, uuid):
+        """
+        Parameters
+        ----------
+        uuid : str
+            Identifier of the broadcast.
+
+        Returns
+        -------
+        float
+            Number of seconds it took for the broadcast to reach all the
+            nodes, or `None` if it has not reached all of them yet.
+        """
+        latencies = [node.broadcast_latency(self.alias)
+                     for node in self.nodes]
+        if any(latency is None or latency[0] != uuid
+               for latency in latencies):
+            return None
+        return max(latency for _, latency in latencies)
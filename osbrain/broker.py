@@ -0,0 +1,184 @@
+"""
+Implementation of broker agents, which forward messages between many
+agents using ZeroMQ proxies.
+"""
+from threading import Thread
+
+import zmq
+
+from . import config
+from . import Agent
+from . import run_agent
+from .address import AgentAddress
+from .common import unique_identifier
+from .proxy import NSProxy
+
+
+class Broker(Agent):
+    """
+    Specialized Agent which forwards messages between a frontend and a
+    backend socket. Forwarding is done by `zmq.proxy_steerable`, in a
+    separate thread, so messages are never handled in Python.
+
+    Agents connect to the broker addresses as they would connect to any
+    other agent (i.e.: the frontend of a `FORWARDER` broker looks like a
+    `SUB` server, so agents connecting to it will publish through it).
+
+    The following kinds of brokers are available:
+
+    - `FORWARDER`: publishers connect to the frontend (`XSUB`) and
+      subscribers to the backend (`XPUB`). Subscriptions are forwarded to
+      the publishers.
+    - `QUEUE`: requesters connect to the frontend (`ROUTER`) and repliers
+      to the backend (`DEALER`). Requests are load-balanced among repliers.
+    - `STREAMER`: pushers connect to the frontend (`PULL`) and pullers to
+      the backend (`PUSH`).
+    """
+    KINDS = {
+        'FORWARDER': ((zmq.XSUB, 'SUB'), (zmq.XPUB, 'PUB')),
+        'QUEUE': ((zmq.ROUTER, 'REP'), (zmq.DEALER, 'REQ')),
+        'STREAMER': ((zmq.PULL, 'PULL'), (zmq.PUSH, 'PUSH')),
+    }
+
+    def on_init(self):
+        self._proxy = None
+
+    def start_broker(self, kind, frontend=None, backend=None,
+                     transport=None, serializer=None):
+        """
+        Bind the frontend and backend sockets and start forwarding messages.
+
+        The addresses are available with the aliases `frontend` and
+        `backend` (i.e.: `NSProxy.addr(broker_name, 'frontend')`) and the
+        broker is tagged in the name server, so that it can be found with
+        `NSProxy.brokers()`.
+
+        Parameters
+        ----------
+        kind : str
+            Broker kind: `FORWARDER`, `QUEUE` or `STREAMER`.
+        frontend : str, default is None
+            The address to bind the frontend to.
+        backend : str, default is None
+            The address to bind the backend to.
+        transport : str, AgentAddressTransport, default is None
+            Transport protocol.
+        serializer : str, default is None
+            Serializer of the messages. The broker does not deserialize the
+            messages, but the agents connecting to it will use it.
+
+        Returns
+        -------
+        tuple
+            The frontend and backend addresses.
+        """
+        if kind not in self.KINDS:
+            raise ValueError('Invalid broker kind %s!' % kind)
+        if self._proxy is not None:
+            raise RuntimeError('Broker already started!')
+        transport = transport \
+            or self.transport \
+            or config['TRANSPORT']
+        serializer = serializer \
+            or self.serializer \
+            or config['SERIALIZER']
+        sockets = []
+        for alias, addr, (socket_type, address_kind) in \
+                zip(('frontend', 'backend'), (frontend, backend),
+                    self.KINDS[kind]):
+            socket = self.context.socket(socket_type)
+            addr = self._bind_socket(socket, addr=addr, transport=transport)
+            address = AgentAddress(transport, addr, address_kind, 'server',
+                                   serializer)
+            self.address[alias] = address
+            self.address[address] = address
+            sockets.append(socket)
+        control_address = 'inproc://%s' % unique_identifier()
+        control = self.context.socket(zmq.PAIR)
+        control.bind(control_address)
+        thread = Thread(target=self._forward,
+                        args=(sockets, control_address), daemon=True)
+        self._proxy = (thread, control)
+        thread.start()
+        self._tag_broker(kind)
+        return self.address['frontend'], self.address['backend']
+
+    def _tag_broker(self, kind):
+        """
+        Tag the broker in the name server, so that it can be discovered.
+
+        Parameters
+        ----------
+        kind : str
+            Broker kind.
+        """
+        if self.nsaddr is None:
+            return
+        ns = NSProxy(self.nsaddr)
+        ns.set_metadata(self.name, {'broker', 'broker:%s' % kind})
+        ns.release()
+
+    def _forward(self, sockets, control_address):
+        """
+        Forward messages until the proxy is terminated.
+
+        Parameters
+        ----------
+        sockets : list
+            Frontend and backend sockets, which are owned by this thread
+            from now on.
+        control_address : str
+            Address of the socket used to terminate the proxy.
+        """
+        control = self.context.socket(zmq.PAIR)
+        control.connect(control_address)
+        try:
+            zmq.proxy_steerable(sockets[0], sockets[1], None, control)
+        finally:
+            for socket in sockets + [control]:
+                socket.close(linger=0)
+
+    def close_sockets(self):
+        """
+        Terminate the proxy and close all non-internal zmq sockets.
+        """
+        if self._proxy is not None:
+            thread, control = self._proxy
+            control.send(b'TERMINATE')
+            thread.join()
+            control.close(linger=0)
+            self._proxy = None
+        super().close_sockets()
+
+
+def run_broker(name, kind, nsaddr=None, addr=None, base=Broker,
+               transport=None, serializer=None):
+    """
+    Ease the broker creation process.
+
+    This function will create a new broker, start the process and start
+    forwarding messages.
+
+    Parameters
+    ----------
+    name : str
+        Broker name or alias.
+    kind : str
+        Broker kind: `FORWARDER`, `QUEUE` or `STREAMER`.
+    nsaddr : SocketAddress, default is None
+        Name server address.
+    addr : SocketAddress, default is None
+        New broker address, if it is to be fixed.
+    transport : str, AgentAddressTransport, default is None
+        Transport protocol.
+    serializer : str, default is None
+        Serializer of the messages.
+
+    Returns
+    -------
+    proxy
+        A proxy to the new broker.
+    """
+    proxy = run_agent(name, nsaddr, addr, base)
+    proxy.start_broker(kind, transport=transport, serializer=serializer)
+    return proxy
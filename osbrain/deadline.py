@@ -0,0 +1,60 @@
+"""
+Implementation of request deadlines.
+"""
+import time
+
+
+class Request():
+    """
+    Envelope for a request with a deadline.
+
+    Deadlines are absolute (as returned by `time.time()`), so that the time
+    requests spend queued is taken into account. Note that this assumes the
+    clocks of the client and server hosts are synchronized.
+
+    Parameters
+    ----------
+    message : anything
+        The actual request.
+    deadline : float
+        Time after which the client is no longer waiting for the reply.
+    retry : bool, default is False
+        Whether the client may retry the request, in which case the server
+        keeps the reply to answer duplicates.
+    """
+    __slots__ = ('message', 'deadline', 'retry')
+
+    def __init__(self, message, deadline, retry=False):
+        self.message = message
+        self.deadline = deadline
+        self.retry = retry
+
+    def __getstate__(self):
+        return (self.message, self.deadline, self.retry)
+
+    def __setstate__(self, state):
+        self.message, self.deadline, self.retry = state
+
+    def expired(self, now=None):
+        """
+        Parameters
+        ----------
+        now : float, default is None
+            Current time. If not given, it is read from the clock.
+
+        Returns
+        -------
+        bool
+            Whether the deadline has passed.
+        """
+        if now is None:
+            now = time.time()
+        return now > self.deadline
+
+
+class DeadlineExceeded():
+    """
+    Reply of REP servers to requests whose deadline has passed, as they
+    need to reply anyway (without executing the handler).
+    """
+    pass
@@ -0,0 +1,248 @@
+"""
+Implementation of flow control features.
+"""
+from collections import deque
+
+
+class CreditQueue():
+    """
+    Producer-side state for credit-based flow control.
+
+    Consumers grant credits to the producer, which is only allowed to send
+    one message per credit. Messages that can not be sent are kept in a
+    pending queue until new credits are granted.
+
+    Attributes
+    ----------
+    credit : dict
+        A dictionary in which the key is the consumer identity and the value
+        is the number of credits available for that consumer.
+    pending : collections.deque
+        Messages waiting for credits to be sent.
+    """
+    def __init__(self):
+        self.credit = {}
+        self.pending = deque()
+
+    def __len__(self):
+        return len(self.pending)
+
+    def grant(self, identity, credit):
+        """
+        Grant credits for a consumer.
+
+        Parameters
+        ----------
+        identity : bytes
+            Consumer identity.
+        credit : int
+            Number of credits granted.
+        """
+        self.credit[identity] = self.credit.get(identity, 0) + credit
+
+    def remove(self, identity):
+        """
+        Forget a consumer and its credits.
+
+        Parameters
+        ----------
+        identity : bytes
+            Consumer identity.
+        """
+        self.credit.pop(identity, None)
+
+    def consumer(self):
+        """
+        Select the consumer that should receive the next message.
+
+        Returns
+        -------
+        bytes
+            The identity of the consumer with the highest number of credits,
+            or `None` if no credits are available.
+        """
+        if not self.credit:
+            return None
+        identity = max(self.credit, key=self.credit.get)
+        if self.credit[identity] <= 0:
+            return None
+        return identity
+
+    def consume(self, identity):
+        """
+        Consume one credit from a consumer.
+
+        Parameters
+        ----------
+        identity : bytes
+            Consumer identity.
+        """
+        self.credit[identity] -= 1
+
+    def available(self):
+        """
+        Returns
+        -------
+        int
+            Total number of credits available.
+        """
+        return sum(self.credit.values())
+
+
+class WorkerPool():
+    """
+    Server-side state for the load-balancing worker pool pattern.
+
+    Workers announce they are ready to receive a job and notify when they
+    are done with it. Jobs are only sent to idle workers, so a slow worker
+    never accumulates a backlog. Jobs assigned to a worker that dies are
+    retried with another worker.
+
+    Parameters
+    ----------
+    retries : int, default is 3
+        Maximum number of times a job is retried after its worker died.
+
+    Attributes
+    ----------
+    idle : collections.deque
+        Identities of the workers waiting for a job, in arrival order.
+    pending : collections.deque
+        Jobs, in the form `(job_id, message)`, waiting for an idle worker.
+    busy : dict
+        A dictionary in which the key is the worker identity and the value
+        is the `(job_id, message, start_time)` being processed.
+    names : dict
+        A dictionary in which the key is the worker identity and the value
+        is the worker name.
+    stats : dict
+        A dictionary in which the key is the worker name and the value is a
+        dictionary with the number of jobs done and the time spent on them.
+    attempts : dict
+        A dictionary in which the key is the job identifier and the value is
+        the number of times the job has been retried.
+    """
+    def __init__(self, retries=3):
+        self.retries = retries
+        self.idle = deque()
+        self.pending = deque()
+        self.busy = {}
+        self.names = {}
+        self.stats = {}
+        self.attempts = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def ready(self, identity, name=None):
+        """
+        Register a worker as idle.
+
+        Parameters
+        ----------
+        identity : bytes
+            Worker identity.
+        name : str, default is None
+            Worker name. Only required the first time the worker is ready.
+        """
+        if name is not None:
+            self.names[identity] = name
+            self.stats.setdefault(name, {'done': 0, 'time': 0., 'lost': 0})
+        self.idle.append(identity)
+
+    def done(self, identity, job_id, now):
+        """
+        Mark a job as done and register the worker as idle.
+
+        Parameters
+        ----------
+        identity : bytes
+            Worker identity.
+        job_id : bytes
+            Identifier of the finished job.
+        now : float
+            Current timestamp, in seconds.
+        """
+        job = self.busy.pop(identity, None)
+        if job is not None and job[0] == job_id:
+            stats = self.stats[self.names[identity]]
+            stats['done'] += 1
+            stats['time'] += now - job[2]
+            self.attempts.pop(job_id, None)
+        self.ready(identity)
+
+    def assign(self, identity, now):
+        """
+        Assign the next pending job to a worker.
+
+        Parameters
+        ----------
+        identity : bytes
+            Worker identity.
+        now : float
+            Current timestamp, in seconds.
+
+        Returns
+        -------
+        tuple
+            The `(job_id, message)` assigned.
+        """
+        job_id, message = self.pending.popleft()
+        self.busy[identity] = (job_id, message, now)
+        return job_id, message
+
+    def remove(self, identity):
+        """
+        Forget a dead worker, queueing its job again if it was busy.
+
+        Parameters
+        ----------
+        identity : bytes
+            Worker identity.
+
+        Returns
+        -------
+        bytes
+            Identifier of the job that was dropped after exhausting its
+            retries, or `None`.
+        """
+        if identity in self.idle:
+            self.idle.remove(identity)
+        name = self.names.pop(identity, None)
+        job = self.busy.pop(identity, None)
+        if job is None:
+            return None
+        self.stats[name]['lost'] += 1
+        job_id, message, _ = job
+        attempts = self.attempts.get(job_id, 0) + 1
+        if attempts > self.retries:
+            self.attempts.pop(job_id, None)
+            return job_id
+        self.attempts[job_id] = attempts
+        self.pending.appendleft((job_id, message))
+        return None
+
+    def workers(self):
+        """
+        Returns
+        -------
+        list
+            Identities of all the known workers.
+        """
+        return list(self.names.keys())
+
+    def summary(self):
+        """
+        Returns
+        -------
+        dict
+            A dictionary in which the key is the worker name and the value is
+            a dictionary with the number of jobs done, lost (due to the
+            worker dying), the time spent on them and the throughput (in
+            jobs per second of work).
+        """
+        summary = {}
+        for name, stats in self.stats.items():
+            throughput = stats['done'] / stats['time'] if stats['time'] else 0.
+            summary[name] = dict(stats, throughput=throughput)
+        return summary
@@ -0,0 +1,109 @@
+"""
+Implementation of adaptive idle scheduling.
+"""
+import time
+
+
+class IdlePolicy():
+    """
+    Policy which decides when an agent executes its `idle()` method and
+    how long it polls for events.
+
+    Idle work is executed after each polling timeout with no events (as
+    usual) but also, under load, every `iterations` busy iterations or
+    every `interval` seconds. When the agent is idle, the polling timeout
+    is multiplied by `backoff` after each timeout, up to `max_timeout`.
+
+    Parameters
+    ----------
+    iterations : int, default is None
+        Execute idle work after this number of busy iterations.
+    interval : float, default is None
+        Execute idle work when this number of seconds have elapsed since it
+        was last executed, even if the agent is busy.
+    max_timeout : int, default is None
+        Maximum polling timeout, in milliseconds. If not set, the polling
+        timeout is never extended.
+    backoff : float, default is 2.
+        Factor by which the polling timeout is multiplied when idle.
+
+    Attributes
+    ----------
+    level : int
+        Number of consecutive idle timeouts.
+    busy : int
+        Number of busy iterations since idle work was last executed.
+    last : float
+        Time at which idle work was last executed.
+    runs : int
+        Number of times idle work has been executed.
+    """
+    def __init__(self, iterations=None, interval=None, max_timeout=None,
+                 backoff=2.):
+        if backoff < 1:
+            raise ValueError('The backoff factor must be at least 1!')
+        self.iterations = iterations
+        self.interval = interval
+        self.max_timeout = max_timeout
+        self.backoff = backoff
+        self.level = 0
+        self.busy = 0
+        self.last = time.time()
+        self.runs = 0
+
+    def timeout(self, base):
+        """
+        Parameters
+        ----------
+        base : int
+            Base polling timeout, in milliseconds (`None` to wait forever).
+
+        Returns
+        -------
+        int
+            Polling timeout, in milliseconds.
+        """
+        if base is None or self.max_timeout is None:
+            return base
+        timeout = base * self.backoff ** self.level
+        return int(min(max(timeout, base), self.max_timeout))
+
+    def update(self, busy, timed_out):
+        """
+        Update the policy after an iteration.
+
+        Parameters
+        ----------
+        busy : bool
+            Whether any events were processed in the iteration.
+        timed_out : bool
+            Whether the agent polled for the full timeout (i.e.: it was not
+            shortened to send pending messages in time).
+
+        Returns
+        -------
+        bool
+            Whether idle work should be executed.
+        """
+        if busy:
+            return self._update_busy()
+        if not timed_out:
+            return False
+        if self.max_timeout and self.backoff ** self.level < self.max_timeout:
+            self.level += 1
+        return self._run()
+
+    def _update_busy(self):
+        self.level = 0
+        self.busy += 1
+        if self.iterations and self.busy >= self.iterations:
+            return self._run()
+        if self.interval and time.time() - self.last >= self.interval:
+            return self._run()
+        return False
+
+    def _run(self):
+        self.busy = 0
+        self.last = time.time()
+        self.runs += 1
+        return True
@@ -2,6 +2,9 @@
 Implementation of logging-related features.
 """
 import os
+
+import zmq
+
 from . import Agent
 from . import run_agent
 
@@ -33,6 +36,27 @@ class Logger(Agent):
             'DEBUG': self.log_handler
         }
         self.bind('SUB', 'sub', handlers)
+        self._levels = set(handlers)
+
+    def set_levels(self, *levels):
+        """
+        Only receive log messages of the given levels.
+
+        Agents publishing through XPUB-backed sockets (see the `xpub`
+        attribute of the agents) will not even format the rest of the log
+        messages.
+
+        Parameters
+        ----------
+        levels : str
+            Log levels (i.e.: 'ERROR', 'WARNING').
+        """
+        socket = self.socket['sub']
+        for level in self._levels - set(levels):
+            socket.setsockopt(zmq.UNSUBSCRIBE, level.encode())
+        for level in set(levels) - self._levels:
+            socket.setsockopt(zmq.SUBSCRIBE, level.encode())
+        self._levels = set(levels)
 
     def log_handler(self, message, topic):
         """
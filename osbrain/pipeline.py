@@ -0,0 +1,306 @@
+"""
+Implementation of pipelines, which launch and wire multi-stage agent graphs.
+"""
+import time
+
+from . import Agent
+from . import run_agent
+
+
+class StageAgent(Agent):
+    """
+    Specialized Agent which executes a pipeline stage: each input message
+    is passed to the stage handler and the result (if not `None`) is sent
+    to the next stage.
+
+    Attributes
+    ----------
+    stage_handler : function
+        Stage handler, which receives the agent and the input message and
+        returns the message to send to the next stage.
+    processed : int
+        Number of input messages processed.
+    sent : int
+        Number of messages sent to the next stage.
+    """
+    def on_init(self):
+        self.stage_handler = None
+        self.processed = 0
+        self.sent = 0
+        self._first = None
+
+    def process(self, message):
+        """
+        Handle an input message of the stage.
+        """
+        if self._first is None:
+            self._first = time.time()
+        self.processed += 1
+        result = self.stage_handler(self, message)
+        if result is None or not self.registered('out'):
+            return
+        self.sent += 1
+        self.send('out', result)
+
+    def stage_stats(self):
+        """
+        Returns
+        -------
+        dict
+            The number of messages processed and sent, and the number of
+            seconds elapsed since the first input message was received.
+        """
+        elapsed = time.time() - self._first if self._first else 0.
+        return {'processed': self.processed,
+                'sent': self.sent,
+                'elapsed': elapsed}
+
+
+class Stage():
+    """
+    Pipeline stage definition and state.
+
+    Parameters
+    ----------
+    name : str
+        Stage name.
+    handler : function
+        Stage handler.
+    parallelism : int
+        Number of agents executing the stage.
+    link : str
+        Kind of the link which feeds the stage: `PUSH` or `FLOW_PUSH`.
+    batch : int
+        Number of messages batched in the link which feeds the stage.
+    base : Agent
+        Class of the agents executing the stage.
+
+    Attributes
+    ----------
+    agents : list
+        Proxies to the agents executing the stage.
+    outputs : list
+        Addresses the agents of the stage send their results through.
+    """
+    def __init__(self, name, handler, parallelism, link, batch, base):
+        self.name = name
+        self.handler = handler
+        self.parallelism = parallelism
+        self.link = link
+        self.batch = batch
+        self.base = base
+        self.agents = []
+        self.outputs = []
+
+
+class Pipeline():
+    """
+    Declarative multi-stage pipeline of agents.
+
+    Stages are added in order and then launched and wired with `run()`.
+    Each agent of a stage receives messages from all the agents of the
+    previous stage, which are load-balanced among them.
+
+    Parameters
+    ----------
+    name : str
+        Pipeline name, used as a prefix for the names of the agents.
+    nsaddr : SocketAddress, default is None
+        Name server address.
+    """
+    LINKS = ('PUSH', 'FLOW_PUSH')
+    LATENCY = 0.01
+
+    def __init__(self, name, nsaddr=None):
+        self.name = name
+        self.nsaddr = nsaddr
+        self.stages = []
+        self._inputs = []
+        self._running = False
+
+    def add_stage(self, name, handler, parallelism=1, link='PUSH',
+                  batch=None, base=StageAgent):
+        """
+        Add a stage to the end of the pipeline.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+        handler : function
+            Stage handler. It receives the agent and the input message and
+            returns the message to send to the next stage (or `None`).
+        parallelism : int, default is 1
+            Number of agents executing the stage.
+        link : str, default is 'PUSH'
+            Kind of the link which feeds the stage: `PUSH` or `FLOW_PUSH`
+            (credit-based, which bounds the messages in flight).
+        batch : int, default is None
+            If given, messages sent to the stage are batched (only for
+            `PUSH` links). Incomplete batches are sent after `LATENCY`
+            seconds.
+        base : StageAgent, default is StageAgent
+            Class of the agents executing the stage.
+
+        Returns
+        -------
+        Pipeline
+            The pipeline, so that calls can be chained.
+        """
+        if self._running:
+            raise RuntimeError('Stages must be added before running!')
+        if link not in self.LINKS:
+            raise ValueError('Invalid pipeline link %s!' % link)
+        if batch and link != 'PUSH':
+            raise ValueError('Batching is only supported for PUSH links!')
+        self.stages.append(Stage(name, handler, parallelism, link, batch,
+                                 base))
+        return self
+
+    def run(self):
+        """
+        Launch the agents of all the stages and wire them.
+        """
+        if not self.stages:
+            raise ValueError('The pipeline has no stages!')
+        self._running = True
+        for index, stage in enumerate(self.stages):
+            for _ in range(stage.parallelism):
+                self._add_agent(index)
+
+    def feed(self, agent, alias):
+        """
+        Connect an agent to the first stage of the pipeline, so that it can
+        send messages to it with `agent.send(alias, message)`.
+
+        Parameters
+        ----------
+        agent : Proxy
+            Agent feeding the pipeline.
+        alias : str
+            Alias of the new address in the agent.
+        """
+        stage = self.stages[0]
+        address = self._bind_output(agent, alias, stage)
+        self._inputs.append(address)
+        for consumer in stage.agents:
+            self._connect_input(consumer, address)
+
+    def scale(self, name, parallelism):
+        """
+        Add agents to a running stage.
+
+        Parameters
+        ----------
+        name : str
+            Stage name.
+        parallelism : int
+            New number of agents executing the stage.
+        """
+        index = self._stage_index(name)
+        stage = self.stages[index]
+        if parallelism < len(stage.agents):
+            raise ValueError('Stages can only be scaled up!')
+        while len(stage.agents) < parallelism:
+            self._add_agent(index)
+        stage.parallelism = parallelism
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            A dictionary in which the key is the stage name and the value
+            is a dictionary with the number of `agents`, the number of
+            messages `processed`, the `throughput` (messages per second)
+            and the `queue` depth (messages sent to the stage but not yet
+            processed, or `None` for the first stage).
+        """
+        stats = {}
+        sent = None
+        for stage in self.stages:
+            agents = [agent.stage_stats() for agent in stage.agents]
+            processed = sum(x['processed'] for x in agents)
+            stats[stage.name] = {
+                'agents': len(agents),
+                'processed': processed,
+                'throughput': sum(x['processed'] / x['elapsed']
+                                  for x in agents if x['elapsed']),
+                'queue': None if sent is None else sent - processed,
+            }
+            sent = sum(x['sent'] for x in agents)
+        return stats
+
+    def shutdown(self):
+        """
+        Shutdown all the agents of the pipeline.
+        """
+        for stage in self.stages:
+            for agent in stage.agents:
+                agent.shutdown()
+            stage.agents = []
+            stage.outputs = []
+        self._running = False
+
+    def _stage_index(self, name):
+        for index, stage in enumerate(self.stages):
+            if stage.name == name:
+                return index
+        raise ValueError('Unknown stage %s!' % name)
+
+    def _add_agent(self, index):
+        """
+        Launch a new agent for a stage and wire it to the agents of the
+        previous and next stages.
+
+        Parameters
+        ----------
+        index : int
+            Stage index.
+        """
+        stage = self.stages[index]
+        name = '%s-%s-%s' % (self.name, stage.name, len(stage.agents))
+        agent = run_agent(name, self.nsaddr, base=stage.base)
+        agent.set_attr(stage_handler=stage.handler)
+        inputs = self._inputs if index == 0 \
+            else self.stages[index - 1].outputs
+        for address in inputs:
+            self._connect_input(agent, address)
+        stage.agents.append(agent)
+        if index + 1 == len(self.stages):
+            return
+        following = self.stages[index + 1]
+        address = self._bind_output(agent, 'out', following)
+        stage.outputs.append(address)
+        for consumer in following.agents:
+            self._connect_input(consumer, address)
+
+    def _bind_output(self, agent, alias, stage):
+        """
+        Bind the address an agent sends messages to a stage through.
+
+        Parameters
+        ----------
+        agent : Proxy
+            Agent sending messages to the stage.
+        alias : str
+            Alias of the address in the agent.
+        stage : Stage
+            Stage the messages are sent to.
+
+        Returns
+        -------
+        AgentAddress, AgentChannel
+            The new address.
+        """
+        address = agent.bind(stage.link, alias=alias)
+        if stage.batch:
+            agent.set_batch(alias, count=stage.batch, latency=self.LATENCY)
+        return address
+
+    def _connect_input(self, agent, address):
+        """
+        Connect a stage agent to the output of an agent of the previous
+        stage.
+        """
+        agent.connect(address, handler='process')
@@ -1,8 +1,14 @@
 """
 Implementation of proxy-related features.
 """
+import asyncio
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
 import os
 import sys
+from threading import Lock
+from threading import Thread
 import time
 
 import Pyro4
@@ -47,6 +53,213 @@ def locate_ns(nsaddr, timeout=3.):
             raise TimeoutError('Could not locate the name server!')
 
 
+_EXECUTOR = (None, None)
+
+
+def _executor():
+    """
+    Returns
+    -------
+    ThreadPoolExecutor
+        The thread pool executing the proxy calls which return futures. A
+        new pool is created for each process.
+    """
+    global _EXECUTOR
+    pid, executor = _EXECUTOR
+    if pid != os.getpid():
+        executor = ThreadPoolExecutor(max_workers=config['FUTURE_WORKERS'])
+        _EXECUTOR = (os.getpid(), executor)
+    return executor
+
+
+class ProxyCache():
+    """
+    Cache of the URIs of the agents, so that short-lived proxies do not need
+    to look agents up in the name server.
+
+    Idle connections to the agents can be pooled too, so that new proxies
+    do not need to connect again. Note that each connection holds one of
+    the workers of the agent's Pyro daemon (see
+    `Pyro4.config.THREADPOOL_SIZE`), so pooling is disabled by default, the
+    number of idle connections is limited to a quarter of the workers and
+    idle connections are closed after a timeout.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of idle connections kept for each agent. If `0`,
+        connections are not pooled.
+    timeout : float
+        Number of seconds after which idle connections are closed.
+
+    Attributes
+    ----------
+    uris : dict
+        A dictionary in which the key is the name server address and the
+        agent name and the value is the agent URI.
+    idle : dict
+        A dictionary in which the key is the agent URI and the value is a
+        list of idle connections, along with the agent metadata and the
+        time they were released.
+    """
+    def __init__(self, size, timeout):
+        self.size = min(size, Pyro4.config.THREADPOOL_SIZE // 4)
+        self.timeout = timeout
+        self.uris = {}
+        self.idle = {}
+        self.lock = Lock()
+        self.reaper = None
+
+    def uri(self, nsaddr, name):
+        """
+        Parameters
+        ----------
+        nsaddr : SocketAddress
+            Name server address.
+        name : str
+            Agent name.
+
+        Returns
+        -------
+        str
+            The agent URI, or `None` if it is not known.
+        """
+        return self.uris.get((nsaddr, name))
+
+    def add(self, nsaddr, name, uri):
+        """
+        Cache the URI of an agent.
+        """
+        self.uris[(nsaddr, name)] = str(uri)
+
+    def invalidate(self, nsaddr, name):
+        """
+        Forget the URI of an agent, closing its idle connections.
+        """
+        uri = self.uris.pop((nsaddr, name), None)
+        with self.lock:
+            idle = self.idle.pop(uri, [])
+        for connection, _ in idle:
+            connection[0].close()
+
+    def acquire(self, uri):
+        """
+        Parameters
+        ----------
+        uri : str
+            Agent URI.
+
+        Returns
+        -------
+        tuple
+            An idle connection to the agent, along with the agent metadata,
+            or `None` if there are no idle connections.
+        """
+        with self.lock:
+            idle = self.idle.get(str(uri))
+            if not idle:
+                return None
+            connection, _ = idle.pop()
+            if not idle:
+                del self.idle[str(uri)]
+        return connection
+
+    def release(self, uri, connection):
+        """
+        Keep an idle connection to an agent.
+
+        Parameters
+        ----------
+        uri : str
+            Agent URI.
+        connection : tuple
+            The connection, along with the agent metadata.
+
+        Returns
+        -------
+        bool
+            Whether the connection was kept (`False` if pooling is disabled
+            or there are too many idle connections already).
+        """
+        with self.lock:
+            idle = self.idle.setdefault(str(uri), [])
+            if len(idle) >= self.size:
+                if not idle:
+                    del self.idle[str(uri)]
+                return False
+            idle.append((connection, time.time()))
+            if self.reaper is None:
+                self.reaper = Thread(target=self._reap, daemon=True)
+                self.reaper.start()
+        return True
+
+    def _reap(self):
+        """
+        Close the expired idle connections periodically, until there are no
+        idle connections left.
+        """
+        while True:
+            time.sleep(self.timeout / 2)
+            with self.lock:
+                expired = self._pop_expired(time.time())
+                if not self.idle:
+                    self.reaper = None
+            for connection in expired:
+                connection[0].close()
+            if self.reaper is None:
+                return
+
+    def _pop_expired(self, now):
+        """
+        Parameters
+        ----------
+        now : float
+            Current time.
+
+        Returns
+        -------
+        list
+            The idle connections which expired, which are no longer kept.
+        """
+        expired = []
+        for uri, idle in list(self.idle.items()):
+            expired += [connection for connection, released in idle
+                        if now - released >= self.timeout]
+            idle[:] = [(connection, released) for connection, released
+                       in idle if now - released < self.timeout]
+            if not idle:
+                del self.idle[uri]
+        return expired
+
+
+_CACHE = (None, None)
+
+
+def _proxy_cache():
+    """
+    Returns
+    -------
+    ProxyCache
+        The proxy cache. A new cache is created for each process, as
+        connections can not be shared among processes.
+    """
+    global _CACHE
+    pid, cache = _CACHE
+    if pid != os.getpid():
+        cache = ProxyCache(config['PROXY_POOL'], config['PROXY_POOL_TIMEOUT'])
+        _CACHE = (os.getpid(), cache)
+    return cache
+
+
+class ProxyFuture(Future):
+    """
+    Result of an asynchronous proxy call. It is a `concurrent.futures`
+    future which can also be awaited from asyncio coroutines.
+    """
+    def __await__(self):
+        return asyncio.wrap_future(self).__await__()
+
+
 class Proxy(Pyro4.core.Proxy):
     """
     A proxy to access remote agents.
@@ -62,23 +275,76 @@ class Proxy(Pyro4.core.Proxy):
     safe : bool, default is None
         Use safe calls by default. When not set, osbrain default's
         `osbrain.config['SAFE']` is used.
+
+    Note
+    ----
+    Agent URIs and connections are cached (see `ProxyCache`), so that
+    creating and releasing proxies to the same agent is cheap.
     """
     def __init__(self, name, nsaddr=None, timeout=3., safe=None):
         if not nsaddr:
             nsaddr = os.environ.get('OSBRAIN_NAMESERVER_ADDRESS')
-        nshost, nsport = address_to_host_port(nsaddr)
-        # Make sure name server exists
-        locate_ns(nsaddr)
-        time0 = time.time()
-        super().__init__('PYRONAME:%s@%s:%s' % (name, nshost, nsport))
+        self._nsaddr = SocketAddress(*address_to_host_port(nsaddr))
+        self._name = name
         if safe is not None:
             self._default_safe = safe
         else:
             self._default_safe = config['SAFE']
         self._safe = self._default_safe
         self._next_oneway = False
+        self._next_future = False
+        if not self._connect_cached():
+            self._connect(nsaddr, timeout)
+
+    def _connect(self, nsaddr, timeout):
+        """
+        Connect to the agent, looking it up in the name server.
+
+        Parameters
+        ----------
+        nsaddr : SocketAddress, str
+            Name server address.
+        timeout : float
+            Timeout, in seconds, to wait until the agent is discovered.
+        """
+        # Make sure name server exists
+        locate_ns(nsaddr)
+        time0 = time.time()
+        super().__init__('PYRONAME:%s@%s:%s' % (self._name,
+                                                self._nsaddr.host,
+                                                self._nsaddr.port))
         while not self._ready_or_timeout(time0, timeout):
             continue
+        _proxy_cache().add(self._nsaddr, self._name, self._pyroUri)
+
+    def _connect_cached(self):
+        """
+        Connect to the agent using its cached URI and an idle connection,
+        if any.
+
+        Returns
+        -------
+        bool
+            Whether the proxy is connected (`False` if the URI was not
+            cached or the agent could not be reached, in which case the URI
+            is removed from the cache).
+        """
+        cache = _proxy_cache()
+        uri = cache.uri(self._nsaddr, self._name)
+        if uri is None:
+            return False
+        super().__init__(uri)
+        connection = cache.acquire(uri)
+        if connection is not None:
+            self._pyroConnection, self._pyroMethods, self._pyroAttrs, \
+                self._pyroOneway = connection
+        try:
+            self.unsafe.ping()
+        except Exception:
+            cache.invalidate(self._nsaddr, self._name)
+            self._pyroRelease()
+            return False
+        return True
 
     def _ready_or_timeout(self, time0, timeout):
         """
@@ -93,6 +359,8 @@ class Proxy(Pyro4.core.Proxy):
             exception.
         """
         try:
+            # Bind to the agent's URI, so that it can be cached
+            self._pyroBind()
             self.unsafe.ping()
         except Exception:
             if time.time() - time0 < timeout:
@@ -102,16 +370,21 @@ class Proxy(Pyro4.core.Proxy):
 
     def __getstate__(self):
         return super().__getstate__() + \
-            (self._next_oneway, self._default_safe, self._safe)
+            (self._nsaddr, self._name, self._next_future, self._next_oneway,
+             self._default_safe, self._safe)
 
     def __setstate__(self, state):
-        super().__setstate__(state[:-3])
+        super().__setstate__(state[:-6])
+        self._nsaddr = state[-6]
+        self._name = state[-5]
+        self._next_future = state[-4]
         self._next_oneway = state[-3]
         self._default_safe = state[-2]
         self._safe = state[-1]
 
     def __setattr__(self, name, value):
-        if name in ('_safe', '_default_safe', '_next_oneway'):
+        if name in ('_safe', '_default_safe', '_next_oneway',
+                    '_next_future', '_nsaddr', '_name'):
             return super(Pyro4.core.Proxy, self).__setattr__(name, value)
         if name.startswith('_'):
             return super().__setattr__(name, value)
@@ -123,10 +396,21 @@ class Proxy(Pyro4.core.Proxy):
             return self.get_attr(name)
         return super().__getattr__(name)
 
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
     def release(self):
         """
-        Release the connection to the Pyro daemon.
+        Release the connection to the Pyro daemon. If connection pooling
+        is enabled (see `config['PROXY_POOL']`), the connection is kept in
+        the proxy cache, to be reused by other proxies to the same agent.
         """
+        connection = self._pyroConnection
+        if connection is not None and _proxy_cache().release(
+                self._pyroUri, (connection, set(self._pyroMethods),
+                                set(self._pyroAttrs), set(self._pyroOneway))):
+            self._pyroConnection = None
+            return
         self._pyroRelease()
 
     def nsaddr(self):
@@ -136,7 +420,19 @@ class Proxy(Pyro4.core.Proxy):
         SocketAddress
             The socket address of the name server.
         """
-        return SocketAddress(self._pyroUri.host, self._pyroUri.port)
+        return self._nsaddr
+
+    def batch(self):
+        """
+        Queue method calls, to be executed with a single round-trip.
+
+        Returns
+        -------
+        ProxyBatch
+            A context manager which queues the calls and executes them, in
+            order, on exit.
+        """
+        return ProxyBatch(self)
 
     @property
     def safe(self):
@@ -153,17 +449,60 @@ class Proxy(Pyro4.core.Proxy):
         self._next_oneway = True
         return self
 
+    @property
+    def future(self):
+        """
+        Make the next call asynchronous: it returns a `ProxyFuture`
+        immediately, which can be waited for or awaited.
+
+        Calls through the same proxy are still executed one at a time, so
+        use a proxy for each agent to call many agents concurrently.
+        """
+        self._next_future = True
+        return self
+
     def _pyroInvoke(self, methodname, args, kwargs, flags=0, objectId=None):
+        mode = (self._safe, self._next_oneway)
+        self._safe = self._default_safe
+        self._next_oneway = False
+        if not self._next_future:
+            return self._invoke(mode, methodname, args, kwargs, flags,
+                                objectId)
+        self._next_future = False
+        future = ProxyFuture()
+        _executor().submit(self._resolve, future, mode, methodname, args,
+                           kwargs, flags, objectId)
+        return future
+
+    def _resolve(self, future, *args):
+        """
+        Execute a remote call and set the result of its future.
+        """
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(self._invoke(*args))
+        except BaseException as error:
+            future.set_exception(error)
+
+    def _invoke(self, mode, methodname, args, kwargs, flags, objectId):
+        """
+        Execute a remote call.
+
+        Parameters
+        ----------
+        mode : tuple
+            Whether the call is safe and whether it is oneway.
+        """
         try:
             result = self._remote_call(
-                methodname, args, kwargs, flags, objectId)
+                methodname, args, kwargs, flags, objectId, *mode)
         except:
             sys.stdout.write(''.join(Pyro4.util.getPyroTraceback()))
             sys.stdout.flush()
+            if isinstance(sys.exc_info()[1], Pyro4.errors.CommunicationError):
+                _proxy_cache().invalidate(self._nsaddr, self._name)
             raise
-        finally:
-            self._safe = self._default_safe
-            self._next_oneway = False
         self._post_invoke(methodname, args, kwargs)
         return result
 
@@ -183,21 +522,22 @@ class Proxy(Pyro4.core.Proxy):
         """
         return (methodname in self._pyroMethods and
                 not methodname.startswith('_') and
-                methodname not in ('run', 'get_attr', 'kill', 'safe_call',
-                                   'concurrent'))
+                methodname not in ('run', 'get_attr', 'read_attrs', 'kill',
+                                   'safe_call', 'concurrent'))
 
-    def _remote_call(self, methodname, args, kwargs, flags, objectId):
+    def _remote_call(self, methodname, args, kwargs, flags, objectId, safe,
+                     oneway):
         """
         Call a remote method from the proxy.
         """
-        if self._next_oneway:
+        if oneway:
             # Hardcoded Pyro4.core.MessageFactory flag (cannot be imported)
             pyro4_FLAGS_ONEWAY = 1 << 2
             flags |= pyro4_FLAGS_ONEWAY
             result = super()._pyroInvoke(
                 methodname, args, kwargs, flags=flags, objectId=objectId)
             return result
-        if self._safe and self._is_safe_method(methodname):
+        if safe and self._is_safe_method(methodname):
             safe_args = [methodname] + list(args)
             result = super()._pyroInvoke(
                 'safe_call', safe_args, kwargs,
@@ -219,7 +559,7 @@ class Proxy(Pyro4.core.Proxy):
         """
         if methodname == 'set_method':
             self._set_new_available_methods(args, kwargs)
-        elif methodname == 'set_attr':
+        elif methodname in ('set_attr', 'set_attrs'):
             self._set_new_available_attributes(kwargs)
 
     def _set_new_available_methods(self, args, kwargs):
@@ -251,6 +591,51 @@ class Proxy(Pyro4.core.Proxy):
             self._pyroAttrs.add(name)
 
 
+class ProxyBatch():
+    """
+    Batch of method calls to a remote agent, executed in order with a
+    single remote call when the context is exited.
+
+    Calls made inside the context return `None`; their results are
+    available in the `results` attribute afterwards. If the proxy is safe,
+    the whole batch is executed in the agent's main thread.
+
+    Parameters
+    ----------
+    proxy : Proxy
+        Proxy to the agent.
+
+    Attributes
+    ----------
+    calls : list
+        Queued calls, as `(method, args, kwargs)` tuples.
+    results : list
+        Results of the calls, once executed.
+    """
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.calls = []
+        self.results = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            return
+        self.results = self.proxy.execute_batch(self.calls)
+        for method, args, kwargs in self.calls:
+            self.proxy._post_invoke(method, args, kwargs)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+        return queue
+
+
 class NSProxy(Pyro4.core.Proxy):
     """
     A proxy to access a name server.
@@ -318,6 +703,86 @@ class NSProxy(Pyro4.core.Proxy):
         agent.release()
         return addr
 
+    def broadcast_call(self, pattern, method, *args, timeout=3., **kwargs):
+        """
+        Call a method on all the agents matching a pattern, concurrently.
+
+        Each call uses a short-lived proxy, which is released (i.e.: it
+        does not hold any worker of the agent) as soon as the call
+        completes. Agent URIs are cached, so further broadcast calls do not
+        need to look the agents up again.
+
+        Calls which do not complete in time are cancelled if they did not
+        start yet. Calls which already started can not be interrupted: they
+        complete in the background and their result is discarded.
+
+        Parameters
+        ----------
+        pattern : str
+            Regular expression the agent names must match.
+        method : str
+            Name of the method to call.
+        timeout : float, default is 3.
+            Number of seconds to wait for all the calls to complete.
+        *args : tuple
+            Parameters to pass for the method execution.
+        **kwargs : dict
+            Named parameters to pass for the method execution.
+
+        Returns
+        -------
+        dict
+            A dictionary in which the key is the agent name and the value is
+            the result of the call, for the calls which succeeded.
+        dict
+            A dictionary in which the key is the agent name and the value is
+            the exception raised (or a `TimeoutError`), for the calls which
+            failed.
+        """
+        nsaddr = self.addr()
+        names = [name for name in self.list(regex=pattern)
+                 if name != Pyro4.constants.NAMESERVER_NAME]
+        futures = {name: _executor().submit(self._call_agent, nsaddr, name,
+                                            method, args, kwargs)
+                   for name in names}
+        wait(futures.values(), timeout=timeout)
+        results = {}
+        errors = {}
+        for name, future in futures.items():
+            if not future.done():
+                future.cancel()
+                errors[name] = TimeoutError('Call to %s timed out!' % name)
+            elif future.exception() is not None:
+                errors[name] = future.exception()
+            else:
+                results[name] = future.result()
+        return results, errors
+
+    def _call_agent(self, nsaddr, name, method, args, kwargs):
+        """
+        Call a method on an agent, releasing the proxy afterwards.
+        """
+        with Proxy(name, nsaddr=nsaddr) as proxy:
+            return getattr(proxy, method)(*args, **kwargs)
+
+    def brokers(self, kind=None):
+        """
+        List brokers registered in the name server.
+
+        Parameters
+        ----------
+        kind : str, default is None
+            If given, only brokers of this kind (i.e.: `FORWARDER`) are
+            listed.
+
+        Returns
+        -------
+        list
+            Names of the brokers.
+        """
+        tag = 'broker' if kind is None else 'broker:%s' % kind
+        return sorted(self.list(metadata_all={tag}))
+
     def shutdown_agents(self, timeout=3.):
         """
         Shutdown all agents registered in the name server.
@@ -0,0 +1,169 @@
+"""
+Implementation of token-bucket rate limits for outgoing messages.
+"""
+from collections import deque
+import time
+
+
+class TokenBucket():
+    """
+    Token bucket, which is refilled at a constant rate up to its capacity.
+
+    Parameters
+    ----------
+    rate : float
+        Number of tokens added per second.
+    capacity : float
+        Maximum number of tokens in the bucket.
+
+    Attributes
+    ----------
+    tokens : float
+        Number of tokens currently in the bucket (negative when an amount
+        larger than the capacity was consumed).
+    """
+    def __init__(self, rate, capacity):
+        if rate <= 0:
+            raise ValueError('Rates must be positive!')
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.time0 = time.time()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.time0) * self.rate)
+        self.time0 = now
+
+    def delay(self, amount, now):
+        """
+        Parameters
+        ----------
+        amount : float
+            Number of tokens to consume.
+        now : float
+            Current time.
+
+        Returns
+        -------
+        float
+            Number of seconds until the amount can be consumed. Amounts
+            larger than the capacity can be consumed with a full bucket.
+        """
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return max(missing / self.rate, 0.)
+
+    def consume(self, amount):
+        """
+        Remove tokens from the bucket. Note that `delay()` must be called
+        first in order to refill the bucket.
+
+        Parameters
+        ----------
+        amount : float
+            Number of tokens to consume.
+        """
+        self.tokens -= amount
+
+
+class RateLimit():
+    """
+    Rate limit of a socket, in messages and/or bytes per second.
+
+    Parameters
+    ----------
+    rate : float
+        Maximum number of messages per second.
+    bandwidth : float
+        Maximum number of bytes per second.
+    burst : float
+        Number of seconds worth of traffic that can be sent at once.
+    policy : str
+        What to do with messages exceeding the limit: `block` (wait until
+        they can be sent), `drop` (discard them) or `queue` (send them
+        later, without blocking).
+
+    Attributes
+    ----------
+    pending : collections.deque
+        Queued messages, with the `queue` policy.
+    dropped : int
+        Number of messages discarded, with the `drop` policy.
+    delayed : int
+        Number of messages which could not be sent immediately.
+    """
+    POLICIES = ('block', 'drop', 'queue')
+
+    def __init__(self, rate, bandwidth, burst, policy):
+        if rate is None and bandwidth is None:
+            raise ValueError('At least one rate limit must be set!')
+        if policy not in self.POLICIES:
+            raise ValueError('Invalid rate limit policy %s!' % policy)
+        self.policy = policy
+        self.buckets = []
+        if rate is not None:
+            self.buckets.append((TokenBucket(rate, max(rate * burst, 1)),
+                                 False))
+        if bandwidth is not None:
+            self.buckets.append((TokenBucket(bandwidth, bandwidth * burst),
+                                 True))
+        self.pending = deque()
+        self.dropped = 0
+        self.delayed = 0
+
+    def __len__(self):
+        return len(self.pending)
+
+    def delay(self, count, size):
+        """
+        Parameters
+        ----------
+        count : int
+            Number of messages to send.
+        size : int
+            Number of bytes to send.
+
+        Returns
+        -------
+        float
+            Number of seconds until the messages can be sent.
+        """
+        now = time.time()
+        return max(bucket.delay(size if nbytes else count, now)
+                   for bucket, nbytes in self.buckets)
+
+    def consume(self, count, size):
+        """
+        Account for messages which are being sent.
+
+        Parameters
+        ----------
+        count : int
+            Number of messages sent.
+        size : int
+            Number of bytes sent.
+        """
+        for bucket, nbytes in self.buckets:
+            bucket.consume(size if nbytes else count)
+
+
+def message_size(data, multipart=False):
+    """
+    Parameters
+    ----------
+    data : bytes, list
+        Frame or, if `multipart` is set, list of frames (i.e.: a batch).
+    multipart : bool, default is False
+        Whether the message is made of several frames.
+
+    Returns
+    -------
+    int
+        Number of messages.
+    int
+        Number of bytes.
+    """
+    if not multipart:
+        return 1, len(data)
+    return len(data), sum(len(frame) for frame in data)
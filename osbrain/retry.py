@@ -0,0 +1,82 @@
+"""
+Implementation of request retries and server-side reply deduplication.
+"""
+from collections import OrderedDict
+
+
+class Retry():
+    """
+    Client-side state of an ASYNC_REP request which is retried whenever its
+    reply is not received in time.
+
+    Parameters
+    ----------
+    channel : AgentChannel
+        Channel the request is sent through.
+    address_uuid : bytes
+        Identifier of the client's channel.
+    message : anything
+        The request, kept to be sent again.
+    retries : int
+        Number of retries left.
+    backoff : float
+        Factor by which the waiting time is multiplied on each retry.
+    """
+    def __init__(self, channel, address_uuid, message, retries, backoff):
+        self.channel = channel
+        self.address_uuid = address_uuid
+        self.message = message
+        self.retries = retries
+        self.backoff = backoff
+
+
+class ReplyCache():
+    """
+    Bounded cache of the replies sent by an ASYNC_REP server, so that
+    duplicate (retried) requests get the same reply without executing the
+    handler again.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of replies kept. The oldest replies are discarded
+        first.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._replies = OrderedDict()
+
+    def __len__(self):
+        return len(self._replies)
+
+    def __contains__(self, uuid):
+        return uuid in self._replies
+
+    def get(self, uuid):
+        """
+        Parameters
+        ----------
+        uuid : bytes
+            Request identifier.
+
+        Returns
+        -------
+        anything
+            The cached reply, or `None` if it is not cached.
+        """
+        return self._replies.get(uuid)
+
+    def add(self, uuid, reply):
+        """
+        Cache a reply, discarding the oldest one if the cache is full.
+
+        Parameters
+        ----------
+        uuid : bytes
+            Request identifier.
+        reply : anything
+            The reply sent to the client.
+        """
+        self._replies[uuid] = reply
+        if len(self._replies) > self.size:
+            self._replies.popitem(last=False)
@@ -0,0 +1,88 @@
+"""
+Implementation of scatter-gather features.
+"""
+
+
+class Gather():
+    """
+    Collect the replies of a request that was scattered to many servers.
+
+    Parameters
+    ----------
+    aliases : list
+        Aliases of the channels the request was sent through.
+    reducer : function, method or string
+        Code to be executed, once, with the collected replies.
+    quorum : int, default is None
+        Number of replies required to execute the reducer. If not set, all
+        the servers must reply.
+    on_error : function, method or string
+        Code to be executed, with the partial replies, if the quorum is not
+        reached in time.
+
+    Attributes
+    ----------
+    replies : dict
+        A dictionary in which the key is the alias and the value is the
+        reply received through that alias.
+    requests : list
+        Identifiers of the requests that were sent.
+    timer : str
+        Alias of the timer that checks the deadline, if any.
+    done : bool
+        Whether the gathering finished (either the reducer or the error
+        handler were executed).
+    """
+    def __init__(self, aliases, reducer, quorum=None, on_error=None):
+        if quorum is None:
+            quorum = len(aliases)
+        if not 0 < quorum <= len(aliases):
+            raise ValueError('Quorum must be between 1 and %s!' %
+                             len(aliases))
+        self.aliases = aliases
+        self.reducer = reducer
+        self.quorum = quorum
+        self.on_error = on_error
+        self.replies = {}
+        self.requests = []
+        self.timer = None
+        self.done = False
+
+    def reply(self, alias, response):
+        """
+        Register a reply.
+
+        Parameters
+        ----------
+        alias : str, AgentChannel
+            Alias of the channel the reply was received from.
+        response : anything
+            Reply received.
+
+        Returns
+        -------
+        bool
+            Whether the quorum has just been reached with this reply.
+        """
+        if self.done:
+            return False
+        self.replies[alias] = response
+        if len(self.replies) < self.quorum:
+            return False
+        self.done = True
+        return True
+
+    def expire(self):
+        """
+        Finish the gathering after the deadline.
+
+        Returns
+        -------
+        bool
+            Whether the gathering was still pending (i.e.: the quorum was not
+            reached in time).
+        """
+        if self.done:
+            return False
+        self.done = True
+        return True
@@ -0,0 +1,224 @@
+"""
+Implementation of sequenced publications.
+"""
+from collections import deque
+
+from .common import unique_identifier
+
+
+class Sequenced():
+    """
+    Envelope for a publication with a sequence number.
+
+    Sequence numbers are assigned per publisher and topic, so that
+    subscribers can detect gaps even when they are only subscribed to some
+    of the topics.
+
+    Parameters
+    ----------
+    seq : int
+        Sequence number.
+    message : anything
+        The actual message.
+    epoch : bytes
+        Identifier of the publisher's numbering, which changes whenever the
+        numbering is restarted.
+    """
+    __slots__ = ('seq', 'message', 'epoch')
+
+    def __init__(self, seq, message, epoch):
+        self.seq = seq
+        self.message = message
+        self.epoch = epoch
+
+    def __getstate__(self):
+        return (self.seq, self.message, self.epoch)
+
+    def __setstate__(self, state):
+        self.seq, self.message, self.epoch = state
+
+
+class ReplayBuffer():
+    """
+    Publisher-side state for sequenced publications.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of publications kept, per topic, for replaying.
+
+    Attributes
+    ----------
+    epoch : bytes
+        Identifier of this numbering, so that subscribers can tell when the
+        numbering has been restarted.
+    seq : dict
+        A dictionary in which the key is the topic and the value is the
+        last sequence number used.
+    frames : dict
+        A dictionary in which the key is the topic and the value is a deque
+        with the last `(seq, frame)` publications.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.epoch = unique_identifier()
+        self.seq = {}
+        self.frames = {}
+
+    def resize(self, size):
+        """
+        Change the maximum number of publications kept per topic, keeping
+        the numbering and the most recent publications.
+
+        Parameters
+        ----------
+        size : int
+            Maximum number of publications kept, per topic, for replaying.
+        """
+        self.size = size
+        self.frames = {topic: deque(frames, maxlen=size)
+                       for topic, frames in self.frames.items()}
+
+    def wrap(self, topic, message):
+        """
+        Parameters
+        ----------
+        topic : bytes
+            Publication topic.
+        message : anything
+            The actual message.
+
+        Returns
+        -------
+        Sequenced
+            The message with the next sequence number for the topic.
+        """
+        seq = self.seq.get(topic, 0) + 1
+        self.seq[topic] = seq
+        return Sequenced(seq, message, self.epoch)
+
+    def append(self, topic, seq, frame):
+        """
+        Keep a publication for replaying.
+
+        Parameters
+        ----------
+        topic : bytes
+            Publication topic.
+        seq : int
+            Publication sequence number.
+        frame : bytes
+            Publication, as it was sent through the socket.
+        """
+        if topic not in self.frames:
+            self.frames[topic] = deque(maxlen=self.size)
+        self.frames[topic].append((seq, frame))
+
+    def replay(self, topic, first, last):
+        """
+        Parameters
+        ----------
+        topic : bytes
+            Publication topic.
+        first : int
+            First sequence number to replay.
+        last : int
+            Last sequence number to replay.
+
+        Returns
+        -------
+        list
+            Publications, as they were sent through the socket, within the
+            requested range (only those that are still kept).
+        """
+        return [frame for seq, frame in self.frames.get(topic, ())
+                if first <= seq <= last]
+
+
+class SequenceTracker():
+    """
+    Subscriber-side state for sequenced publications.
+
+    Attributes
+    ----------
+    epoch : dict
+        A dictionary in which the key is the topic and the value is the
+        identifier of the publisher's numbering.
+    expected : dict
+        A dictionary in which the key is the topic and the value is the next
+        sequence number expected.
+    missing : dict
+        A dictionary in which the key is the topic and the value is the set
+        of sequence numbers that were not received.
+    stats : dict
+        Number of publications detected as missing (`gaps`), received after
+        a replay (`replayed`), given up (`lost`) and received more than
+        once (`duplicated`).
+    """
+    def __init__(self):
+        self.epoch = {}
+        self.expected = {}
+        self.missing = {}
+        self.stats = {'gaps': 0, 'replayed': 0, 'lost': 0, 'duplicated': 0}
+
+    def receive(self, topic, seq, epoch):
+        """
+        Register a received publication.
+
+        When the publisher's numbering changes (i.e.: the publisher was
+        restarted), the topic is tracked from scratch.
+
+        Parameters
+        ----------
+        topic : bytes
+            Publication topic.
+        seq : int
+            Publication sequence number.
+        epoch : bytes
+            Identifier of the publisher's numbering.
+
+        Returns
+        -------
+        tuple
+            Whether the publication should be processed and the range
+            `(first, last)` of missing sequence numbers detected (or `None`
+            if there is no gap).
+        """
+        if self.epoch.get(topic) != epoch:
+            self.epoch[topic] = epoch
+            self.expected.pop(topic, None)
+            self.missing.pop(topic, None)
+        expected = self.expected.get(topic)
+        if expected is None or seq == expected:
+            self.expected[topic] = seq + 1
+            return True, None
+        if seq > expected:
+            self.missing.setdefault(topic, set()).update(range(expected, seq))
+            self.stats['gaps'] += seq - expected
+            self.expected[topic] = seq + 1
+            return True, (expected, seq - 1)
+        missing = self.missing.get(topic, set())
+        if seq in missing:
+            missing.remove(seq)
+            self.stats['replayed'] += 1
+            return True, None
+        self.stats['duplicated'] += 1
+        return False, None
+
+    def give_up(self, topic, first, last):
+        """
+        Stop waiting for missing publications within a range.
+
+        Parameters
+        ----------
+        topic : bytes
+            Publication topic.
+        first : int
+            First sequence number of the range.
+        last : int
+            Last sequence number of the range.
+        """
+        missing = self.missing.get(topic, set())
+        lost = missing.intersection(range(first, last + 1))
+        missing.difference_update(lost)
+        self.stats['lost'] += len(lost)
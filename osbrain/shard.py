@@ -0,0 +1,115 @@
+"""
+Implementation of key-sharded distribution.
+"""
+from bisect import bisect
+from bisect import insort
+import hashlib
+
+
+def ring_hash(key):
+    """
+    Parameters
+    ----------
+    key : bytes
+        Key to hash.
+
+    Returns
+    -------
+    int
+        Position of the key in the ring, which does not depend on the
+        process (unlike Python's `hash()`).
+    """
+    return int.from_bytes(hashlib.md5(key).digest()[:8], 'big')
+
+
+def key_to_bytes(key):
+    """
+    Parameters
+    ----------
+    key : str, bytes, anything
+        Sharding key.
+
+    Returns
+    -------
+    bytes
+        The key, ready to be hashed.
+    """
+    if isinstance(key, bytes):
+        return key
+    return str(key).encode()
+
+
+class HashRing():
+    """
+    Consistent-hash ring which maps keys to shards.
+
+    When a shard joins or leaves the ring, only the keys of that shard are
+    moved, so stateful consumers keep seeing most of their keys.
+
+    Parameters
+    ----------
+    replicas : int, default is 64
+        Number of points of each shard in the ring, to even the distribution
+        of the keys.
+
+    Attributes
+    ----------
+    members : dict
+        A dictionary in which the key is the shard label and the value is
+        the shard (i.e.: its server address).
+    """
+    def __init__(self, replicas=64):
+        self.replicas = replicas
+        self.members = {}
+        self._points = []
+        self._labels = {}
+
+    def add(self, label, member):
+        """
+        Add a shard to the ring.
+
+        Parameters
+        ----------
+        label : str
+            Shard label. Keys are mapped to labels, so a shard that leaves
+            and joins again with the same label gets its keys back.
+        member : anything
+            The shard.
+        """
+        self.members[label] = member
+        for i in range(self.replicas):
+            point = ring_hash(('%s-%s' % (label, i)).encode())
+            insort(self._points, point)
+            self._labels[point] = label
+
+    def remove(self, label):
+        """
+        Remove a shard from the ring.
+
+        Parameters
+        ----------
+        label : str
+            Shard label.
+        """
+        del self.members[label]
+        self._points = [point for point in self._points
+                        if self._labels[point] != label]
+        self._labels = {point: self._labels[point] for point in self._points}
+
+    def get(self, key):
+        """
+        Parameters
+        ----------
+        key : str, bytes, anything
+            Sharding key.
+
+        Returns
+        -------
+        anything
+            The shard the key is mapped to, or `None` if the ring is empty.
+        """
+        if not self._points:
+            return None
+        index = bisect(self._points, ring_hash(key_to_bytes(key)))
+        point = self._points[index % len(self._points)]
+        return self.members[self._labels[point]]
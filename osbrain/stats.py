@@ -0,0 +1,90 @@
+"""
+Implementation of per-socket counters and backlog thresholds.
+"""
+
+
+class SocketStats():
+    """
+    Counters of the messages going through a socket.
+
+    Attributes
+    ----------
+    received : int
+        Number of messages received.
+    processed : int
+        Number of received messages which have been processed.
+    sent : int
+        Number of messages sent.
+    send_errors : int
+        Number of messages which could not be sent.
+    hwm : int
+        Number of times the socket could not send a message immediately
+        because its high water mark was reached (EAGAIN).
+    """
+    __slots__ = ('received', 'processed', 'sent', 'send_errors', 'hwm')
+
+    def __init__(self):
+        self.received = 0
+        self.processed = 0
+        self.sent = 0
+        self.send_errors = 0
+        self.hwm = 0
+
+    def as_dict(self):
+        """
+        Returns
+        -------
+        dict
+            A dictionary in which the key is the counter name and the value
+            is the counter value.
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class BacklogThreshold():
+    """
+    Thresholds for the backlog of a socket, with hysteresis: the backlog is
+    considered high when it reaches `high` and until it falls back to `low`.
+
+    Parameters
+    ----------
+    high : int
+        The backlog is high from this number of messages.
+    low : int
+        The backlog is no longer high from this number of messages.
+    handler : function, method or string
+        Code to be executed when the backlog crosses the thresholds.
+
+    Attributes
+    ----------
+    above : bool
+        Whether the backlog is currently high.
+    """
+    def __init__(self, high, low, handler):
+        if not low < high:
+            raise ValueError('The low threshold must be lower than the high '
+                             'threshold!')
+        self.high = high
+        self.low = low
+        self.handler = handler
+        self.above = False
+
+    def update(self, backlog):
+        """
+        Parameters
+        ----------
+        backlog : int
+            Current backlog.
+
+        Returns
+        -------
+        bool
+            Whether the backlog crossed a threshold.
+        """
+        if self.above:
+            crossed = backlog <= self.low
+        else:
+            crossed = backlog >= self.high
+        if crossed:
+            self.above = not self.above
+        return crossed
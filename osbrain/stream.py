@@ -0,0 +1,101 @@
+"""
+Implementation of streaming features.
+"""
+import time
+
+
+class EndOfStream():
+    """
+    Marker passed to the client handler when a stream is finished.
+    """
+    def __repr__(self):
+        return 'EndOfStream()'
+
+
+class Stream():
+    """
+    Server-side state of a streaming reply.
+
+    The server sends, at most, `window` chunks that have not been
+    acknowledged by the client. The generator is resumed when the client
+    acknowledges the reception of the chunks.
+
+    Parameters
+    ----------
+    generator : iterator
+        Produces the chunks of the reply.
+    client : AgentAddress
+        Address to send the chunks to.
+    address_uuid : bytes
+        Identifier of the client's channel.
+
+    Attributes
+    ----------
+    credit : int
+        Number of chunks that can be sent before waiting for an
+        acknowledgement from the client.
+    last : float
+        Time of the last acknowledgement received from the client.
+    """
+    WINDOW = 64
+    # Seconds without acknowledgements after which a stream is abandoned
+    TIMEOUT = 60.
+
+    def __init__(self, generator, client, address_uuid):
+        self.generator = generator
+        self.client = client
+        self.address_uuid = address_uuid
+        self.credit = self.WINDOW
+        self.last = time.time()
+
+    def ack(self, count):
+        """
+        Register an acknowledgement from the client.
+
+        Parameters
+        ----------
+        count : int
+            Number of chunks acknowledged.
+        """
+        self.credit += count
+        self.last = time.time()
+
+    def abandoned(self, now):
+        """
+        Parameters
+        ----------
+        now : float
+            Current time.
+
+        Returns
+        -------
+        bool
+            Whether the client stopped acknowledging chunks (i.e.: it is no
+            longer connected).
+        """
+        return now - self.last > self.TIMEOUT
+
+
+class StreamRequest():
+    """
+    Client-side state of a streaming request.
+
+    Parameters
+    ----------
+    channel : AgentChannel
+        STREAM_REP channel the request was sent through.
+    address_uuid : bytes
+        Identifier of the client's channel.
+
+    Attributes
+    ----------
+    unacked : int
+        Number of chunks received and not acknowledged yet.
+    last : float
+        Time at which the last chunk was received.
+    """
+    def __init__(self, channel, address_uuid):
+        self.channel = channel
+        self.address_uuid = address_uuid
+        self.unacked = 0
+        self.last = time.time()
@@ -86,6 +86,8 @@ def test_transport():
     ('PULL', 'PUSH', zmq.PULL, zmq.PUSH, True),
     ('PUB', 'SUB', zmq.PUB, zmq.SUB, False),
     ('SUB', 'PUB', zmq.SUB, zmq.PUB, True),
+    ('ROUTER', 'DEALER', zmq.ROUTER, zmq.DEALER, False),
+    ('DEALER', 'ROUTER', zmq.DEALER, zmq.ROUTER, False),
 ])
 def test_kind(string, strtwin, zmqint, zmqtwin, handler):
     """
@@ -215,6 +217,12 @@ def test_agent_address_to_host_port():
     ('ASYNC_REP', 'ASYNC_REQ'),
     ('SYNC_PUB', 'SYNC_SUB'),
     ('SYNC_SUB', 'SYNC_PUB'),
+    ('FLOW_PUSH', 'FLOW_PULL'),
+    ('FLOW_PULL', 'FLOW_PUSH'),
+    ('WORKER_POOL', 'WORKER'),
+    ('WORKER', 'WORKER_POOL'),
+    ('STREAM_REP', 'STREAM_REQ'),
+    ('STREAM_REQ', 'STREAM_REP'),
 ])
 def test_agentchannelkind(string, string_twin):
     """
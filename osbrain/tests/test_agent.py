@@ -170,6 +170,29 @@ def test_set_and_get_attributes(nsproxy):
     assert a0.two == 12
 
 
+def test_set_and_get_attributes_bulk(nsproxy):
+    """
+    Set and get many attributes with a single call, and read attribute
+    snapshots without going through the agent's main loop.
+    """
+    def grow(agent):
+        for i in range(100):
+            agent.counters[i] = i
+            agent.counters.pop(i - 50, None)
+
+    a0 = run_agent('a0')
+    a0.set_attrs(zero=0, one=1, counters={})
+    assert a0.one == 1
+    assert a0.get_attrs('zero', 'one') == {'zero': 0, 'one': 1}
+    assert a0.read_attrs('zero', 'one') == {'zero': 0, 'one': 1}
+    a0.each(0.001, grow)
+    for i in range(100):
+        snapshot = a0.read_attrs('counters')['counters']
+        assert len(snapshot) <= 100
+    with pytest.raises(AttributeError):
+        a0.read_attrs('wrong')
+
+
 def test_socket_creation(nsproxy):
     """
     Test ZMQ socket creation.
@@ -0,0 +1,125 @@
+"""
+Test file for socket counters and backlog thresholds.
+"""
+import time
+
+import pytest
+import zmq
+
+from osbrain import run_agent
+from osbrain import Agent
+from osbrain.helper import wait_agent_attr
+from osbrain.stats import BacklogThreshold
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def slow_receive(agent, message):
+    time.sleep(0.05)
+    agent.received.append(message)
+
+
+def backlog_crossed(agent, alias, backlog, above):
+    agent.crossings.append(above)
+
+
+def test_backlog_threshold():
+    """
+    Thresholds are crossed with hysteresis.
+    """
+    threshold = BacklogThreshold(10, 5, None)
+    assert not threshold.update(9)
+    assert threshold.update(10)
+    assert threshold.above
+    assert not threshold.update(6)
+    assert threshold.update(5)
+    assert not threshold.above
+    with pytest.raises(ValueError):
+        BacklogThreshold(5, 5, None)
+
+
+def test_socket_stats(nsproxy):
+    """
+    Messages sent, received and processed are counted per socket.
+    """
+    sender = run_agent('sender')
+    receiver = run_agent('receiver')
+    receiver.set_attr(received=[])
+    addr = receiver.bind('PULL', alias='in', handler=receive)
+    sender.connect(addr, alias='out')
+    for i in range(5):
+        sender.send('out', i)
+    assert wait_agent_attr(receiver, length=5)
+    assert sender.socket_stats('out') == {
+        'received': 0, 'processed': 0, 'sent': 5, 'send_errors': 0,
+        'hwm': 0, 'backlog': 0}
+    stats = receiver.socket_stats()
+    assert stats['in']['received'] == 5
+    assert stats['in']['processed'] == 5
+    assert stats['in']['backlog'] == 0
+
+
+def test_socket_stats_hwm():
+    """
+    Sends which find the high water mark reached are counted.
+    """
+    agent = Agent()
+    agent.bind('PUSH', alias='push', transport='tcp')
+    socket = agent.socket['push']
+    # With no peers, PUSH sockets can not queue any message
+    socket.setsockopt(zmq.SNDTIMEO, 10)
+    with pytest.raises(zmq.Again):
+        agent.send('push', 'message')
+    stats = agent.socket_stats('push')
+    assert stats['hwm'] == 1
+    assert stats['sent'] == 0
+    agent.close_sockets()
+
+
+def test_backlog_threshold_handler(nsproxy):
+    """
+    The threshold handler is executed when the backlog of a credit-based
+    channel grows above the high threshold and then falls back.
+    """
+    producer = run_agent('producer')
+    consumer = run_agent('consumer')
+    producer.set_attr(crossings=[])
+    consumer.set_attr(received=[])
+    channel = producer.bind('FLOW_PUSH', alias='out')
+    producer.set_backlog_threshold('out', 10, backlog_crossed, low=2)
+    consumer.connect(channel, handler=slow_receive)
+    for i in range(20):
+        producer.send('out', i)
+    assert wait_agent_attr(producer, name='crossings', length=1)
+    assert producer.get_attr('crossings') == [True]
+    assert wait_agent_attr(consumer, length=20, timeout=5.)
+    assert wait_agent_attr(producer, name='crossings', length=2)
+    assert producer.get_attr('crossings') == [True, False]
+    assert producer.backlog('out') == 0
+
+
+def test_backlog_threshold_input(nsproxy):
+    """
+    The backlog of input sockets includes the messages received but not
+    processed yet.
+    """
+    producer = run_agent('producer')
+    consumer = run_agent('consumer')
+    consumer.set_attr(received=[], crossings=[])
+    addr = consumer.bind('PULL', alias='in', handler=slow_receive)
+    consumer.set_backlog_threshold('in', 10, backlog_crossed, low=2)
+    producer.connect(addr, alias='out')
+    for i in range(20):
+        producer.send('out', i)
+    assert wait_agent_attr(consumer, name='crossings', length=1)
+    assert consumer.get_attr('crossings') == [True]
+    assert wait_agent_attr(consumer, length=20, timeout=5.)
+    assert consumer.get_attr('received') == list(range(20))
+    assert consumer.get_attr('crossings') == [True, False]
+    stats = consumer.socket_stats('in')
+    assert stats['received'] == stats['processed'] == 20
+    assert stats['backlog'] == 0
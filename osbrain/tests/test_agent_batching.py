@@ -0,0 +1,114 @@
+"""
+Test file for send-side batching.
+"""
+import time
+
+import pytest
+
+from osbrain import Agent
+from osbrain import run_agent
+from osbrain.batch import SendBuffer
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message, topic=None):
+    agent.received.append(message)
+
+
+def test_send_buffer():
+    """
+    Send buffers group frames by topic and track their limits.
+    """
+    with pytest.raises(ValueError):
+        SendBuffer()
+    buff = SendBuffer(count=3, size=10)
+    buff.append(b'a', topic=b'x')
+    buff.append(b'bb', topic=b'y')
+    assert len(buff) == 2
+    assert not buff.full()
+    assert buff.remaining() is None
+    buff.append(b'c', topic=b'x')
+    assert buff.full()
+    assert buff.pop() == [[b'a', b'c'], [b'bb']]
+    assert len(buff) == 0
+    buff.append(b'0123456789')
+    assert buff.full()
+
+
+def test_batch_pushpull_count(nsproxy):
+    """
+    Batched PUSH messages are only sent after reaching the count limit and
+    are unbatched transparently by the receiver.
+    """
+    sender = run_agent('sender')
+    receiver = run_agent('receiver')
+    receiver.set_attr(received=[])
+    addr = receiver.bind('PULL', alias='pull', handler=receive)
+    sender.connect(addr, alias='push')
+    sender.set_batch('push', count=3)
+
+    sender.send('push', 1)
+    sender.send('push', 2)
+    time.sleep(0.2)
+    assert receiver.get_attr('received') == []
+    sender.send('push', 3)
+    assert wait_agent_attr(receiver, length=3)
+    assert receiver.get_attr('received') == [1, 2, 3]
+
+    # Explicit flush
+    sender.send('push', 4)
+    sender.flush('push')
+    assert wait_agent_attr(receiver, length=4)
+
+    # Disable batching
+    sender.set_batch('push')
+    sender.send('push', 5)
+    assert wait_agent_attr(receiver, data=5)
+
+
+def test_batch_latency(nsproxy):
+    """
+    Batched messages are sent after the latency budget is exhausted.
+    """
+    sender = run_agent('sender')
+    receiver = run_agent('receiver')
+    receiver.set_attr(received=[])
+    addr = receiver.bind('PULL', alias='pull', handler=receive)
+    sender.connect(addr, alias='push')
+    sender.set_batch('push', count=1000, latency=0.1)
+
+    sender.send('push', 'foo')
+    assert receiver.get_attr('received') == []
+    assert wait_agent_attr(receiver, data='foo', timeout=1)
+
+
+def test_batch_pubsub_topics(nsproxy):
+    """
+    Batched PUB messages keep topic filtering on the subscriber side.
+    """
+    sender = run_agent('sender')
+    receiver = run_agent('receiver')
+    receiver.set_attr(received=[])
+    addr = sender.bind('PUB', alias='pub')
+    receiver.connect(addr, handler={'a': receive})
+    time.sleep(0.1)
+    sender.set_batch('pub', count=4)
+
+    for topic, message in [('a', 1), ('b', 2), ('a', 3), ('b', 4)]:
+        sender.send('pub', message, topic=topic)
+    assert wait_agent_attr(receiver, length=2)
+    time.sleep(0.1)
+    assert receiver.get_attr('received') == [1, 3]
+
+
+def test_batch_wrong_kind():
+    """
+    Batching is only available for PUSH and PUB addresses.
+    """
+    agent = Agent()
+    agent.bind('PULL', alias='pull', handler=receive)
+    with pytest.raises(ValueError):
+        agent.set_batch('pull', count=10)
+    agent.close_sockets()
@@ -0,0 +1,61 @@
+"""
+Test file for last-value caches and late-joiner snapshots.
+"""
+import time
+
+from osbrain import run_agent
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def reply(agent, request):
+    return request
+
+
+def test_pub_cache(nsproxy):
+    """
+    The last publication of each topic is kept in the cache.
+    """
+    publisher = run_agent('publisher')
+    publisher.bind('PUB', alias='pub')
+    publisher.send('pub', 'ignored', topic='a')
+    publisher.set_cache('pub')
+    publisher.send('pub', 1, topic='a')
+    publisher.send('pub', 2, topic='b')
+    publisher.send('pub', 3, topic='a')
+    assert publisher.snapshot('pub') == {b'a': 3, b'b': 2}
+
+    publisher.set_cache('pub', cache=False)
+    publisher.set_cache('pub')
+    assert publisher.snapshot('pub') == {}
+
+
+def test_sync_pub_snapshot(nsproxy):
+    """
+    Late subscribers can fetch a snapshot, which is filtered by their
+    subscriptions, before receiving live updates.
+    """
+    publisher = run_agent('publisher')
+    client = run_agent('client')
+    client.set_attr(received=[])
+    addr = publisher.bind('SYNC_PUB', alias='pub', handler=reply)
+    publisher.set_cache('pub')
+    publisher.send('pub', 'x0', topic='a')
+    publisher.send('pub', 'x1', topic='a')
+    publisher.send('pub', 'y', topic='b')
+    assert publisher.snapshot('pub') == {b'a': 'x1', b'b': 'y'}
+
+    client.connect(addr, alias='sub', handler={'a': receive})
+    # Give some time for the subscription to propagate
+    time.sleep(0.1)
+    client.fetch_snapshot('sub')
+    assert wait_agent_attr(client, data='x1')
+    time.sleep(0.1)
+    publisher.send('pub', 'x2', topic='a')
+    assert wait_agent_attr(client, data='x2')
+    assert client.get_attr('received') == ['x1', 'x2']
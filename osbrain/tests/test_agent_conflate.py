@@ -0,0 +1,49 @@
+"""
+Test file for conflating subscriptions.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def slow_receive(agent, message):
+    agent.received.append(message)
+    time.sleep(agent.delay)
+
+
+@pytest.mark.parametrize('serializer', ['pickle', 'raw'])
+def test_conflate(nsproxy, serializer):
+    """
+    Conflated subscribers only process the latest message of each topic
+    when they fall behind.
+    """
+    publisher = run_agent('publisher')
+    subscriber = run_agent('subscriber')
+    subscriber.set_attr(received=[], delay=0.5)
+    addr = publisher.bind('PUB', alias='pub', serializer=serializer)
+    subscriber.connect(addr, alias='sub', handler={'a': slow_receive,
+                                                   'b': slow_receive})
+    subscriber.set_conflate('sub')
+    time.sleep(0.1)
+
+    publisher.send('pub', b'a0', topic='a')
+    time.sleep(0.1)
+    for i in range(1, 10):
+        publisher.send('pub', b'a%d' % i, topic='a')
+    publisher.send('pub', b'b0', topic='b')
+    assert wait_agent_attr(subscriber, length=3)
+    received = [bytes(x)[-2:] for x in subscriber.get_attr('received')]
+    assert received == [b'a0', b'a9', b'b0']
+    assert subscriber.conflated('sub') == 8
+
+    # Disable conflation
+    subscriber.set_attr(received=[], delay=0.)
+    subscriber.set_conflate('sub', conflate=False)
+    for i in range(3):
+        publisher.send('pub', b'a%d' % i, topic='a')
+    assert wait_agent_attr(subscriber, length=3)
@@ -0,0 +1,115 @@
+"""
+Test file for request deadlines.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain.deadline import Request
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def late_reply(agent, request):
+    agent.received.append(request)
+    time.sleep(1)
+    return request
+
+
+def deadline(agent, request):
+    return agent.deadline
+
+
+def on_error(agent):
+    agent.error_count += 1
+
+
+def test_request_expired():
+    """
+    Requests expire after their deadline.
+    """
+    request = Request('foo', deadline=10.)
+    assert not request.expired(now=9.)
+    assert request.expired(now=11.)
+    assert Request('foo', time.time() + 1).expired() is False
+
+
+def test_rep_deadline(nsproxy):
+    """
+    REP servers drop expired requests, whose clients have already got a
+    timeout error.
+    """
+    server = run_agent('server')
+    client = run_agent('client')
+    pusher = run_agent('pusher')
+    server.set_attr(received=[])
+    addr = server.bind('REP', alias='rep', handler=late_reply)
+    pull = server.bind('PULL', alias='pull', handler=late_reply)
+    client.connect(addr, alias='req')
+    pusher.connect(pull, alias='push')
+
+    pusher.send('push', 'busy')
+    time.sleep(0.1)
+    with pytest.raises(TimeoutError):
+        client.unsafe.send_recv('req', 'foo', wait=0.5)
+    # The server drops the request once it is done with the busy work
+    time.sleep(1)
+    assert server.get_attr('received') == ['busy']
+    assert server.expired('rep') == 1
+    # The server is still usable
+    assert client.send_recv('req', 'bar', wait=2) == 'bar'
+
+
+def test_async_rep_deadline(nsproxy):
+    """
+    ASYNC_REP servers drop requests whose client has already given up.
+    """
+    server = run_agent('server')
+    client = run_agent('client')
+    server.set_attr(received=[])
+    client.set_attr(received=[], error_count=0)
+    addr = server.bind('ASYNC_REP', alias='replier', handler=late_reply)
+    client.connect(addr, alias='async', handler=receive)
+
+    client.send('async', 'foo')
+    client.send('async', 'bar', wait=0.5, on_error=on_error)
+    assert wait_agent_attr(client, data='foo')
+    assert wait_agent_attr(client, name='error_count', value=1)
+    time.sleep(0.1)
+    assert server.get_attr('received') == ['foo']
+    assert server.expired('replier') == 1
+
+
+def test_handler_deadline(nsproxy):
+    """
+    Handlers can read the deadline of the request being handled.
+    """
+    server = run_agent('server')
+    client = run_agent('client')
+    addr = server.bind('REP', alias='rep', handler=deadline)
+    client.connect(addr, alias='req')
+    t0 = time.time()
+    assert t0 + 5 <= client.send_recv('req', 'foo', wait=5) <= t0 + 6
+    assert client.send_recv('req', 'foo') is None
+    assert server.get_attr('deadline') is None
+
+
+def test_deadline_serializer(nsproxy):
+    """
+    Deadlines are not propagated with serializers which cannot wrap the
+    requests, but the requests are still sent.
+    """
+    server = run_agent('server')
+    client = run_agent('client')
+    addr = server.bind('REP', alias='rep', handler=deadline,
+                       serializer='json')
+    client.connect(addr, alias='req')
+    client.send('req', 'foo', wait=1)
+    assert client.recv('req') is None
+    assert client.send_recv('req', 'foo', wait=1) is None
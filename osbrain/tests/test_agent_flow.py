@@ -0,0 +1,91 @@
+"""
+Test file for credit-based flow control.
+"""
+import time
+
+from osbrain import run_agent
+from osbrain.flow import CreditQueue
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def slow_receive(agent, message):
+    time.sleep(agent.delay)
+    agent.received.append(message)
+
+
+def test_credit_queue():
+    """
+    Credit queues select the consumer with more credits available.
+    """
+    queue = CreditQueue()
+    assert queue.consumer() is None
+    queue.grant(b'a', 1)
+    queue.grant(b'b', 2)
+    assert queue.available() == 3
+    assert queue.consumer() == b'b'
+    queue.consume(b'b')
+    queue.consume(b'b')
+    assert queue.consumer() == b'a'
+    queue.consume(b'a')
+    assert queue.consumer() is None
+    queue.remove(b'a')
+    assert queue.credit == {b'b': 0}
+
+
+def test_flow_credit(nsproxy):
+    """
+    The producer only sends messages when the consumer has granted credits,
+    keeping the rest queued locally.
+    """
+    producer = run_agent('producer')
+    consumer = run_agent('consumer')
+    consumer.set_attr(received=[], delay=0.2)
+    addr = producer.bind('FLOW_PUSH', alias='push')
+    consumer.connect(addr, alias='pull', handler=slow_receive)
+    time.sleep(0.1)
+
+    for i in range(5):
+        producer.send('push', i)
+    assert producer.queue_depth('push') == 4
+    assert wait_agent_attr(consumer, length=5)
+    assert consumer.get_attr('received') == list(range(5))
+    assert producer.queue_depth('push') == 0
+
+
+def test_flow_grant(nsproxy):
+    """
+    Consumers can grant additional credits explicitly.
+    """
+    producer = run_agent('producer')
+    consumer = run_agent('consumer')
+    consumer.set_attr(received=[], delay=0.5)
+    addr = producer.bind('FLOW_PUSH', alias='push')
+    consumer.connect(addr, alias='pull', handler=slow_receive)
+    consumer.grant('pull', 3)
+    time.sleep(0.1)
+
+    for i in range(5):
+        producer.send('push', i)
+    assert producer.queue_depth('push') == 1
+
+
+def test_flow_balance(nsproxy):
+    """
+    Work is balanced according to the actual speed of the consumers.
+    """
+    producer = run_agent('producer')
+    fast = run_agent('fast')
+    slow = run_agent('slow')
+    fast.set_attr(received=[], delay=0.01)
+    slow.set_attr(received=[], delay=1)
+    addr = producer.bind('FLOW_PUSH', alias='push')
+    fast.connect(addr, alias='pull', handler=slow_receive)
+    slow.connect(addr, alias='pull', handler=slow_receive)
+    time.sleep(0.1)
+
+    for i in range(10):
+        producer.send('push', i)
+    assert wait_agent_attr(fast, length=9)
+    assert len(slow.get_attr('received')) <= 1
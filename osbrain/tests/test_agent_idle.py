@@ -0,0 +1,82 @@
+"""
+Test file for adaptive idle scheduling.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain import Agent
+from osbrain.idle import IdlePolicy
+
+from common import nsproxy  # pragma: no flakes
+
+
+class IdleCounter(Agent):
+    def on_init(self):
+        self.idle_count = 0
+
+    def idle(self):
+        self.idle_count += 1
+
+
+def test_idle_policy():
+    """
+    The polling timeout grows while idle and idle work is scheduled after
+    a number of busy iterations.
+    """
+    policy = IdlePolicy(iterations=3, max_timeout=500)
+    assert policy.timeout(100) == 100
+    assert policy.update(busy=False, timed_out=True)
+    assert policy.timeout(100) == 200
+    assert policy.update(busy=False, timed_out=True)
+    assert policy.update(busy=False, timed_out=True)
+    assert policy.timeout(100) == 500
+    assert not policy.update(busy=False, timed_out=False)
+    assert not policy.update(busy=True, timed_out=False)
+    assert policy.timeout(100) == 100
+    assert not policy.update(busy=True, timed_out=False)
+    assert policy.update(busy=True, timed_out=False)
+    assert policy.runs == 4
+    assert policy.timeout(None) is None
+    with pytest.raises(ValueError):
+        IdlePolicy(backoff=0.5)
+
+
+def test_idle_policy_no_extension():
+    """
+    The polling timeout is not extended if no maximum is set.
+    """
+    policy = IdlePolicy(iterations=3)
+    for i in range(10):
+        assert policy.update(busy=False, timed_out=True)
+    assert policy.timeout(100) == 100
+
+
+def test_idle_under_load(nsproxy):
+    """
+    Idle work is executed periodically even if the agent is always busy.
+    """
+    agent = run_agent('agent', base=IdleCounter)
+    agent.each(0.01, 'get_attr', 'idle_count')
+    time.sleep(0.5)
+    assert agent.get_attr('idle_count') == 0
+    agent.set_idle_policy(interval=0.1)
+    time.sleep(0.5)
+    assert 3 <= agent.get_attr('idle_count') <= 6
+
+
+def test_idle_backoff(nsproxy):
+    """
+    Idle agents poll for longer, executing less idle iterations.
+    """
+    agent = run_agent('agent', base=IdleCounter)
+    agent.set_attr(poll_timeout=10)
+    agent.set_idle_policy(max_timeout=200)
+    time.sleep(1.)
+    # Safe calls are events, which would restore the polling timeout
+    stats = agent.unsafe.idle_stats()
+    assert stats['timeout'] == 200
+    assert stats['runs'] < 15
+    agent.set_idle_policy()
+    assert agent.idle_stats() == {'timeout': 10}
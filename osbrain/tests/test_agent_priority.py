@@ -0,0 +1,100 @@
+"""
+Test file for socket priorities.
+"""
+import time
+
+from osbrain import run_agent
+from osbrain import Agent
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def flooded_agent(priority=None, burst=100):
+    """
+    Return an agent with two PULL sockets with 3 input messages each.
+    """
+    agent = Agent()
+    agent.received = []
+    for alias in ('low', 'high'):
+        addr = agent.bind('PULL', alias=alias, handler=receive,
+                          transport='inproc')
+        agent.connect(addr, alias='push_' + alias)
+    if priority is not None:
+        agent.set_priority('high', priority, burst=burst)
+    for i in range(3):
+        agent.send('push_low', 'low')
+        agent.send('push_high', 'high')
+    time.sleep(0.1)
+    return agent
+
+
+def test_priority_order():
+    """
+    Higher-priority sockets are drained first.
+    """
+    agent = flooded_agent(priority=1)
+    agent.iterate()
+    assert agent.received == ['high'] * 3 + ['low']
+    agent.iterate()
+    agent.iterate()
+    assert agent.received == ['high'] * 3 + ['low'] * 3
+    agent.close_sockets()
+
+
+def test_priority_burst():
+    """
+    Draining is bounded, so lower-priority sockets are never starved.
+    """
+    agent = flooded_agent(priority=1, burst=2)
+    agent.iterate()
+    assert agent.received == ['high'] * 2 + ['low']
+    agent.close_sockets()
+
+
+def test_priority_default():
+    """
+    Sockets with the default priority process one message per iteration.
+    """
+    agent = flooded_agent()
+    agent.iterate()
+    assert sorted(agent.received) == ['high', 'low']
+    agent.set_priority('low', 2, burst=10)
+    agent.set_priority('high', 0)
+    agent.iterate()
+    assert agent.received[2:] == ['low'] * 2 + ['high']
+    agent.close_sockets()
+
+
+def test_priority_bind_connect():
+    """
+    Priorities can be set when binding or connecting.
+    """
+    agent = Agent()
+    addr = agent.bind('PULL', alias='pull', handler=receive, priority=2,
+                      transport='inproc')
+    agent.connect(addr, alias='push', priority=1)
+    assert agent._priority[agent.socket['pull']] == (2, 100)
+    assert agent._priority[agent.socket['push']] == (1, 100)
+    assert agent._priority[agent.socket['_loopback_safe']] == (1, 100)
+    agent.close_sockets()
+
+
+def test_priority_responsive(nsproxy):
+    """
+    Agents flooded with data stay responsive to proxies.
+    """
+    agent = run_agent('agent')
+    agent.set_attr(received=[])
+    addr = agent.bind('PULL', alias='pull', handler=receive)
+    pushers = [run_agent('pusher%s' % i) for i in range(5)]
+    for pusher in pushers:
+        pusher.connect(addr, alias='push')
+        pusher.each(0.001, 'send', 'push', 'x' * 1000)
+    time.sleep(0.5)
+    t0 = time.time()
+    assert agent.ping() == 'pong'
+    assert time.time() - t0 < 0.5
@@ -0,0 +1,125 @@
+"""
+Test file for rate limits.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain import Agent
+from osbrain.helper import wait_agent_attr
+from osbrain.ratelimit import RateLimit
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def send_many(agent, alias, count):
+    t0 = time.time()
+    for i in range(count):
+        agent.send(alias, i)
+    return time.time() - t0
+
+
+def pusher_and_puller(**kwargs):
+    pusher = run_agent('pusher')
+    puller = run_agent('puller')
+    puller.set_attr(received=[])
+    addr = puller.bind('PULL', alias='in', handler=receive)
+    pusher.connect(addr, alias='out')
+    pusher.set_rate_limit('out', **kwargs)
+    pusher.set_method(send_many)
+    return pusher, puller
+
+
+def test_rate_limit():
+    """
+    Messages and bytes are limited by token buckets, which allow bursts.
+    """
+    limit = RateLimit(rate=10, bandwidth=None, burst=0.5, policy='block')
+    for i in range(5):
+        assert not limit.delay(1, 100)
+        limit.consume(1, 100)
+    assert 0 < limit.delay(1, 100) <= 0.1
+
+    limit = RateLimit(rate=None, bandwidth=100, burst=1., policy='block')
+    assert not limit.delay(1, 60)
+    limit.consume(1, 60)
+    assert 0.1 < limit.delay(1, 60) <= 0.2
+    # Messages larger than the burst can be sent with a full bucket
+    limit = RateLimit(rate=None, bandwidth=100, burst=1., policy='block')
+    assert not limit.delay(1, 1000)
+
+    with pytest.raises(ValueError):
+        RateLimit(rate=None, bandwidth=None, burst=1., policy='block')
+    with pytest.raises(ValueError):
+        RateLimit(rate=10, bandwidth=None, burst=1., policy='wrong')
+
+
+def test_rate_limit_block(nsproxy):
+    """
+    With the block policy, sending waits until the message can be sent.
+    """
+    pusher, puller = pusher_and_puller(rate=50, burst=0.1)
+    elapsed = pusher.send_many('out', 15)
+    assert elapsed > 0.15
+    assert wait_agent_attr(puller, length=15)
+    assert puller.get_attr('received') == list(range(15))
+    assert pusher.throttled('out')['delayed'] == 10
+
+
+def test_rate_limit_drop(nsproxy):
+    """
+    With the drop policy, messages exceeding the limit are discarded.
+    """
+    pusher, puller = pusher_and_puller(rate=5, policy='drop')
+    elapsed = pusher.send_many('out', 20)
+    assert elapsed < 0.1
+    assert wait_agent_attr(puller, length=5)
+    time.sleep(0.1)
+    assert puller.get_attr('received') == list(range(5))
+    assert pusher.throttled('out') == {'delayed': 15, 'dropped': 15,
+                                       'queued': 0}
+
+
+def test_rate_limit_queue(nsproxy):
+    """
+    With the queue policy, messages exceeding the limit are sent later, in
+    order, without blocking the agent.
+    """
+    pusher, puller = pusher_and_puller(rate=20, burst=0.25, policy='queue')
+    elapsed = pusher.send_many('out', 15)
+    assert elapsed < 0.1
+    assert pusher.throttled('out')['queued'] > 0
+    assert pusher.backlog('out') > 0
+    assert wait_agent_attr(puller, length=15)
+    assert puller.get_attr('received') == list(range(15))
+    assert pusher.throttled('out')['queued'] == 0
+
+
+def test_rate_limit_disable(nsproxy):
+    """
+    Disabling the rate limit sends the queued messages.
+    """
+    pusher, puller = pusher_and_puller(rate=0.1, policy='queue')
+    pusher.send_many('out', 5)
+    assert wait_agent_attr(puller, length=1)
+    pusher.set_rate_limit('out')
+    assert wait_agent_attr(puller, length=5)
+    assert puller.get_attr('received') == list(range(5))
+
+
+def test_rate_limit_req_policy():
+    """
+    REQ addresses only support the block policy.
+    """
+    agent = Agent()
+    addr = agent.bind('REP', transport='tcp', handler=lambda a, x: x)
+    agent.connect(addr, alias='req')
+    with pytest.raises(ValueError):
+        agent.set_rate_limit('req', rate=10, policy='drop')
+    agent.set_rate_limit('req', rate=10)
+    agent.close_sockets()
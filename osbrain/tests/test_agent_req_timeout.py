@@ -0,0 +1,83 @@
+"""
+Test file for timeout-aware REQ sockets.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain import Agent
+
+from common import nsproxy  # pragma: no flakes
+
+
+def slow_reply(agent, request):
+    time.sleep(agent.delay)
+    return request
+
+
+def test_send_recv_timeout(nsproxy):
+    """
+    A request to a server that does not reply in time raises a timeout
+    error, and the REQ socket can be used again afterwards.
+    """
+    server = run_agent('server')
+    client = run_agent('client')
+    server.set_attr(delay=1)
+    addr = server.bind('REP', alias='rep', handler=slow_reply)
+    client.connect(addr, alias='req')
+
+    t0 = time.time()
+    with pytest.raises(TimeoutError):
+        client.unsafe.send_recv('req', 'foo', wait=0.2)
+    assert time.time() - t0 < 0.5
+    server.set_attr(delay=0)
+    # The late reply to the first request is never received
+    assert client.send_recv('req', 'bar', wait=3) == 'bar'
+    assert client.send_recv('req', 'baz') == 'baz'
+
+
+def test_recv_timeout_raw():
+    """
+    Timeouts do not require deadlines, so they work with any serializer.
+    """
+    server = Agent()
+    client = Agent()
+    addr = server.bind('REP', alias='rep', handler=slow_reply,
+                       transport='tcp', serializer='raw')
+    client.connect(addr, alias='req')
+    client.send('req', b'foo')
+    with pytest.raises(TimeoutError):
+        client.recv('req', timeout=0.1)
+    # The new socket is ready to send a new request
+    client.send('req', b'bar')
+    server.close_sockets()
+    client.close_sockets()
+
+
+def test_req_pool():
+    """
+    Spare sockets from the pool replace the REQ sockets that time out.
+    """
+    server = Agent()
+    client = Agent()
+    addr = server.bind('REP', alias='rep', handler=slow_reply,
+                       transport='tcp')
+    client_addr = client.connect(addr, alias='req')
+    client.set_req_pool('req', 2)
+    spare = client._req_pool[client_addr][0]
+    old = client.socket['req']
+    client.send('req', 'foo')
+    with pytest.raises(TimeoutError):
+        client.recv('req', timeout=0.1)
+    assert client.socket['req'] is spare
+    assert client.socket[client_addr] is spare
+    assert client.address[spare] == client_addr
+    assert old.closed
+    assert len(client._req_pool[client_addr]) == 2
+    client.set_req_pool('req', 1)
+    assert len(client._req_pool[client_addr]) == 1
+    with pytest.raises(ValueError):
+        server.set_req_pool('rep', 1)
+    server.close_sockets()
+    client.close_sockets()
@@ -0,0 +1,112 @@
+"""
+Test file for request retries and server-side deduplication.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain.helper import wait_agent_attr
+from osbrain.retry import ReplyCache
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def slow_reply(agent, request):
+    agent.received.append(request)
+    time.sleep(agent.delay)
+    return request
+
+
+def on_error(agent):
+    agent.error_count += 1
+
+
+def retry_agents(delay):
+    server = run_agent('server')
+    client = run_agent('client')
+    server.set_attr(received=[], delay=delay)
+    client.set_attr(received=[], error_count=0)
+    addr = server.bind('ASYNC_REP', alias='replier', handler=slow_reply)
+    client.connect(addr, alias='async', handler=receive)
+    return server, client
+
+
+def test_reply_cache():
+    """
+    The reply cache is bounded, discarding the oldest replies first.
+    """
+    cache = ReplyCache(size=2)
+    cache.add('a', 1)
+    cache.add('b', 2)
+    cache.add('c', 3)
+    assert len(cache) == 2
+    assert 'a' not in cache
+    assert cache.get('a') is None
+    assert cache.get('c') == 3
+
+
+def test_retry_expired(nsproxy):
+    """
+    Requests dropped by the server are retried until they are handled.
+    """
+    server, client = retry_agents(delay=1)
+    client.set_retry('async', retries=3, backoff=2)
+    client.send('async', 'busy')
+    time.sleep(0.1)
+    client.send('async', 'foo', wait=0.3, on_error=on_error)
+    assert wait_agent_attr(client, data='foo', timeout=5)
+    assert server.get_attr('received') == ['busy', 'foo']
+    assert server.expired('replier') >= 1
+    assert client.get_attr('error_count') == 0
+
+
+def test_retry_duplicate(nsproxy):
+    """
+    Duplicate requests get the cached reply, without executing the handler
+    again.
+    """
+    server, client = retry_agents(delay=0.5)
+    client.set_retry('async', retries=3, backoff=1)
+    client.send('async', 'foo', wait=0.2, on_error=on_error)
+    assert wait_agent_attr(client, data='foo')
+    time.sleep(1)
+    assert server.get_attr('received') == ['foo']
+    assert client.get_attr('received') == ['foo']
+    assert client.get_attr('error_count') == 0
+    assert not client.get_attr('_retrying')
+
+
+def test_retry_exhausted(nsproxy):
+    """
+    The error handler is executed once all the retries are exhausted.
+    """
+    server, client = retry_agents(delay=0)
+    client.set_retry('async', retries=2, backoff=1)
+    server.shutdown()
+    time.sleep(0.1)
+    client.send('async', 'foo', wait=0.2, on_error=on_error)
+    assert wait_agent_attr(client, name='error_count', value=1)
+    time.sleep(0.5)
+    assert client.get_attr('error_count') == 1
+    assert not client.get_attr('_retrying')
+
+
+def test_retry_not_supported(nsproxy):
+    """
+    Retries are only supported for ASYNC_REP channels.
+    """
+    agent = run_agent('agent')
+    agent.bind('PUSH', alias='push')
+    with pytest.raises(ValueError):
+        agent.unsafe.set_retry('push')
+    # Deduplication requires wrapping the requests
+    server = run_agent('server')
+    addr = server.bind('ASYNC_REP', handler=slow_reply, serializer='json')
+    agent.connect(addr, alias='async', handler=receive)
+    with pytest.raises(ValueError):
+        agent.unsafe.set_retry('async')
@@ -0,0 +1,113 @@
+"""
+Test file for scatter-gather requests.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain import run_logger
+from osbrain.helper import logger_received
+from osbrain.helper import sync_agent_logger
+from osbrain.helper import wait_agent_attr
+from osbrain.scatter import Gather
+
+from common import nsproxy  # pragma: no flakes
+
+
+def square(agent, request):
+    time.sleep(agent.delay)
+    return request ** 2
+
+
+def reducer(agent, replies):
+    agent.received.append(sorted(replies.values()))
+
+
+def on_error(agent, replies):
+    agent.errors.append(sorted(replies.values()))
+
+
+def servers_and_client(delays):
+    """
+    Create one ASYNC_REP server per delay and a client connected to all of
+    them.
+    """
+    client = run_agent('client')
+    client.set_attr(received=[], errors=[])
+    aliases = []
+    for i, delay in enumerate(delays):
+        server = run_agent('server%s' % i)
+        server.set_attr(delay=delay)
+        addr = server.bind('ASYNC_REP', handler=square)
+        client.connect(addr, alias='s%s' % i)
+        aliases.append('s%s' % i)
+    return client, aliases
+
+
+def test_gather():
+    """
+    The gathering finishes once the quorum is reached.
+    """
+    with pytest.raises(ValueError):
+        Gather(['a', 'b'], reducer, quorum=3)
+    gather = Gather(['a', 'b', 'c'], reducer, quorum=2)
+    assert not gather.reply('a', 1)
+    assert gather.reply('b', 2)
+    assert not gather.reply('c', 3)
+    assert gather.replies == {'a': 1, 'b': 2}
+    assert not gather.expire()
+
+
+def test_scatter_all(nsproxy):
+    """
+    The reducer is executed once with the replies of all the servers.
+    """
+    client, aliases = servers_and_client([0, 0, 0])
+    client.scatter(aliases, 3, reducer)
+    assert wait_agent_attr(client, length=1)
+    assert client.get_attr('received') == [[9, 9, 9]]
+
+
+def test_scatter_quorum(nsproxy):
+    """
+    The reducer is executed as soon as the quorum is reached.
+    """
+    client, aliases = servers_and_client([0, 0, 2])
+    t0 = time.time()
+    client.scatter(aliases, 2, reducer, quorum=2, wait=1, on_error=on_error)
+    assert wait_agent_attr(client, length=1)
+    assert time.time() - t0 < 1
+    assert client.get_attr('received') == [[4, 4]]
+    # The slow server's request is no longer pending
+    assert not client.get_attr('_pending_requests')
+    time.sleep(1.5)
+    assert client.get_attr('errors') == []
+
+
+def test_scatter_late_replies(nsproxy):
+    """
+    Replies received after the quorum is reached are silently dropped.
+    """
+    client, aliases = servers_and_client([0, 0.5])
+    logger = run_logger('logger')
+    client.set_logger(logger)
+    sync_agent_logger(client, logger)
+    client.scatter(aliases, 2, reducer, quorum=1)
+    assert wait_agent_attr(client, length=1)
+    assert not logger_received(logger, 'unknown request',
+                               log_name='log_history_warning', timeout=1.5)
+    assert client.get_attr('received') == [[4]]
+
+
+def test_scatter_deadline(nsproxy):
+    """
+    The error handler receives the partial replies if the quorum is not
+    reached in time.
+    """
+    client, aliases = servers_and_client([0, 2])
+    client.scatter(aliases, 2, reducer, wait=0.5, on_error=on_error)
+    assert wait_agent_attr(client, name='errors', length=1)
+    assert client.get_attr('errors') == [[4]]
+    time.sleep(2)
+    assert client.get_attr('received') == []
@@ -0,0 +1,142 @@
+"""
+Test file for sequenced publications.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain import Agent
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def reply(agent, request):
+    return request
+
+
+def publish_lost(agent, alias, message, topic):
+    """
+    Publish a message which never reaches the subscribers.
+    """
+    socket = agent.socket[alias]
+    socket.send = lambda frame, *flags: None
+    agent.send(alias, message, topic=topic)
+    del socket.send
+
+
+def publisher_and_subscriber(kind, replay=1000):
+    publisher = run_agent('publisher')
+    subscriber = run_agent('subscriber')
+    subscriber.set_attr(received=[])
+    publisher.set_method(publish_lost)
+    if kind == 'SYNC_PUB':
+        addr = publisher.bind('SYNC_PUB', alias='pub', handler=reply)
+    else:
+        addr = publisher.bind('PUB', alias='pub')
+    publisher.set_sequence('pub', replay=replay)
+    subscriber.connect(addr, alias='sub', handler={'a': receive})
+    # Give some time for the subscription to propagate
+    time.sleep(0.1)
+    return publisher, subscriber
+
+
+def test_sequence_replay(nsproxy):
+    """
+    Missing publications from a SYNC_PUB channel are detected and replayed.
+    """
+    publisher, subscriber = publisher_and_subscriber('SYNC_PUB')
+    publisher.send('pub', 'x0', topic='a')
+    publisher.send('pub', 'y0', topic='b')
+    publisher.publish_lost('pub', 'x1', topic='a')
+    publisher.publish_lost('pub', 'x2', topic='a')
+    publisher.send('pub', 'x3', topic='a')
+    assert wait_agent_attr(subscriber, length=4)
+    assert subscriber.get_attr('received') == ['x0', 'x3', 'x1', 'x2']
+    assert subscriber.sequence_stats('sub') == {
+        'gaps': 2, 'replayed': 2, 'lost': 0, 'duplicated': 0}
+
+
+def test_sequence_replay_buffer(nsproxy):
+    """
+    Publications which are no longer kept in the replay buffer are lost.
+    """
+    publisher, subscriber = publisher_and_subscriber('SYNC_PUB', replay=2)
+    publisher.send('pub', 'x0', topic='a')
+    publisher.publish_lost('pub', 'x1', topic='a')
+    publisher.publish_lost('pub', 'x2', topic='a')
+    publisher.send('pub', 'x3', topic='a')
+    assert wait_agent_attr(subscriber, length=3)
+    time.sleep(0.1)
+    assert subscriber.get_attr('received') == ['x0', 'x3', 'x2']
+    assert subscriber.sequence_stats('sub') == {
+        'gaps': 2, 'replayed': 1, 'lost': 1, 'duplicated': 0}
+
+
+def test_sequence_pub(nsproxy):
+    """
+    Missing publications from a PUB address are detected and considered
+    lost, as they can not be replayed.
+    """
+    publisher, subscriber = publisher_and_subscriber('PUB')
+    publisher.send('pub', 'x0', topic='a')
+    publisher.publish_lost('pub', 'x1', topic='a')
+    publisher.send('pub', 'x2', topic='a')
+    assert wait_agent_attr(subscriber, length=2)
+    assert subscriber.get_attr('received') == ['x0', 'x2']
+    assert subscriber.sequence_stats('sub') == {
+        'gaps': 1, 'replayed': 0, 'lost': 1, 'duplicated': 0}
+
+    # Disable sequencing
+    publisher.set_sequence('pub', sequence=False)
+    publisher.send('pub', 'x3', topic='a')
+    assert wait_agent_attr(subscriber, length=3)
+    assert subscriber.get_attr('received')[-1] == 'x3'
+
+
+def test_sequence_restart(nsproxy):
+    """
+    Subscribers keep receiving publications when the publisher restarts its
+    numbering.
+    """
+    publisher, subscriber = publisher_and_subscriber('SYNC_PUB')
+    for i in range(3):
+        publisher.send('pub', 'x%d' % i, topic='a')
+    assert wait_agent_attr(subscriber, length=3)
+
+    # Enabling an already sequenced address keeps the numbering
+    publisher.set_sequence('pub', replay=10)
+    publisher.send('pub', 'x3', topic='a')
+    assert wait_agent_attr(subscriber, length=4)
+
+    # Restart the numbering
+    publisher.set_sequence('pub', sequence=False)
+    publisher.set_sequence('pub')
+    publisher.send('pub', 'y0', topic='a')
+    publisher.send('pub', 'y1', topic='a')
+    assert wait_agent_attr(subscriber, length=6)
+    assert subscriber.get_attr('received')[-2:] == ['y0', 'y1']
+    assert subscriber.sequence_stats('sub') == {
+        'gaps': 0, 'replayed': 0, 'lost': 0, 'duplicated': 0}
+
+
+@pytest.mark.parametrize('kind,serializer', [
+    ('PUSH', 'pickle'),
+    ('PUB', 'json'),
+    ('PUB', 'raw'),
+])
+def test_sequence_not_supported(kind, serializer):
+    """
+    Sequencing is only available for PUB and SYNC_PUB addresses with
+    serializers that support arbitrary objects.
+    """
+    agent = Agent()
+    agent.bind(kind, alias='out', serializer=serializer)
+    with pytest.raises(ValueError):
+        agent.set_sequence('out')
+    agent.close_sockets()
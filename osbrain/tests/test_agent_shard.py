@@ -0,0 +1,148 @@
+"""
+Test file for key-sharded distribution.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain import Agent
+from osbrain.helper import wait_agent_attr
+from osbrain.shard import HashRing
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def keys_by_shard(ring, keys):
+    return {key: ring.get(key) for key in keys}
+
+
+def assert_keys_by_consumer(received):
+    """
+    Assert each key was only received by one consumer.
+    """
+    seen = {}
+    for n, messages in enumerate(received):
+        for key, i in messages:
+            assert seen.setdefault(key, n) == n
+
+
+def shard_members(agent):
+    return agent.get_attr('_shards')['shard'].members
+
+
+def wait_members(agent, names, timeout=3.):
+    t0 = time.time()
+    while time.time() - t0 < timeout:
+        if set(shard_members(agent)) == names:
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_hash_ring():
+    """
+    Only the keys of the shards joining or leaving the ring are moved.
+    """
+    ring = HashRing()
+    assert ring.get('key') is None
+    for label in 'abc':
+        ring.add(label, label.upper())
+    keys = range(1000)
+    before = keys_by_shard(ring, keys)
+    assert set(before.values()) == {'A', 'B', 'C'}
+
+    ring.add('d', 'D')
+    after = keys_by_shard(ring, keys)
+    moved = [key for key in keys if before[key] != after[key]]
+    assert all(after[key] == 'D' for key in moved)
+    assert 100 < len(moved) < 400
+
+    ring.remove('d')
+    assert keys_by_shard(ring, keys) == before
+
+
+def test_send_shard(nsproxy):
+    """
+    All the messages with the same key are received by the same server.
+    """
+    producer = run_agent('producer')
+    consumers = [run_agent('consumer%s' % i) for i in range(3)]
+    addresses = []
+    for consumer in consumers:
+        consumer.set_attr(received=[])
+        addresses.append(consumer.bind('PULL', alias='in', handler=receive))
+    producer.set_shards('shard', addresses)
+    for i in range(3):
+        for key in range(30):
+            producer.send('shard', (key, i), key=key)
+    for consumer in consumers:
+        assert wait_agent_attr(consumer, length=1)
+    time.sleep(0.2)
+    received = [consumer.get_attr('received') for consumer in consumers]
+    assert sum(len(messages) for messages in received) == 90
+    assert_keys_by_consumer(received)
+
+
+def test_discover_shards(nsproxy):
+    """
+    Shard groups are rebalanced when agents join or leave the name server.
+    """
+    producer = run_agent('producer')
+    for i in range(2):
+        consumer = run_agent('worker%s' % i)
+        consumer.set_attr(received=[])
+        consumer.bind('PULL', alias='in', handler=receive)
+    producer.discover_shards('shard', 'worker', 'in', period=0.1)
+    assert wait_members(producer, {'worker0', 'worker1'})
+
+    consumer = run_agent('worker2')
+    consumer.set_attr(received=[])
+    consumer.bind('PULL', alias='in', handler=receive)
+    time.sleep(0.5)
+    for key in range(30):
+        producer.send('shard', key, key=key)
+    assert wait_agent_attr(consumer, length=1)
+
+    nsproxy.proxy('worker0').shutdown()
+    assert wait_members(producer, {'worker1', 'worker2'})
+
+
+def test_discover_shards_restarted(nsproxy):
+    """
+    Restarted agents are updated with their new address.
+    """
+    producer = run_agent('producer')
+    worker = run_agent('worker')
+    worker.bind('PULL', alias='in', handler=receive)
+    producer.discover_shards('shard', 'worker', 'in', period=0.1)
+    assert wait_members(producer, {'worker'})
+    old = shard_members(producer)['worker']
+
+    worker.shutdown()
+    assert wait_members(producer, set())
+    worker = run_agent('worker')
+    worker.set_attr(received=[])
+    new = worker.bind('PULL', alias='in', handler=receive)
+    assert new != old
+    time.sleep(0.5)
+    assert shard_members(producer)['worker'] == new
+    producer.send('shard', 'message', key=1)
+    assert wait_agent_attr(worker, length=1)
+
+
+def test_send_shard_errors():
+    """
+    Sending with a key requires a non-empty shard group.
+    """
+    agent = Agent()
+    with pytest.raises(ValueError):
+        agent.send('shard', 'message', key=1)
+    agent.set_shards('shard', [])
+    with pytest.raises(ValueError):
+        agent.send('shard', 'message', key=1)
+    agent.close_sockets()
@@ -0,0 +1,151 @@
+"""
+Test file for streaming replies.
+"""
+import time
+
+from osbrain import run_agent
+from osbrain import run_logger
+from osbrain.helper import logger_received
+from osbrain.helper import sync_agent_logger
+from osbrain.helper import wait_agent_attr
+from osbrain.stream import EndOfStream
+from osbrain.stream import Stream
+
+from common import nsproxy  # pragma: no flakes
+
+
+def rows(agent, request):
+    for i in range(request):
+        agent.produced += 1
+        yield i
+
+
+def slow_rows(agent, request):
+    for i in range(request):
+        time.sleep(agent.delay)
+        agent.produced += 1
+        yield i
+
+
+def total(agent, request):
+    return sum(range(request))
+
+
+def on_error(agent):
+    agent.errors += 1
+
+
+def receive(agent, chunk):
+    if isinstance(chunk, EndOfStream):
+        agent.received.append('END')
+        return
+    time.sleep(agent.delay)
+    agent.received.append(chunk)
+
+
+def server_and_client(delay=0.):
+    server = run_agent('server')
+    client = run_agent('client')
+    server.set_attr(produced=0)
+    client.set_attr(received=[], delay=delay)
+    addr = server.bind('STREAM_REP', alias='stream', handler=rows)
+    client.connect(addr, alias='stream', handler=receive)
+    return server, client
+
+
+def test_stream(nsproxy):
+    """
+    Generator handlers can yield many chunks, which are delivered to the
+    client handler followed by an end-of-stream marker.
+    """
+    server, client = server_and_client()
+    client.send('stream', 500)
+    assert wait_agent_attr(client, data='END')
+    assert client.get_attr('received') == list(range(500)) + ['END']
+
+    # Empty stream
+    client.set_attr(received=[])
+    client.send('stream', 0)
+    assert wait_agent_attr(client, data='END')
+    assert client.get_attr('received') == ['END']
+
+
+def test_stream_backpressure(nsproxy):
+    """
+    The server does not produce chunks faster than the client is able to
+    process them.
+    """
+    server, client = server_and_client(delay=1.)
+    client.send('stream', 1000)
+    time.sleep(0.5)
+    assert server.get_attr('produced') == Stream.WINDOW
+
+
+def test_stream_not_generator(nsproxy):
+    """
+    Handlers which are not generators reply with a single chunk.
+    """
+    server = run_agent('server')
+    client = run_agent('client')
+    client.set_attr(received=[], delay=0.)
+    addr = server.bind('STREAM_REP', alias='stream', handler=total)
+    client.connect(addr, alias='stream', handler=receive)
+    client.send('stream', 4)
+    assert wait_agent_attr(client, data='END')
+    assert client.get_attr('received') == [6, 'END']
+
+
+def test_stream_wait(nsproxy):
+    """
+    The wait bounds the time between chunks, not the duration of the whole
+    stream. When it is exceeded, the stream is cancelled in both ends.
+    """
+    server, client = server_and_client()
+    client.set_attr(errors=0)
+    server.set_attr(delay=0.2)
+    addr = server.bind('STREAM_REP', alias='slow', handler=slow_rows)
+    client.connect(addr, alias='slow', handler=receive)
+    client.send('slow', 5, wait=0.5, on_error=on_error)
+    assert wait_agent_attr(client, data='END', timeout=3)
+    assert client.get_attr('errors') == 0
+    assert not client.get_attr('_stream_requests')
+
+    client.set_attr(received=[])
+    server.set_attr(delay=1.)
+    client.send('slow', 2, wait=0.5, on_error=on_error)
+    assert wait_agent_attr(client, name='errors', value=1)
+    assert not client.get_attr('_stream_requests')
+    time.sleep(2)
+    assert client.get_attr('received') == []
+    assert not server.get_attr('_streams')
+
+
+def test_stream_abandoned_release(nsproxy, monkeypatch):
+    """
+    Abandoned streams are released periodically, even if the server does
+    not receive any other STREAM_REP message.
+    """
+    monkeypatch.setattr(Stream, 'TIMEOUT', 0.5)
+    # The client acknowledges every 32 chunks, which takes longer than the
+    # stream timeout
+    server, client = server_and_client(delay=0.05)
+    logger = run_logger('logger')
+    server.set_logger(logger)
+    sync_agent_logger(server, logger)
+    client.send('stream', 1000)
+    assert logger_received(logger, 'abandoned by the client',
+                           log_name='log_history_warning', timeout=1.2)
+    assert '_drop_abandoned_streams' not in server.list_timers()
+
+
+def test_stream_abandoned():
+    """
+    Streams are abandoned when the client stops acknowledging chunks.
+    """
+    stream = Stream(iter([]), client=None, address_uuid=b'')
+    now = time.time()
+    assert not stream.abandoned(now)
+    assert stream.abandoned(now + Stream.TIMEOUT + 1)
+    stream.ack(10)
+    assert stream.credit == Stream.WINDOW + 10
+    assert not stream.abandoned(now + Stream.TIMEOUT - 1)
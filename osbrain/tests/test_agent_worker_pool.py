@@ -0,0 +1,85 @@
+"""
+Test file for the load-balancing worker pool pattern.
+"""
+import os
+import time
+
+from osbrain import run_agent
+from osbrain.flow import WorkerPool
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def work(agent, message):
+    time.sleep(agent.delay)
+    agent.received.append(message)
+
+
+def crash(agent, message):
+    os._exit(1)
+
+
+def test_worker_pool_state():
+    """
+    Jobs of dead workers are retried a limited number of times.
+    """
+    pool = WorkerPool(retries=1)
+    pool.ready(b'a', name='A')
+    pool.pending.append((b'job', b'data'))
+    pool.idle.popleft()
+    assert pool.assign(b'a', now=0.) == (b'job', b'data')
+    assert pool.remove(b'a') is None
+    assert list(pool.pending) == [(b'job', b'data')]
+    pool.ready(b'b', name='B')
+    pool.idle.popleft()
+    pool.assign(b'b', now=0.)
+    assert pool.remove(b'b') == b'job'
+    assert not pool.pending
+    assert pool.summary()['A']['lost'] == 1
+
+
+def test_worker_pool_idle_workers(nsproxy):
+    """
+    Jobs are only sent to idle workers, so a slow worker does not
+    accumulate a backlog.
+    """
+    pool = run_agent('pool')
+    fast = run_agent('fast')
+    slow = run_agent('slow')
+    fast.set_attr(received=[], delay=0.01)
+    slow.set_attr(received=[], delay=1)
+    addr = pool.bind('WORKER_POOL', alias='pool')
+    slow.connect(addr, alias='work', handler=work)
+    fast.connect(addr, alias='work', handler=work)
+    time.sleep(0.1)
+
+    for i in range(10):
+        pool.send('pool', i)
+    assert wait_agent_attr(fast, length=9)
+    assert slow.get_attr('received') in ([], [0])
+    assert pool.queue_depth('pool') == 0
+
+    stats = pool.pool_stats('pool')
+    assert stats['fast']['done'] == 9
+    assert stats['fast']['throughput'] > stats['slow']['throughput']
+
+
+def test_worker_pool_retry(nsproxy):
+    """
+    Jobs assigned to a worker that dies are retried with another worker.
+    """
+    pool = run_agent('pool')
+    crasher = run_agent('crasher')
+    worker = run_agent('worker')
+    worker.set_attr(received=[], delay=0.)
+    addr = pool.bind('WORKER_POOL', alias='pool')
+    crasher.connect(addr, alias='work', handler=crash)
+    time.sleep(0.1)
+    worker.connect(addr, alias='work', handler=work)
+    time.sleep(0.1)
+
+    pool.send('pool', 'foo')
+    assert wait_agent_attr(worker, data='foo')
+    assert pool.pool_stats('pool')['crasher']['lost'] == 1
+    nsproxy.remove('crasher')
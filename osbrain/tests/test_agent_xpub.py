@@ -0,0 +1,115 @@
+"""
+Test file for subscription-aware (XPUB-backed) publishing.
+"""
+import time
+
+from osbrain import run_agent
+from osbrain import run_logger
+from osbrain import Agent
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+class Counted():
+    """
+    Message which counts the number of times it is serialized.
+    """
+    serialized = 0
+
+    def __getstate__(self):
+        Counted.serialized += 1
+        return {}
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def wait_subscribed(agent, alias, topic, timeout=3):
+    t0 = time.time()
+    while not agent.subscribed(alias, topic):
+        if time.time() - t0 > timeout:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_subscribed():
+    """
+    XPUB-backed publishers track the live subscriptions and do not serialize
+    publications nobody subscribes to.
+    """
+    publisher = Agent()
+    subscriber = Agent()
+    publisher.xpub = True
+    addr = publisher.bind('PUB', alias='pub', transport='tcp')
+    assert not publisher.subscribed('pub', 'a')
+    subscriber.connect(addr, alias='sub', handler={'a': receive})
+    assert wait_subscribed(publisher, 'pub', 'a')
+    assert publisher.subscribed('pub', 'ab')
+    assert not publisher.subscribed('pub', 'b')
+
+    Counted.serialized = 0
+    publisher.send('pub', Counted(), topic='b')
+    assert Counted.serialized == 0
+    publisher.send('pub', Counted(), topic='a')
+    assert Counted.serialized == 1
+
+    # Cached publications are always serialized
+    publisher.set_cache('pub')
+    publisher.send('pub', Counted(), topic='b')
+    assert Counted.serialized == 2
+
+    subscriber.close_sockets()
+    t0 = time.time()
+    while publisher.subscribed('pub', 'a') and time.time() - t0 < 3:
+        time.sleep(0.01)
+    assert not publisher.subscribed('pub', 'a')
+    publisher.close_sockets()
+
+
+def test_subscribed_pub():
+    """
+    PUB sockets not backed by XPUB are always assumed to have subscribers.
+    """
+    publisher = Agent()
+    publisher.bind('PUB', alias='pub', transport='tcp')
+    assert publisher.subscribed('pub', 'a')
+    publisher.close_sockets()
+
+
+def test_xpub(nsproxy):
+    """
+    Publications are received as usual through XPUB-backed addresses.
+    """
+    publisher = run_agent('publisher')
+    subscriber = run_agent('subscriber')
+    publisher.set_attr(xpub=True)
+    subscriber.set_attr(received=[])
+    addr = publisher.bind('PUB', alias='pub')
+    subscriber.connect(addr, alias='sub', handler={'a': receive})
+    assert wait_subscribed(publisher, 'pub', 'a')
+    publisher.send('pub', 'b', topic='b')
+    publisher.send('pub', 'a', topic='a')
+    assert wait_agent_attr(subscriber, data='a')
+    assert subscriber.get_attr('received') == ['a']
+
+
+def test_xpub_logger(nsproxy):
+    """
+    Log messages of levels the logger is not interested in are skipped.
+    """
+    agent = run_agent('agent')
+    agent.set_attr(xpub=True)
+    logger = run_logger('logger')
+    logger.set_levels('INFO', 'WARNING', 'ERROR')
+    agent.set_logger(logger)
+    assert wait_subscribed(agent, '_logger', 'INFO')
+    assert not agent.subscribed('_logger', 'DEBUG')
+    agent.log_debug('some debug')
+    agent.log_info('some information')
+    assert wait_agent_attr(logger, name='log_history', length=1)
+    time.sleep(0.1)
+    assert len(logger.get_attr('log_history')) == 1
+    assert 'some information' in logger.get_attr('log_history_info')[-1]
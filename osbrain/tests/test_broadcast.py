@@ -0,0 +1,75 @@
+"""
+Broadcast module tests.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain.broadcast import BroadcastTree
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def wait_disseminated(tree, uuid, timeout=5):
+    t0 = time.time()
+    while time.time() - t0 < timeout:
+        elapsed = tree.dissemination_time(uuid)
+        if elapsed is not None:
+            return elapsed
+        time.sleep(0.05)
+    return None
+
+
+def test_broadcast_tree(nsproxy):
+    """
+    Broadcasts reach all the nodes of the tree, through relay nodes.
+    """
+    root = run_agent('root')
+    nodes = [run_agent('node%s' % i) for i in range(7)]
+    for node in nodes:
+        node.set_attr(received=[])
+    tree = BroadcastTree(nsproxy, 'root', receive, fanout=2)
+    assert tree.depth == 3
+    assert [tree.parent(i) for i in range(7)] == [-1, -1, 0, 0, 1, 1, 2]
+    # Give some time for the subscriptions to propagate
+    time.sleep(0.5)
+
+    payload = b'x' * 100000
+    uuid = tree.send(payload)
+    for node in nodes:
+        assert wait_agent_attr(node, data=payload)
+    elapsed = wait_disseminated(tree, uuid)
+    assert elapsed is not None
+    assert 0 < elapsed < 5
+    assert not root.get_attr('_broadcast_latency')
+
+    uuid = tree.send('update')
+    for node in nodes:
+        assert wait_agent_attr(node, length=2)
+    assert wait_disseminated(tree, uuid) is not None
+
+
+def test_broadcast_tree_nodes(nsproxy):
+    """
+    Trees can be built with a subset of the agents.
+    """
+    run_agent('root')
+    nodes = [run_agent('node%s' % i) for i in range(3)]
+    other = run_agent('other')
+    for agent in nodes + [other]:
+        agent.set_attr(received=[])
+    tree = BroadcastTree(nsproxy, 'root', receive,
+                         nodes=['node0', 'node1', 'node2'], fanout=1)
+    assert tree.depth == 3
+    time.sleep(0.5)
+    tree.send('foo')
+    assert wait_agent_attr(nodes[2], data='foo')
+    assert other.get_attr('received') == []
+    with pytest.raises(ValueError):
+        BroadcastTree(nsproxy, 'root', receive, fanout=0)
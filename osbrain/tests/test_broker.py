@@ -0,0 +1,103 @@
+"""
+Broker module tests.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain import run_broker
+from osbrain import Broker
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def receive(agent, message):
+    agent.received.append(message)
+
+
+def reply(agent, request):
+    return request + 1
+
+
+def test_forwarder(nsproxy):
+    """
+    Publications are forwarded from many publishers to many subscribers,
+    filtered by the subscribers' topics.
+    """
+    run_broker('broker', 'FORWARDER')
+    frontend = nsproxy.addr('broker', 'frontend')
+    backend = nsproxy.addr('broker', 'backend')
+    publishers = [run_agent('publisher%s' % i) for i in range(2)]
+    subscribers = [run_agent('subscriber%s' % i) for i in range(2)]
+    for publisher in publishers:
+        publisher.connect(frontend, alias='pub')
+    for subscriber, topic in zip(subscribers, ('a', 'b')):
+        subscriber.set_attr(received=[])
+        subscriber.connect(backend, alias='sub', handler={topic: receive})
+    # Give some time for the subscriptions to propagate
+    time.sleep(0.5)
+    for i, publisher in enumerate(publishers):
+        publisher.send('pub', 'a%s' % i, topic='a')
+        publisher.send('pub', 'b%s' % i, topic='b')
+    assert wait_agent_attr(subscribers[0], length=2)
+    assert wait_agent_attr(subscribers[1], length=2)
+    assert sorted(subscribers[0].get_attr('received')) == ['a0', 'a1']
+    assert sorted(subscribers[1].get_attr('received')) == ['b0', 'b1']
+
+
+def test_queue(nsproxy):
+    """
+    Requests are load-balanced among repliers.
+    """
+    run_broker('broker', 'QUEUE')
+    client = run_agent('client')
+    servers = [run_agent('server%s' % i) for i in range(2)]
+    for server in servers:
+        server.connect(nsproxy.addr('broker', 'backend'), handler=reply)
+    client.connect(nsproxy.addr('broker', 'frontend'), alias='req')
+    for i in range(4):
+        assert client.send_recv('req', i) == i + 1
+
+
+def test_streamer(nsproxy):
+    """
+    Messages pushed to the broker are distributed among pullers.
+    """
+    run_broker('broker', 'STREAMER')
+    pusher = run_agent('pusher')
+    pullers = [run_agent('puller%s' % i) for i in range(2)]
+    for puller in pullers:
+        puller.set_attr(received=[])
+        puller.connect(nsproxy.addr('broker', 'backend'), handler=receive)
+    pusher.connect(nsproxy.addr('broker', 'frontend'), alias='push')
+    time.sleep(0.2)
+    for i in range(10):
+        pusher.send('push', i)
+    assert wait_agent_attr(pullers[0], length=1)
+    assert wait_agent_attr(pullers[1], length=1)
+    time.sleep(0.2)
+    received = sum((puller.get_attr('received') for puller in pullers), [])
+    assert sorted(received) == list(range(10))
+
+
+def test_brokers_discovery(nsproxy):
+    """
+    Brokers can be listed, by kind, through the name server proxy.
+    """
+    run_broker('forwarder', 'FORWARDER')
+    run_broker('queue', 'QUEUE')
+    run_agent('agent')
+    assert nsproxy.brokers() == ['forwarder', 'queue']
+    assert nsproxy.brokers('QUEUE') == ['queue']
+    assert nsproxy.brokers('STREAMER') == []
+
+
+def test_broker_wrong_kind(nsproxy):
+    """
+    Only known broker kinds can be started.
+    """
+    broker = run_agent('broker', base=Broker)
+    with pytest.raises(ValueError):
+        broker.unsafe.start_broker('WRONG')
@@ -0,0 +1,110 @@
+"""
+Pipeline module tests.
+"""
+import time
+
+import pytest
+
+from osbrain import run_agent
+from osbrain import Pipeline
+from osbrain.helper import wait_agent_attr
+
+from common import nsproxy  # pragma: no flakes
+
+
+def double(agent, message):
+    return message * 2
+
+
+def increment(agent, message):
+    return message + 1
+
+
+def collect(agent, message):
+    agent.received.append(message)
+
+
+def slow(agent, message):
+    time.sleep(0.05)
+    return message
+
+
+def wait_processed(pipeline, stage, count, timeout=5):
+    t0 = time.time()
+    while pipeline.stats()[stage]['processed'] < count:
+        if time.time() - t0 > timeout:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def test_pipeline(nsproxy):
+    """
+    Messages go through all the stages, which are executed in parallel.
+    """
+    pipeline = Pipeline('etl')
+    pipeline.add_stage('double', double, parallelism=2, batch=5) \
+        .add_stage('increment', increment, link='FLOW_PUSH') \
+        .add_stage('collect', collect)
+    pipeline.run()
+    pipeline.stages[-1].agents[0].set_attr(received=[])
+    producer = run_agent('producer')
+    pipeline.feed(producer, 'etl')
+    time.sleep(0.2)
+    for i in range(20):
+        producer.send('etl', i)
+    sink = pipeline.stages[-1].agents[0]
+    assert wait_agent_attr(sink, length=20)
+    assert sorted(sink.get_attr('received')) == [i * 2 + 1 for i in range(20)]
+
+    stats = pipeline.stats()
+    assert stats['double']['agents'] == 2
+    assert stats['double']['queue'] is None
+    assert stats['increment']['processed'] == 20
+    assert stats['increment']['queue'] == 0
+    assert stats['collect']['throughput'] > 0
+    assert all(agent.stage_stats()['processed'] > 0
+               for agent in pipeline.stages[0].agents)
+
+    pipeline.shutdown()
+    t0 = time.time()
+    while nsproxy.agents() != ['producer'] and time.time() - t0 < 3:
+        time.sleep(0.1)
+    assert nsproxy.agents() == ['producer']
+    assert not pipeline.stages[0].agents
+
+
+def test_pipeline_scale(nsproxy):
+    """
+    Stages can be scaled up while running.
+    """
+    pipeline = Pipeline('etl')
+    pipeline.add_stage('first', increment).add_stage('slow', slow)
+    pipeline.run()
+    producer = run_agent('producer')
+    pipeline.feed(producer, 'etl')
+    pipeline.scale('slow', 3)
+    assert pipeline.stats()['slow']['agents'] == 3
+    time.sleep(0.2)
+    for i in range(30):
+        producer.send('etl', i)
+    assert wait_processed(pipeline, 'slow', 30)
+    assert all(agent.stage_stats()['processed'] > 0
+               for agent in pipeline.stages[1].agents)
+    with pytest.raises(ValueError):
+        pipeline.scale('slow', 1)
+    with pytest.raises(ValueError):
+        pipeline.scale('wrong', 1)
+
+
+def test_pipeline_errors():
+    """
+    Pipeline definitions are validated.
+    """
+    pipeline = Pipeline('etl')
+    with pytest.raises(ValueError):
+        pipeline.run()
+    with pytest.raises(ValueError):
+        pipeline.add_stage('stage', double, link='PUB')
+    with pytest.raises(ValueError):
+        pipeline.add_stage('stage', double, link='FLOW_PUSH', batch=10)
@@ -1,9 +1,12 @@
 """
 Proxy module tests.
 """
+import asyncio
+import os
 import time
 
 import pickle
+import Pyro4
 import pytest
 
 import osbrain
@@ -12,6 +15,7 @@ from osbrain import Agent
 from osbrain import Proxy
 from osbrain import NSProxy
 from osbrain.proxy import locate_ns
+from osbrain.proxy import ProxyCache
 from osbrain.helper import wait_agent_attr
 
 from common import nsproxy  # pragma: no flakes
@@ -21,10 +25,39 @@ def since(t0, passed, tolerance):
     return abs((time.time() - t0) - passed) < tolerance
 
 
+def wait_unregistered(nsproxy, name, timeout=3.):
+    t0 = time.time()
+    while time.time() - t0 < timeout:
+        if name not in nsproxy.agents():
+            return True
+        time.sleep(0.05)
+    return False
+
+
 class DelayAgent(Agent):
     def delay(self, seconds):
         time.sleep(seconds)
 
+    def nap(self):
+        time.sleep(self.seconds)
+
+
+class ProxyClient(Agent):
+    def open_proxies(self, name, number):
+        proxies = [Proxy(name, self.nsaddr) for _ in range(number)]
+        for proxy in proxies:
+            proxy.ping()
+            proxy.release()
+        return True
+
+
+class LogAgent(Agent):
+    def on_init(self):
+        self.log = []
+
+    def append(self, x):
+        self.log.append(x)
+
 
 class BussyWorker(Agent):
     def on_init(self):
@@ -325,3 +358,207 @@ def test_agent_proxy_oneway(nsproxy):
     assert not wayne._next_oneway
 
     assert wait_agent_attr(wayne, value=20*['bang!'], timeout=1.2)
+
+
+def test_agent_proxy_batch(nsproxy):
+    """
+    Calls queued in a proxy batch are executed in order, with a single
+    remote call, when the context is exited.
+    """
+    agent = run_agent('agent')
+    with agent.batch() as batch:
+        assert batch.set_attr(x=1) is None
+        batch.set_attr(y=2)
+        batch.bind('PUSH', alias='push')
+        batch.get_attr('x')
+    assert len(batch.results) == 4
+    assert batch.results[1:3] == [None, agent.addr('push')]
+    assert batch.results[3] == 1
+    # New attributes are available from the proxy
+    assert agent.x == 1
+    assert agent.y == 2
+
+
+def test_agent_proxy_batch_order(nsproxy):
+    """
+    Calls in a proxy batch are executed in order.
+    """
+    agent = run_agent('agent', base=LogAgent)
+    with agent.batch() as batch:
+        for i in range(100):
+            batch.set_attr(x=i)
+            batch.append(i)
+    assert agent.x == 99
+    assert agent.get_attr('log') == list(range(100))
+
+
+def test_agent_proxy_batch_exception(nsproxy):
+    """
+    Calls are not executed if an exception is raised inside the context,
+    and exceptions raised by the calls are propagated.
+    """
+    agent = run_agent('agent')
+    with pytest.raises(KeyError):
+        with agent.batch() as batch:
+            batch.set_attr(x=1)
+            raise KeyError()
+    assert batch.results is None
+    with pytest.raises(AttributeError):
+        agent.get_attr('x')
+    with pytest.raises(AttributeError):
+        with agent.unsafe.batch() as batch:
+            batch.set_attr(x=1)
+            batch.wrong()
+    assert agent.get_attr('x') == 1
+
+
+def test_agent_proxy_future(nsproxy):
+    """
+    Future calls return immediately and are executed concurrently when
+    made through different proxies.
+    """
+    agents = [run_agent('agent%s' % i, base=DelayAgent) for i in range(4)]
+    t0 = time.time()
+    futures = [agent.future.delay(0.5) for agent in agents]
+    assert time.time() - t0 < 0.2
+    assert [future.result() for future in futures] == [None] * 4
+    assert since(t0, passed=0.5, tolerance=0.3)
+    # Next calls are synchronous again
+    assert agents[0].ping() == 'pong'
+
+
+def test_agent_proxy_future_exception(nsproxy):
+    """
+    Exceptions are set in the future, and the call mode (safe or unsafe) is
+    preserved.
+    """
+    agent = run_agent('agent')
+    future = agent.unsafe.future.get_attr('wrong')
+    with pytest.raises(AttributeError):
+        future.result()
+    assert agent._safe == agent._default_safe
+    assert agent.future.set_attr(x=1).result() is None
+    assert agent.x == 1
+
+
+def test_agent_proxy_future_await(nsproxy):
+    """
+    Future calls can be awaited from asyncio coroutines.
+    """
+    agents = [run_agent('agent%s' % i, base=DelayAgent) for i in range(3)]
+
+    async def gather():
+        return await asyncio.gather(*[agent.future.ping()
+                                      for agent in agents])
+
+    assert asyncio.run(gather()) == ['pong'] * 3
+
+
+def test_nameserver_proxy_broadcast_call(nsproxy):
+    """
+    Methods can be called on all the agents matching a pattern, which are
+    called concurrently, aggregating results and errors.
+    """
+    for i in range(4):
+        run_agent('worker%s' % i, base=DelayAgent)
+    run_agent('other')
+    t0 = time.time()
+    results, errors = nsproxy.broadcast_call('worker', 'delay', 0.5)
+    assert since(t0, passed=0.5, tolerance=0.4)
+    assert results == {'worker%s' % i: None for i in range(4)}
+    assert errors == {}
+    results, errors = nsproxy.broadcast_call('worker[02]', 'set_attr', x=1)
+    assert sorted(results) == ['worker0', 'worker2']
+    assert nsproxy.proxy('worker2').get_attr('x') == 1
+    results, errors = nsproxy.broadcast_call('.*', 'get_attr', 'x')
+    assert results == {'worker0': 1, 'worker2': 1}
+    assert sorted(errors) == ['other', 'worker1', 'worker3']
+    assert isinstance(errors['other'], AttributeError)
+
+
+def test_nameserver_proxy_broadcast_call_timeout(nsproxy):
+    """
+    Calls which do not complete in time are reported as errors.
+    """
+    run_agent('fast', base=DelayAgent).set_attr(seconds=0)
+    run_agent('slow', base=DelayAgent).set_attr(seconds=1)
+    results, errors = nsproxy.broadcast_call('.*', 'nap', timeout=0.5)
+    assert results == {'fast': None}
+    assert list(errors) == ['slow']
+    assert isinstance(errors['slow'], TimeoutError)
+
+
+def test_proxy_cache(nsproxy):
+    """
+    Agent URIs are cached, so that new proxies to the same agent do not
+    need to look the agent up in the name server. Connections are not
+    pooled by default.
+    """
+    run_agent('agent').set_attr(x=1)
+    proxy = Proxy('agent')
+    cache = osbrain.proxy._proxy_cache()
+    uri = cache.uri(nsproxy.addr(), 'agent')
+    assert uri.startswith('PYRO:')
+    proxy.release()
+    assert proxy._pyroConnection is None
+    assert not cache.idle
+    with Proxy('agent') as proxy:
+        assert proxy.get_attr('x') == 1
+        assert proxy.nsaddr() == nsproxy.addr()
+
+
+def test_proxy_pool(nsproxy, monkeypatch):
+    """
+    When pooling is enabled, released connections are reused by new
+    proxies to the same agent, which do not need to look the agent up in
+    the name server. Idle connections are closed after a timeout.
+    """
+    cache = ProxyCache(8, timeout=0.5)
+    assert cache.size == Pyro4.config.THREADPOOL_SIZE // 4
+    monkeypatch.setattr(osbrain.proxy, '_CACHE', (os.getpid(), cache))
+    run_agent('agent').set_attr(x=1)
+    proxy = Proxy('agent')
+    uri = cache.uri(nsproxy.addr(), 'agent')
+    connection = proxy._pyroConnection
+    proxy.release()
+    assert len(cache.idle[uri]) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError()
+
+    monkeypatch.setattr(osbrain.proxy, 'locate_ns', fail)
+    with Proxy('agent') as proxy:
+        assert proxy._pyroConnection is connection
+        assert proxy.get_attr('x') == 1
+    assert len(cache.idle[uri]) == 1
+    time.sleep(1.)
+    assert not cache.idle
+    assert cache.reaper is None
+
+
+def test_proxy_release_workers(nsproxy):
+    """
+    Released proxies do not hold the workers of the agent, so that many
+    clients can create short-lived proxies to the same agent.
+    """
+    run_agent('target')
+    clients = [run_agent('client%s' % i, base=ProxyClient) for i in range(3)]
+    for client in clients:
+        assert client.open_proxies('target', 8)
+    assert Proxy('target').ping() == 'pong'
+
+
+def test_proxy_cache_invalidation(nsproxy):
+    """
+    Cached URIs are invalidated when the agent can not be reached.
+    """
+    run_agent('agent').set_attr(x=1)
+    Proxy('agent').release()
+    cache = osbrain.proxy._proxy_cache()
+    uri = cache.uri(nsproxy.addr(), 'agent')
+    nsproxy.proxy('agent').shutdown()
+    assert wait_unregistered(nsproxy, 'agent')
+    run_agent('agent').set_attr(x=2)
+    assert Proxy('agent').get_attr('x') == 2
+    assert cache.uri(nsproxy.addr(), 'agent') != uri
+    assert uri not in cache.idle